@@ -18,14 +18,43 @@ def main():
                               'read from stdin.'))
     parser.add_argument('--ast', action='store_true',
                         help=('Pretty print the AST, do not search the data.'))
+    parser.add_argument('--source', action='store_true',
+                        help=('Print the python source generated for the '
+                              'expression, do not search the data.'))
+    parser.add_argument('--explain', action='store_true',
+                        help=('Print the runtime checks that type inference '
+                              'removed from the compiled expression, do not '
+                              'search the data.'))
+    parser.add_argument('--schema',
+                        help=('The filename containing the JSON Schema of '
+                              'the input data, the expression is compiled '
+                              'for this schema.'))
     args = parser.parse_args()
     expression = args.expression
+    schema = None
+    if args.schema:
+        with open(args.schema, 'r') as f:
+            schema = json.load(f)
     if args.ast:
         # Only print the AST
         expression = jmespath.compile(args.expression)
         sys.stdout.write(pformat(expression.parsed))
         sys.stdout.write('\n')
         return 0
+    if args.source:
+        expression = jmespath.compile(args.expression, backend='codegen')
+        sys.stdout.write(expression.compiled.source)
+        return 0
+    if args.explain:
+        try:
+            expression = jmespath.compile(args.expression, backend='codegen',
+                                          schema=schema)
+        except exceptions.SchemaError as e:
+            sys.stderr.write("schema-error: %s\n" % e)
+            return 1
+        for line in expression.explain():
+            sys.stdout.write(line + '\n')
+        return 0
     if args.filename:
         with open(args.filename, 'r') as f:
             data = json.load(f)
@@ -33,8 +62,11 @@ def main():
         data = sys.stdin.read()
         data = json.loads(data)
     try:
-        sys.stdout.write(json.dumps(
-            jmespath.search(expression, data), indent=4))
+        if schema is not None:
+            result = jmespath.compile(expression, schema=schema).search(data)
+        else:
+            result = jmespath.search(expression, data)
+        sys.stdout.write(json.dumps(result, indent=4))
         sys.stdout.write('\n')
     except exceptions.ArityError as e:
         sys.stderr.write("invalid-arity: %s\n" % e)
@@ -45,6 +77,9 @@ def main():
     except exceptions.UnknownFunctionError as e:
         sys.stderr.write("unknown-function: %s\n" % e)
         return 1
+    except exceptions.SchemaError as e:
+        sys.stderr.write("schema-error: %s\n" % e)
+        return 1
     except exceptions.ParseError as e:
         sys.stderr.write("syntax-error: %s\n" % e)
         return 1
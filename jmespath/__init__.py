@@ -1,11 +1,81 @@
+import gc
+
+from jmespath import exceptions
 from jmespath import parser
+from jmespath.expressionset import ExpressionSet
+from jmespath.rules import RuleSet
 from jmespath.visitor import Options
 
 __version__ = '0.9.4'
 
 
-def compile(expression):
-    return parser.Parser().parse(expression)
+def compile(expression, backend=None, schema=None, options=None):
+    """Compile an expression.
+
+    If ``schema`` is given, it's a JSON Schema (as a dict) of the
+    documents the expression will search, see
+    ``ParsedResult.specialize``.  The documents that don't match the
+    schema are searched with ``backend``.
+
+    ``options`` are the options the expression will be searched with.
+    The ``closure`` and ``codegen`` backends bind the function calls to
+    the function table of these options, rather than the default one,
+    and raise an ``ArityError`` for a function of this table called
+    with the wrong number of arguments (see ``ParsedResult.bind``).
+
+    """
+    parsed = parser.Parser(backend=backend).parse(expression)
+    if schema is not None:
+        parsed = parsed.specialize(schema)
+    parsed.bind(options)
+    return parsed
+
+
+def compile_many(expressions, backend=None, cache_file=None):
+    """Compile many expressions at once.
+
+    Returns a dict mapping every expression to its compiled expression.
+    All the expressions are compiled even if some are invalid, and
+    a ``CompileErrors`` listing every invalid expression is raised at
+    the end.
+
+    If ``cache_file`` is given, the expressions stored in this file by
+    a previous call aren't parsed again, and the file is updated with
+    the expressions that weren't in it.
+
+    """
+    results, errors = parser.Parser(backend=backend).parse_many(
+        expressions, cache_file=cache_file)
+    if errors:
+        raise exceptions.CompileErrors(errors, results)
+    return results
+
+
+def freeze(expressions, backend=None, cache_file=None):
+    """Compile expressions before forking worker processes.
+
+    The expressions are compiled (see ``compile_many``) and kept for
+    the lifetime of the process, outside of the compilation cache.
+    Then ``gc.freeze()`` (python 3.7+) moves every object tracked by
+    the garbage collector, including the compiled expressions, to a
+    permanent generation the collector ignores.  Workers forked after
+    this call share the memory pages of the compiled expressions
+    instead of copying them, as long as they don't write to them.
+
+    Note that ``gc.freeze()`` applies to the whole process, not just
+    to the compiled expressions.  As with ``compile_many``, invalid
+    expressions raise a ``CompileErrors``, after the valid ones have
+    been frozen.
+
+    """
+    results, errors = parser.Parser(backend=backend).freeze(
+        expressions, cache_file=cache_file)
+    parser._DEFAULT_INTERPRETER._fill_method_cache()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    if errors:
+        raise exceptions.CompileErrors(errors, results)
+    return results
 
 
 def search(expression, data, options=None):
@@ -1,90 +1,224 @@
-# AST nodes have this structure:
-# {"type": <node type>", children: [], "value": ""}
+# AST nodes are Node objects with this structure:
+# Node(<node type>, children=[], value=<node value>)
+#
+# The node type is stored as a small integer tag (an index into
+# NODE_TYPES), which lets visitors dispatch on a list index rather
+# than a string.  For compatibility, nodes also support the dict
+# style access of the original AST ({"type": <node type>,
+# "children": [], "value": ""}), and to_dict() converts a tree
+# into that dict form.
+
+
+NODE_TYPES = (
+    'and_expression',
+    'comparator',
+    'current',
+    'expref',
+    'field',
+    'field_path',
+    'filter_projection',
+    'flatten',
+    'function_expression',
+    'identity',
+    'index',
+    'index_expression',
+    'key_val_pair',
+    'literal',
+    'multi_select_dict',
+    'multi_select_list',
+    'not_expression',
+    'or_expression',
+    'pipe',
+    'projection',
+    'slice',
+    'subexpression',
+    'value_projection',
+)
+TYPE_TAGS = dict((name, tag) for tag, name in enumerate(NODE_TYPES))
+# Node types that have a "value" key in their dict form.
+_VALUE_TAGS = frozenset(TYPE_TAGS[name] for name in [
+    'comparator', 'field', 'field_path', 'function_expression',
+    'index', 'key_val_pair', 'literal'])
+# Leaf nodes share a single, immutable, empty children sequence.
+_NO_CHILDREN = ()
+
+
+class Node(object):
+    __slots__ = ('tag', 'children', 'value')
+
+    def __init__(self, node_type, children=_NO_CHILDREN, value=None):
+        self.tag = TYPE_TAGS[node_type]
+        self.children = children
+        self.value = value
+
+    @property
+    def type(self):
+        return NODE_TYPES[self.tag]
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.type
+        elif key == 'children':
+            return self.children
+        elif key == 'value' and self.tag in _VALUE_TAGS:
+            return self.value
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in ('type', 'children') or (
+            key == 'value' and self.tag in _VALUE_TAGS)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Node):
+            return (self.tag == other.tag and
+                    self.value == other.value and
+                    list(self.children) == list(other.children))
+        elif isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Node(%r, %r, %r)' % (self.type, list(self.children),
+                                     self.value)
+
+    def to_dict(self):
+        return to_dict(self)
+
+    def __reduce__(self):
+        # Slotted objects without a __getstate__ can't be pickled on
+        # python 2.
+        return (Node, (self.type, self.children, self.value))
+
+
+def to_dict(node):
+    """Convert an AST into its dict form."""
+    if not isinstance(node, Node):
+        # Slice children are the (optional) integer start/stop/step.
+        return node
+    result = {'type': node.type,
+              'children': [to_dict(child) for child in node.children]}
+    if node.tag in _VALUE_TAGS:
+        value = node.value
+        if node.tag == TYPE_TAGS['field_path']:
+            value = list(value)
+        result['value'] = value
+    return result
+
+
+def from_dict(data):
+    """Convert an AST in dict form into Node objects."""
+    if not isinstance(data, dict):
+        return data
+    children = data.get('children')
+    if children:
+        children = [from_dict(child) for child in children]
+    else:
+        children = _NO_CHILDREN
+    return Node(data['type'], children, data.get('value'))
 
 
 def comparator(name, first, second):
-    return {'type': 'comparator', 'children': [first, second], 'value': name}
+    return Node('comparator', [first, second], name)
 
 
 def current_node():
-    return {'type': 'current', 'children': []}
+    return Node('current')
 
 
 def expref(expression):
-    return {'type': 'expref', 'children': [expression]}
+    return Node('expref', [expression])
 
 
 def function_expression(name, args):
-    return {'type': 'function_expression', 'children': args, 'value': name}
+    return Node('function_expression', args, name)
 
 
 def field(name):
-    return {"type": "field", "children": [], "value": name}
+    return Node('field', value=name)
+
+
+def field_path(names):
+    # A chain of field lookups, "a.b.c", as a single node.
+    return Node('field_path', value=names)
 
 
 def filter_projection(left, right, comparator):
-    return {'type': 'filter_projection', 'children': [left, right, comparator]}
+    return Node('filter_projection', [left, right, comparator])
 
 
 def flatten(node):
-    return {'type': 'flatten', 'children': [node]}
+    return Node('flatten', [node])
 
 
 def identity():
-    return {"type": "identity", 'children': []}
+    return Node('identity')
 
 
 def index(index):
-    return {"type": "index", "value": index, "children": []}
+    return Node('index', value=index)
 
 
 def index_expression(children):
-    return {"type": "index_expression", 'children': children}
+    return Node('index_expression', children)
 
 
 def key_val_pair(key_name, node):
-    return {"type": "key_val_pair", 'children': [node], "value": key_name}
+    return Node('key_val_pair', [node], key_name)
 
 
 def literal(literal_value):
-    return {'type': 'literal', 'value': literal_value, 'children': []}
+    return Node('literal', value=literal_value)
 
 
 def multi_select_dict(nodes):
-    return {"type": "multi_select_dict", "children": nodes}
+    return Node('multi_select_dict', nodes)
 
 
 def multi_select_list(nodes):
-    return {"type": "multi_select_list", "children": nodes}
+    return Node('multi_select_list', nodes)
 
 
 def or_expression(left, right):
-    return {"type": "or_expression", "children": [left, right]}
+    return Node('or_expression', [left, right])
 
 
 def and_expression(left, right):
-    return {"type": "and_expression", "children": [left, right]}
+    return Node('and_expression', [left, right])
 
 
 def not_expression(expr):
-    return {"type": "not_expression", "children": [expr]}
+    return Node('not_expression', [expr])
 
 
 def pipe(left, right):
-    return {'type': 'pipe', 'children': [left, right]}
+    return Node('pipe', [left, right])
 
 
 def projection(left, right):
-    return {'type': 'projection', 'children': [left, right]}
+    return Node('projection', [left, right])
 
 
 def subexpression(children):
-    return {"type": "subexpression", 'children': children}
+    return Node('subexpression', children)
 
 
 def slice(start, end, step):
-    return {"type": "slice", "children": [start, end, step]}
+    return Node('slice', [start, end, step])
 
 
 def value_projection(left, right):
-    return {'type': 'value_projection', 'children': [left, right]}
+    return Node('value_projection', [left, right])
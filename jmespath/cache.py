@@ -0,0 +1,245 @@
+"""Caches for parsed expressions.
+
+The ``Parser`` caches the ``ParsedResult`` of every expression it
+parses, so compiling an expression that was seen before is a dict
+lookup.  The cache policy is pluggable (see ``Parser.set_cache``):
+
+* ``LRUCache`` evicts the least recently used expression.
+* ``LFUCache`` evicts the least frequently used expression, and the
+  least recently used one among expressions used equally often.
+
+Both can be bounded by a number of entries, by an approximate size in
+bytes, or by both.  Every cache counts its hits, misses and evictions,
+``stats()`` returns a snapshot of these counters for exporting them as
+metrics.
+
+The caches are safe to share between threads:
+
+* ``get`` doesn't take a lock.  It's a dict lookup, after which the
+  entry's use count and last use time are updated in place.
+* ``put`` and ``clear`` take a lock, eviction happens while holding it.
+  Entries are evicted in order of priority (last use time for LRU,
+  use count then last use time for LFU) from a heap.  Rather than
+  updating the heap on every ``get``, the heap items are refreshed
+  when they're popped: an item whose entry was used since it was
+  pushed is pushed back with the entry's current priority.  Priorities
+  only ever increase, so the first up to date item popped is the
+  entry with the lowest priority.
+* The hit and miss counters are updated without the lock, under heavy
+  contention they're approximate.
+
+
+"""
+import heapq
+import itertools
+import sys
+import threading
+import types
+
+
+# Objects that are accounted for with a shallow sys.getsizeof().
+_OPAQUE_TYPES = (type, types.FunctionType, types.BuiltinFunctionType,
+                 types.MethodType, types.ModuleType)
+
+
+def approximate_size(obj):
+    """Return the approximate memory used by an object, in bytes.
+
+    Containers and objects with a ``__dict__`` or ``__slots__`` are
+    walked recursively, and every object reachable from ``obj`` is
+    counted once.  Classes, functions and modules only count their own
+    size, not the objects they refer to.
+
+    """
+    seen = set()
+    total = 0
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, _OPAQUE_TYPES):
+            continue
+        elif isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        else:
+            attributes = getattr(current, '__dict__', None)
+            if attributes is not None:
+                pending.append(attributes)
+            for cls in type(current).__mro__:
+                for name in cls.__dict__.get('__slots__', ()):
+                    value = getattr(current, name, None)
+                    if value is not None:
+                        pending.append(value)
+    return total
+
+
+# The fields of a cache entry.
+_VALUE, _SIZE, _COUNT, _TICK = range(4)
+
+
+class BaseCache(object):
+    """Base class for the caches of parsed expressions.
+
+    :param max_entries: The maximum number of cached expressions, or
+        None for no limit on the number of entries.
+    :param max_bytes: The maximum total size of the cached expressions,
+        as computed by ``sizeof``, or None for no limit.
+    :param sizeof: A function that returns the approximate size, in
+        bytes, of a cached value.  It is only used when ``max_bytes``
+        is set.
+
+    Subclasses implement the eviction policy with ``_priority``, the
+    entry with the lowest priority is evicted first.
+
+    """
+    def __init__(self, max_entries=None, max_bytes=None,
+                 sizeof=approximate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof if max_bytes is not None else None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # key -> [value, size, use count, last use tick]
+        self._entries = {}
+        # (priority, key) items, one per entry.
+        self._heap = []
+        # next() on an itertools.count is atomic, so every use of an
+        # entry gets a distinct tick without taking the lock.
+        self._ticks = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the value cached for ``key``, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[_COUNT] += 1
+        entry[_TICK] = next(self._ticks)
+        return entry[_VALUE]
+
+    def peek(self, key):
+        """Return the value cached for ``key``, or None.
+
+        Unlike ``get``, this isn't counted as a use of the entry, or as
+        a hit or a miss.
+
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[_VALUE]
+
+    def put(self, key, value):
+        """Cache ``value`` for ``key``, evicting entries as needed."""
+        size = self._size_of(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # The heap item for the entry is refreshed when it's
+                # popped.
+                self._bytes -= entry[_SIZE]
+                entry[_VALUE] = value
+                entry[_SIZE] = size
+                entry[_COUNT] += 1
+                entry[_TICK] = next(self._ticks)
+            else:
+                entry = [value, size, 1, next(self._ticks)]
+                self._entries[key] = entry
+                heapq.heappush(self._heap, (self._priority(entry), key))
+            self._bytes += size
+            while self._is_full():
+                self._evict(protected=key)
+
+    def clear(self):
+        """Remove all the cached entries.  The counters are kept."""
+        with self._lock:
+            self._entries = {}
+            self._heap = []
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return a snapshot of the cache counters as a dict.
+
+        ``bytes`` is the approximate size of the cached entries, it's
+        only tracked (and otherwise None) if ``max_bytes`` is set.
+
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self),
+            'bytes': self._bytes if self._sizeof is not None else None,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _priority(self, entry):
+        raise NotImplementedError("_priority")
+
+    def _size_of(self, value):
+        if self._sizeof is None:
+            return 0
+        return self._sizeof(value)
+
+    def _is_full(self):
+        return ((self.max_entries is not None and
+                 len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and
+                 self._bytes > self.max_bytes))
+
+    def _evict(self, protected):
+        # Called with the lock held.  The entry being added may have
+        # the lowest priority (with LFU), but evicting it would make it
+        # impossible for a new expression to stay cached, so it's only
+        # evicted if it's the only entry.
+        heap = self._heap
+        skipped = None
+        while True:
+            priority, key = heapq.heappop(heap)
+            entry = self._entries[key]
+            current = self._priority(entry)
+            if current != priority:
+                heapq.heappush(heap, (current, key))
+            elif key == protected and len(self._entries) > 1:
+                skipped = (priority, key)
+            else:
+                break
+        if skipped is not None:
+            heapq.heappush(heap, skipped)
+        del self._entries[key]
+        self._bytes -= entry[_SIZE]
+        self.evictions += 1
+
+
+class LRUCache(BaseCache):
+    """Evict the least recently used expression."""
+    def _priority(self, entry):
+        return entry[_TICK]
+
+
+class LFUCache(BaseCache):
+    """Evict the least frequently used expression.
+
+    Expressions used equally often are evicted least recently used
+    first.
+
+    """
+    def _priority(self, entry):
+        return (entry[_COUNT], entry[_TICK])
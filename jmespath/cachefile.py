@@ -0,0 +1,141 @@
+"""Store parsed expressions in a file.
+
+A cache file lets a new process load the ASTs of expressions that were
+parsed before, rather than running the lexer, the parser and the
+optimizer for every expression again (see ``jmespath.compile_many``).
+
+The file contains:
+
+* A magic line identifying the file.
+* A checksum line, the hex SHA-256 of the fingerprint (below) followed
+  by the payload.
+* The payload, a ``marshal`` dump of ``(expression, node)`` pairs, each
+  node being a ``(tag, children, value)`` tuple.
+
+The fingerprint identifies everything the stored ASTs depend on: the
+file format version, the jmespath version, the marshal format version,
+the node types (their tags are stored) and whether the ASTs were
+optimized.  A file written by another version, or one that's truncated
+or corrupted, has a checksum that doesn't match and is ignored as if it
+didn't exist.
+
+Like ``.pyc`` files, cache files must come from a trusted source: the
+checksum detects stale and corrupted files, not tampering.
+
+"""
+import hashlib
+import marshal
+import os
+import tempfile
+
+from jmespath import ast
+
+
+FORMAT_VERSION = 1
+_MAGIC = b'JMESPATH-AST-CACHE\n'
+_replace = getattr(os, 'replace', os.rename)
+
+
+def load(filename, optimized=True):
+    """Load the ASTs stored in ``filename``.
+
+    Returns a dict mapping expressions to their ``ast.Node``.  If the
+    file doesn't exist, or isn't a valid cache file for this version of
+    jmespath, an empty dict is returned.
+
+    """
+    try:
+        with open(filename, 'rb') as f:
+            contents = f.read()
+    except (IOError, OSError):
+        return {}
+    if not contents.startswith(_MAGIC):
+        return {}
+    checksum_end = contents.find(b'\n', len(_MAGIC))
+    if checksum_end == -1:
+        return {}
+    checksum = contents[len(_MAGIC):checksum_end]
+    payload = contents[checksum_end + 1:]
+    if checksum != _checksum(payload, optimized):
+        return {}
+    return dict((expression, _decode(node))
+                for expression, node in marshal.loads(payload))
+
+
+def save(filename, asts, optimized=True):
+    """Store ``asts``, a dict of expressions to ``ast.Node``.
+
+    The file is written to a temporary file that's renamed to
+    ``filename``, so concurrent readers never see a partial file.
+
+    """
+    entries = tuple((expression, _encode(node))
+                    for expression, node in sorted(asts.items()))
+    try:
+        payload = marshal.dumps(entries)
+    except ValueError:
+        # Folded literals can be values marshal doesn't support,
+        # these expressions aren't stored.
+        entries = tuple(entry for entry in entries if _can_marshal(entry))
+        payload = marshal.dumps(entries)
+    # A temporary file of its own for every writer, even in the same
+    # process.
+    fd, temporary = tempfile.mkstemp(
+        prefix=os.path.basename(filename) + '.', suffix='.tmp',
+        dir=os.path.dirname(filename) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(_checksum(payload, optimized))
+            f.write(b'\n')
+            f.write(payload)
+        _replace(temporary, filename)
+    except Exception:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def _fingerprint(optimized):
+    from jmespath import __version__
+    return '%s:%s:%s:%s:%s' % (
+        FORMAT_VERSION, __version__, marshal.version,
+        ','.join(ast.NODE_TYPES), 'optimized' if optimized else 'raw')
+
+
+def _checksum(payload, optimized):
+    digest = hashlib.sha256(_fingerprint(optimized).encode('utf-8'))
+    digest.update(payload)
+    return digest.hexdigest().encode('ascii')
+
+
+def _can_marshal(value):
+    try:
+        marshal.dumps(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _encode(node):
+    if not isinstance(node, ast.Node):
+        # Slice children are the (optional) integer start/stop/step.
+        return node
+    return (node.tag, tuple(_encode(child) for child in node.children),
+            node.value)
+
+
+def _decode(data):
+    if not isinstance(data, tuple):
+        return data
+    tag, children, value = data
+    node = ast.Node.__new__(ast.Node)
+    node.tag = tag
+    if children:
+        node.children = [_decode(child) for child in children]
+    else:
+        node.children = ast._NO_CHILDREN
+    node.value = value
+    return node
@@ -0,0 +1,685 @@
+"""Generate python source code from a JMESPath AST.
+
+The ``CodeGenerator`` translates an AST into the source for a single
+python function, ``search(value)``, and builds it with ``compile()`` and
+``exec``.  Every node becomes a few lines of straight-line code that
+store their result in a local variable:
+
+* Chains of field lookups (``a.b.c``) become a single chain of ``.get()``
+  calls guarded by one ``try/except AttributeError``.
+* Projections, flattens and filters become inline ``for`` loops.
+* Literals, slices and exprefs are bound as module level constants.
+
+For example, ``foo[?a > `1`].b`` generates::
+
+    def search(value):
+        try:
+            v0 = value.get('foo')
+        except AttributeError:
+            v0 = None
+        if not isinstance(v0, list):
+            v1 = None
+        else:
+            v1 = []
+            for v2 in v0:
+                ...
+
+The generated source is available as the ``source`` attribute of the
+returned function.  The semantics of the generated code must match the
+corresponding ``visit_*`` method of the ``TreeInterpreter``.
+
+"""
+from jmespath import functions
+from jmespath import inference
+from jmespath.compiler import ClosureCompiler, _CompiledExpressionVisitor
+from jmespath.compiler import _SchemaViolation, _compile_for_schema
+from jmespath.visitor import Visitor, Options, _Expression
+from jmespath.visitor import _equals, _is_comparable
+from jmespath.visitor import _PROJECTIONS, _can_stop_early, _stream_index
+from jmespath.visitor import _Projection, _SHORT_CIRCUIT_FUNCTIONS
+from jmespath.visitor import _streamed_position
+
+
+# The generated code stores results in local variables and nests
+# loops and conditionals.  Python limits the number of indentation
+# levels (100) and statically nested blocks (20, each loop and
+# try/except counts), so subtrees nested deeper than this are evaluated
+# by a compiled closure instead of inline code.
+_MAX_INDENT = 60
+_MAX_LOOPS = 8
+_IS_FALSE = '(%(v)s == "" or %(v)s == [] or %(v)s == {} or %(v)s is None ' \
+    'or %(v)s is False)'
+
+
+class CodeGenerator(Visitor):
+    """Compile an AST into a generated python function.
+
+    Each ``visit_*`` method takes the node and the name of the variable
+    holding the current value, emits the statements needed to evaluate
+    the node, and returns the name of the variable (or constant) holding
+    the result.
+
+    """
+    MAP_TYPE = dict
+    _ORDERING_OPS = {
+        'lt': '<',
+        'gt': '>',
+        'lte': '<=',
+        'gte': '>=',
+    }
+
+    def __init__(self, options=None):
+        super(CodeGenerator, self).__init__()
+        self._dict_cls = self.MAP_TYPE
+        if options is None:
+            options = Options()
+        self._options = options
+        if options.dict_cls is not None:
+            self._dict_cls = self._options.dict_cls
+        if options.custom_functions is not None:
+            self._functions = self._options.custom_functions
+        else:
+            self._functions = functions.Functions()
+        #: The ``inference.NodeTypes`` of the AST, the checks that were
+        #  left out of the generated code are recorded there.
+        self.types = inference.NodeTypes()
+
+    def compile(self, node, types=None):
+        source, namespace = self.generate(node, types)
+        code = compile(source, '<jmespath>', 'exec')
+        exec(code, namespace)
+        search = namespace['search']
+        search.source = source
+        return search
+
+    def compile_for_schema(self, node, schema):
+        """Same as ``ClosureCompiler.compile_for_schema``."""
+        return _compile_for_schema(self, node, schema)
+
+    def generate(self, node, types=None):
+        """Generate the source for ``node``.
+
+        Returns a tuple of the source code and the namespace the source
+        needs to be executed in.  ``types`` is the same as for
+        ``ClosureCompiler.compile``.
+
+        """
+        self._lines = []
+        self._indent = 0
+        self._loops = 0
+        self._var_count = 0
+        self._constant_count = 0
+        self._expref_count = 0
+        self._elements_count = 0
+        if types is None:
+            types = inference.infer_types(node, self._functions,
+                                          self._dict_cls)
+        self.types = types
+        self._namespace = {
+            '_SchemaViolation': _SchemaViolation,
+            '_equals': _equals,
+            '_is_comparable': _is_comparable,
+            '_dict_cls': self._dict_cls,
+            '_call_function': self._functions.call_function,
+            '_call_streamed': self._functions.call_streamed,
+            '_Projection': _Projection,
+            '_Expression': _Expression,
+            '_CompiledExpressionVisitor': _CompiledExpressionVisitor,
+        }
+        # Exprefs are generated as separate functions before the
+        # main function, so they are collected separately.
+        self._functions_source = []
+        self._emit_function('search', node)
+        source = '\n'.join(self._functions_source) + '\n'
+        return source, self._namespace
+
+    def _emit_function(self, name, node, expref=None):
+        saved = self._lines, self._indent, self._loops
+        self._lines = ['def %s(value):' % name]
+        self._indent = 1
+        self._loops = 0
+        if expref is not None:
+            self._emit_guard(self.types.element_guard(expref), 'value')
+        result = self.visit(node, 'value')
+        self._emit('return %s' % result)
+        self._functions_source.append('\n'.join(self._lines))
+        self._lines, self._indent, self._loops = saved
+
+    def visit(self, node, value):
+        if self._indent > _MAX_INDENT or self._loops > _MAX_LOOPS:
+            compiled = ClosureCompiler(self._options).compile(
+                node, self.types)
+            result = self._new_var()
+            self._emit('%s = %s(%s)' % (
+                result, self._add_constant(compiled), value))
+            return result
+        return super(CodeGenerator, self).visit(node, value)
+
+    def default_visit(self, node, *args, **kwargs):
+        raise NotImplementedError(node.type)
+
+    def _emit(self, line):
+        self._lines.append('    ' * self._indent + line)
+
+    def _new_var(self):
+        name = 'v%s' % self._var_count
+        self._var_count += 1
+        return name
+
+    def _add_constant(self, value):
+        name = '_c%s' % self._constant_count
+        self._constant_count += 1
+        self._namespace[name] = value
+        return name
+
+    def _emit_guard(self, allowed, value):
+        # Checks a value read from a document against the python types
+        # of the schema (see ClosureCompiler._guard_read).
+        if allowed is not None:
+            self._emit('if type(%s) not in %s:' % (
+                value, self._add_constant(allowed)))
+            self._emit('    raise _SchemaViolation()')
+
+    def _is_plain_field(self, node):
+        # Whether ``node`` is a field lookup that can be part of a
+        # chain of .get() calls.
+        if node.type == 'field':
+            key = node.value
+        elif node.type == 'field_path':
+            key = node.value[0]
+        else:
+            return False
+        return self.types.read_guard(node) is None and \
+            not self.types.is_present(node, key)
+
+    def _emit_chain(self, children, value):
+        # Consecutive field nodes are combined into a single chain
+        # of .get() calls.
+        pending_fields = []
+        for child in children:
+            if self._is_plain_field(child):
+                if child.type == 'field':
+                    pending_fields.append(child.value)
+                else:
+                    pending_fields.extend(child.value)
+                continue
+            if pending_fields:
+                value = self._emit_field_chain(pending_fields, value)
+                pending_fields = []
+            value = self.visit(child, value)
+        if pending_fields:
+            value = self._emit_field_chain(pending_fields, value)
+        return value
+
+    def _emit_field_chain(self, keys, value):
+        # If any value along the chain is not a dict (including None),
+        # .get() raises an AttributeError and the chain is None, the
+        # same as evaluating each field separately.
+        result = self._new_var()
+        lookups = ''.join('.get(%r)' % key for key in keys)
+        self._emit('try:')
+        self._emit('    %s = %s%s' % (result, value, lookups))
+        self._emit('except AttributeError:')
+        self._emit('    %s = None' % result)
+        return result
+
+    def _emit_projection_loop(self, base, node, result):
+        element = self._new_var()
+        self._emit('%s = []' % result)
+        self._emit('for %s in %s:' % (element, base))
+        self._indent += 1
+        self._loops += 1
+        self._emit_guard(self.types.element_guard(node), element)
+        current = self.visit(node.children[1], element)
+        self._emit('if %s is not None:' % current)
+        self._emit('    %s.append(%s)' % (result, current))
+        self._indent -= 1
+        self._loops -= 1
+
+    def visit_subexpression(self, node, value):
+        return self._emit_chain(node.children, value)
+
+    def visit_index_expression(self, node, value):
+        return self._emit_chain(node.children, value)
+
+    def visit_pipe(self, node, value):
+        left, right = node.children
+        indexed = _stream_index(right)
+        if indexed is not None and not indexed[1] and \
+                left.type in _PROJECTIONS and _can_stop_early(left):
+            return self._emit_first_match(left, indexed[0], value)
+        if right.type == 'function_expression' and left.type in _PROJECTIONS:
+            position = _streamed_position(self._functions, right, True)
+            if position is not None and \
+                    self._can_stream(right.value, left):
+                return self._emit_streamed_function(right, position, value,
+                                                    left)
+        return self._emit_chain(node.children, value)
+
+    def _emit_first_match(self, node, index, value):
+        # ``node | [index]`` is a loop over the projected elements that
+        # breaks out once the element is found.
+        base = self.visit(node.children[0], value)
+        result = self._new_var()
+        elements = self._new_var()
+        self._emit('%s = None' % result)
+        if node.type == 'value_projection':
+            self._emit('try:')
+            self._emit('    %s = %s.values()' % (elements, base))
+            self._emit('except AttributeError:')
+            self._emit('    %s = ()' % elements)
+        elif self.types.is_list(node.children[0]):
+            elements = base
+        else:
+            self._emit('%s = %s if isinstance(%s, list) else ()' % (
+                elements, base, base))
+        remaining = None
+        if index:
+            remaining = self._new_var()
+            self._emit('%s = %r' % (remaining, index))
+        element = self._new_var()
+        indent = self._indent
+        self._emit('for %s in %s:' % (element, elements))
+        self._indent += 1
+        self._loops += 1
+        if node.type == 'flatten':
+            self._emit('if isinstance(%s, list):' % element)
+            self._indent += 1
+            if remaining is None:
+                self._emit('if %s:' % element)
+                self._emit('    %s = %s[0]' % (result, element))
+                self._emit('    break')
+            else:
+                self._emit('if %s < len(%s):' % (remaining, element))
+                self._emit('    %s = %s[%s]' % (result, element, remaining))
+                self._emit('    break')
+                self._emit('%s -= len(%s)' % (remaining, element))
+            self._indent -= 1
+            self._emit('else:')
+            self._indent += 1
+            self._emit_found(element, remaining, result)
+        else:
+            self._emit_guard(self.types.element_guard(node), element)
+            if node.type == 'filter_projection':
+                self._emit_condition(node.children[2], element)
+                self._indent += 1
+            current = self.visit(node.children[1], element)
+            self._emit('if %s is not None:' % current)
+            self._indent += 1
+            self._emit_found(current, remaining, result)
+        self._indent = indent
+        self._loops -= 1
+        return result
+
+    def _emit_found(self, current, remaining, result):
+        if remaining is None:
+            self._emit('%s = %s' % (result, current))
+            self._emit('break')
+            return
+        self._emit('if %s == 0:' % remaining)
+        self._emit('    %s = %s' % (result, current))
+        self._emit('    break')
+        self._emit('%s -= 1' % remaining)
+
+    def visit_field(self, node, value):
+        return self._emit_field_read(node, [node.value], value)
+
+    def visit_field_path(self, node, value):
+        return self._emit_field_read(node, node.value, value)
+
+    def _emit_field_read(self, node, keys, value):
+        if self.types.is_present(node, keys[0]):
+            # The first field is required by the schema.
+            result = self._new_var()
+            self._emit('try:')
+            self._emit('    %s = %s[%r]' % (result, value, keys[0]))
+            self._emit('except KeyError:')
+            self._emit('    raise _SchemaViolation()')
+            if len(keys) > 1:
+                result = self._emit_field_chain(keys[1:], result)
+        else:
+            result = self._emit_field_chain(keys, value)
+        self._emit_guard(self.types.read_guard(node), result)
+        return result
+
+    def visit_comparator(self, node, value):
+        left = self.visit(node.children[0], value)
+        right = self.visit(node.children[1], value)
+        result = self._new_var()
+        comparator = node.value
+        literals = [child.value for child in node.children
+                    if child.type == 'literal']
+        if comparator in ('eq', 'ne'):
+            if self.types.is_plain_equality(node):
+                # Comparing against a literal that _equals() doesn't
+                # special case, or values of types it doesn't special
+                # case, is the same as ==.
+                self._emit('%s = %s %s %s' % (
+                    result, left, '==' if comparator == 'eq' else '!=',
+                    right))
+            elif comparator == 'eq':
+                self._emit('%s = _equals(%s, %s)' % (result, left, right))
+            else:
+                self._emit('%s = not _equals(%s, %s)' % (
+                    result, left, right))
+            return result
+        # Ordering operators are only valid for numbers (and
+        # strings).  Evaluating any other type with a comparison
+        # operator will yield a None value.  Literals are checked
+        # here instead of in the generated code.
+        if not all(_is_comparable(literal) for literal in literals):
+            self._emit('%s = None' % result)
+            return result
+        checks = ['_is_comparable(%s)' % name
+                  for child, name in zip(node.children, [left, right])
+                  if child.type != 'literal' and
+                  not self.types.is_comparable(child)]
+        operation = '%s %s %s' % (left, self._ORDERING_OPS[comparator], right)
+        if not checks:
+            self._emit('%s = %s' % (result, operation))
+            return result
+        self._emit('if %s:' % ' and '.join(checks))
+        self._emit('    %s = %s' % (result, operation))
+        self._emit('else:')
+        self._emit('    %s = None' % result)
+        return result
+
+    def visit_current(self, node, value):
+        return value
+
+    def visit_identity(self, node, value):
+        return value
+
+    def visit_expref(self, node, value):
+        # The expref is generated as its own function.  The function
+        # only exists once the source is executed, so the _Expression
+        # wrapping it is created by the generated source as well.
+        name = '_expref%s' % self._expref_count
+        self._expref_count += 1
+        self._emit_function(name + '_search', node.children[0], node)
+        self._functions_source.append(
+            '%s = _Expression(%s, _CompiledExpressionVisitor(%s))' % (
+                name, self._add_constant(node.children[0]),
+                name + '_search'))
+        return name
+
+    def visit_function_expression(self, node, value):
+        position = _streamed_position(self._functions, node)
+        if position is not None and \
+                self._can_stream(node.value, node.children[position]):
+            return self._emit_streamed_function(node, position, value)
+        # The function is bound to its implementation now, which
+        # raises any arity error at compile time.
+        call = self._add_constant(self._functions.resolve_function(
+            node.value, self.types.argument_types(node, self._functions)))
+        args = [self.visit(child, value) for child in node.children]
+        result = self._new_var()
+        self._emit('%s = %s([%s])' % (result, call, ', '.join(args)))
+        return result
+
+    # Aggregate pushdown.  The functions that can consume a projection
+    # one element at a time, such as sum(a[*].b), are given a
+    # _Projection over a generated generator function that yields the
+    # projected elements, instead of the list.  The left hand side of
+    # the projection is evaluated as usual.
+
+    def _can_stream(self, name, projection):
+        return (name not in _SHORT_CIRCUIT_FUNCTIONS or
+                _can_stop_early(projection))
+
+    def _emit_streamed_function(self, node, position, value,
+                                projection=None):
+        # ``projection`` is the projection piped into the function,
+        # otherwise it's the streamed argument.
+        if projection is None:
+            projection = node.children[position]
+        args = []
+        for i, child in enumerate(node.children):
+            if i == position:
+                args.append(self._emit_projected(projection, value))
+            else:
+                args.append(self.visit(child, value))
+        result = self._new_var()
+        self._emit('if %s is None:' % args[position])
+        self._emit('    %s = _call_function(%r, [%s])' % (
+            result, node.value, ', '.join(args)))
+        self._emit('else:')
+        self._emit('    %s = _call_streamed(%r, [%s])' % (
+            result, node.value, ', '.join(args)))
+        return result
+
+    def _emit_projected(self, node, value):
+        # Evaluates to a _Projection over the elements of ``node``, or
+        # None if it evaluates to null.
+        base = self.visit(node.children[0], value)
+        result = self._new_var()
+        elements = self._emit_elements_function(node)
+        if node.type == 'value_projection':
+            self._emit('try:')
+            self._emit('    %s = _Projection(%s(%s.values()))' % (
+                result, elements, base))
+            self._emit('except AttributeError:')
+            self._emit('    %s = None' % result)
+        else:
+            indent = self._indent
+            if self._emit_list_check(node.children[0], base, result):
+                self._indent += 1
+            self._emit('%s = _Projection(%s(%s))' % (result, elements, base))
+            self._indent = indent
+        return result
+
+    def _emit_elements_function(self, node):
+        # Generates a generator function that takes the elements the
+        # projection ``node`` applies to and yields the projected
+        # elements.
+        name = '_elements%s' % self._elements_count
+        self._elements_count += 1
+        saved = self._lines, self._indent, self._loops
+        self._lines = ['def %s(elements):' % name]
+        self._indent = 1
+        self._loops = 1
+        element = self._new_var()
+        self._emit('for %s in elements:' % element)
+        self._indent += 1
+        if node.type == 'flatten':
+            item = self._new_var()
+            self._emit('if isinstance(%s, list):' % element)
+            self._emit('    for %s in %s:' % (item, element))
+            self._emit('        yield %s' % item)
+            self._emit('else:')
+            self._emit('    yield %s' % element)
+        else:
+            self._emit_guard(self.types.element_guard(node), element)
+            if node.type == 'filter_projection':
+                self._emit_condition(node.children[2], element)
+                self._indent += 1
+            current = self.visit(node.children[1], element)
+            self._emit('if %s is not None:' % current)
+            self._emit('    yield %s' % current)
+        self._functions_source.append('\n'.join(self._lines))
+        self._lines, self._indent, self._loops = saved
+        return name
+
+    def visit_filter_projection(self, node, value):
+        base = self.visit(node.children[0], value)
+        result = self._new_var()
+        element = self._new_var()
+        indent = self._indent
+        if self._emit_list_check(node.children[0], base, result):
+            self._indent += 1
+        self._emit('%s = []' % result)
+        self._emit('for %s in %s:' % (element, base))
+        self._indent += 1
+        self._loops += 1
+        self._emit_guard(self.types.element_guard(node), element)
+        self._emit_condition(node.children[2], element)
+        self._indent += 1
+        current = self.visit(node.children[1], element)
+        self._emit('if %s is not None:' % current)
+        self._emit('    %s.append(%s)' % (result, current))
+        self._indent = indent
+        self._loops -= 1
+        return result
+
+    def _emit_condition(self, node, value):
+        # Emits the ``if`` statement of a filter condition.
+        condition = self.visit(node, value)
+        if self.types.has_python_truthiness(node):
+            self._emit('if %s:' % condition)
+        else:
+            self._emit('if not %s:' % (_IS_FALSE % {'v': condition}))
+
+    def _emit_list_check(self, node, base, result):
+        # Emits the start of an ``if`` statement that sets ``result``
+        # to None unless ``base``, the value of ``node``, is a list.
+        # Returns False if ``node`` is always a list, in which case
+        # nothing is emitted.
+        if self.types.is_list(node):
+            return False
+        self._emit('if not isinstance(%s, list):' % base)
+        self._emit('    %s = None' % result)
+        self._emit('else:')
+        return True
+
+    def visit_flatten(self, node, value):
+        base = self.visit(node.children[0], value)
+        result = self._new_var()
+        element = self._new_var()
+        indent = self._indent
+        if self._emit_list_check(node.children[0], base, result):
+            self._indent += 1
+        self._emit('%s = []' % result)
+        self._emit('for %s in %s:' % (element, base))
+        self._emit('    if isinstance(%s, list):' % element)
+        self._emit('        %s.extend(%s)' % (result, element))
+        self._emit('    else:')
+        self._emit('        %s.append(%s)' % (result, element))
+        self._indent = indent
+        return result
+
+    def visit_index(self, node, value):
+        result = self._new_var()
+        indent = self._indent
+        if not self.types.input_is_list(node):
+            # Even though we can index strings, we don't
+            # want to support that.
+            self._emit('if not isinstance(%s, list):' % value)
+            self._emit('    %s = None' % result)
+            self._emit('else:')
+            self._indent += 1
+        self._emit('try:')
+        self._emit('    %s = %s[%r]' % (result, value, node.value))
+        self._emit('except IndexError:')
+        self._emit('    %s = None' % result)
+        self._indent = indent
+        self._emit_guard(self.types.read_guard(node), result)
+        return result
+
+    def visit_slice(self, node, value):
+        result = self._new_var()
+        s = self._add_constant(slice(*node.children))
+        if self.types.input_is_list(node):
+            self._emit('%s = %s[%s]' % (result, value, s))
+            return result
+        self._emit('if isinstance(%s, list):' % value)
+        self._emit('    %s = %s[%s]' % (result, value, s))
+        self._emit('else:')
+        self._emit('    %s = None' % result)
+        return result
+
+    def visit_key_val_pair(self, node, value):
+        return self.visit(node.children[0], value)
+
+    def visit_literal(self, node, value):
+        return self._add_constant(node.value)
+
+    def visit_multi_select_dict(self, node, value):
+        result = self._new_var()
+        self._emit('if %s is None:' % value)
+        self._emit('    %s = None' % result)
+        self._emit('else:')
+        self._indent += 1
+        self._emit('%s = _dict_cls()' % result)
+        for child in node.children:
+            current = self.visit(child, value)
+            self._emit('%s[%r] = %s' % (result, child.value, current))
+        self._indent -= 1
+        return result
+
+    def visit_multi_select_list(self, node, value):
+        result = self._new_var()
+        self._emit('if %s is None:' % value)
+        self._emit('    %s = None' % result)
+        self._emit('else:')
+        self._indent += 1
+        collected = [self.visit(child, value) for child in node.children]
+        self._emit('%s = [%s]' % (result, ', '.join(collected)))
+        self._indent -= 1
+        return result
+
+    def visit_or_expression(self, node, value):
+        left = self.visit(node.children[0], value)
+        result = self._new_var()
+        self._emit('%s = %s' % (result, left))
+        self._emit('if %s:' % self._is_false(node.children[0], result))
+        self._indent += 1
+        right = self.visit(node.children[1], value)
+        self._emit('%s = %s' % (result, right))
+        self._indent -= 1
+        return result
+
+    def visit_and_expression(self, node, value):
+        left = self.visit(node.children[0], value)
+        result = self._new_var()
+        self._emit('%s = %s' % (result, left))
+        self._emit('if not %s:' % self._is_false(node.children[0], result))
+        self._indent += 1
+        right = self.visit(node.children[1], value)
+        self._emit('%s = %s' % (result, right))
+        self._indent -= 1
+        return result
+
+    def _is_false(self, node, value):
+        # An expression that is true if ``value``, the value of
+        # ``node``, is false.
+        if self.types.has_python_truthiness(node):
+            return '(not %s)' % value
+        return _IS_FALSE % {'v': value}
+
+    def visit_not_expression(self, node, value):
+        child = self.visit(node.children[0], value)
+        result = self._new_var()
+        if self.types.is_never_zero(node.children[0]):
+            self._emit('%s = not %s' % (result, child))
+            return result
+        # Special case for 0, !0 should be false, not true.
+        # 0 is not a special cased integer in jmespath.
+        self._emit('if type(%s) is int and %s == 0:' % (child, child))
+        self._emit('    %s = False' % result)
+        self._emit('else:')
+        self._emit('    %s = not %s' % (result, child))
+        return result
+
+    def visit_projection(self, node, value):
+        base = self.visit(node.children[0], value)
+        result = self._new_var()
+        indent = self._indent
+        if self._emit_list_check(node.children[0], base, result):
+            self._indent += 1
+        self._emit_projection_loop(base, node, result)
+        self._indent = indent
+        return result
+
+    def visit_value_projection(self, node, value):
+        base = self.visit(node.children[0], value)
+        result = self._new_var()
+        values = self._new_var()
+        self._emit('try:')
+        self._emit('    %s = %s.values()' % (values, base))
+        self._emit('except AttributeError:')
+        self._emit('    %s = None' % result)
+        self._emit('else:')
+        self._indent += 1
+        self._emit_projection_loop(values, node, result)
+        self._indent -= 1
+        return result
@@ -16,6 +16,7 @@ if PY2:
     text_type = unicode
     string_type = basestring
     from itertools import izip_longest as zip_longest
+    from itertools import imap
 
     def with_str_method(cls):
         """Class decorator that handles __str__ compat between py2 and py3."""
@@ -51,6 +52,7 @@ else:
     text_type = str
     string_type = str
     from itertools import zip_longest
+    imap = map
 
     def with_str_method(cls):
         # In python3, we don't need to do anything, we return a str type.
@@ -0,0 +1,981 @@
+"""Compile a JMESPath AST into nested python closures.
+
+The ``TreeInterpreter`` walks the AST on every search, which means that
+every node evaluation pays for a node type lookup, a method cache probe,
+and a bound method call.  The ``ClosureCompiler`` does that walk exactly
+once.  Each node is turned into a python function that takes the current
+value and returns the result of evaluating that node.  The functions for
+the child nodes, along with any constant values (field names, literals,
+comparator functions, etc.), are bound in the enclosing scope of the
+returned function so evaluating an expression is just a series of direct
+function calls.
+
+The semantics of each compiled node must match the corresponding
+``visit_*`` method of the ``TreeInterpreter``.  Both are run against the
+compliance tests.
+
+"""
+import itertools
+import operator
+import threading
+
+from jmespath import functions
+from jmespath import inference
+from jmespath import kernels
+from jmespath.visitor import Visitor, Options, _Expression
+from jmespath.visitor import _is_comparable, TreeInterpreter
+from jmespath.visitor import _PROJECTIONS, _cannot_raise
+from jmespath.visitor import _can_stop_early, _stream_index
+from jmespath.visitor import _Projection, _SHORT_CIRCUIT_FUNCTIONS
+from jmespath.visitor import _streamed_position
+from jmespath.visitor import _flatten_elements
+
+
+def _is_false(value):
+    # Same as TreeInterpreter._is_false, this uses explicit
+    # equality checks because the truth/false values are different
+    # between python and jmespath.
+    return (value == '' or value == [] or value == {} or value is None or
+            value is False)
+
+
+# Node types that are cheaper to evaluate than to look up in the memo.
+_NOT_WORTH_SHARING = frozenset([
+    'current', 'expref', 'field', 'field_path', 'identity', 'index',
+    'key_val_pair', 'literal', 'slice',
+])
+_FUSABLE = _PROJECTIONS
+_FIRST_CHILD_SAME_INPUT = frozenset([
+    'filter_projection', 'flatten', 'index_expression', 'pipe',
+    'projection', 'subexpression', 'value_projection',
+])
+_ALL_CHILDREN_SAME_INPUT = frozenset([
+    'and_expression', 'comparator', 'function_expression', 'key_val_pair',
+    'multi_select_dict', 'multi_select_list', 'not_expression',
+    'or_expression',
+])
+
+
+def _same_input_children(node):
+    # The children of ``node`` that are evaluated against the same
+    # value as ``node`` itself.  This must agree with which children
+    # the ClosureCompiler compiles with _compile_scope().
+    node_type = node.type
+    if node_type in _FIRST_CHILD_SAME_INPUT:
+        return node.children[:1]
+    elif node_type in _ALL_CHILDREN_SAME_INPUT:
+        return node.children
+    return []
+
+
+def _returns_boolean(node):
+    # Whether the node always evaluates to true, false or null, in
+    # which case python and JMESPath agree on its truthiness.
+    node_type = node.type
+    if node_type in ('comparator', 'not_expression'):
+        return True
+    elif node_type in ('and_expression', 'or_expression'):
+        return all(_returns_boolean(child) for child in node.children)
+    return False
+
+
+def _fusion_is_safe(nodes):
+    # Fusing stages interleaves their evaluation: the right hand side
+    # of the second stage runs for the first element before the first
+    # stage runs for the second element.  That's unobservable unless
+    # more than one stage can raise an error, in which case a
+    # different error could be raised first.
+    may_raise = 0
+    remaining = list(nodes)
+    while remaining:
+        node = remaining.pop()
+        if node.type not in _FUSABLE:
+            continue
+        if node.type in ('projection', 'value_projection',
+                            'filter_projection'):
+            if not all(_cannot_raise(child) for child in node.children[1:]):
+                may_raise += 1
+        if node.type != 'value_projection':
+            remaining.append(node.children[0])
+    return may_raise <= 1
+
+
+def _fused_can_stop_early(node):
+    # _can_stop_early() for every stage that may be fused with ``node``.
+    while node.type in _FUSABLE:
+        if not _can_stop_early(node):
+            return False
+        if node.type == 'value_projection':
+            break
+        node = node.children[0]
+    return True
+
+
+def _project_elements(elements, right):
+    for element in elements:
+        current = right(element)
+        if current is not None:
+            yield current
+
+
+def _filter_elements(elements, condition, right):
+    for element in elements:
+        if condition(element):
+            current = right(element)
+            if current is not None:
+                yield current
+
+
+def _filter_selection_key(node):
+    # The key for the elements selected by a filter, which does not
+    # depend on the right hand side of the filter projection.
+    if node.type != 'filter_projection':
+        return None
+    return 'filter:%r:%r' % (node.children[0], node.children[2])
+
+
+class _SchemaViolation(Exception):
+    # Raised by an expression compiled for a schema when it reads a
+    # value that doesn't match the schema.
+    pass
+
+
+class _Memo(threading.local):
+    # The results of the shared subtrees for the scope currently
+    # being evaluated (in this thread).
+    values = None
+
+
+_MEMO = _Memo()
+
+
+def _new_memo_scope(compiled):
+    def memo_scope(value):
+        saved = _MEMO.values
+        _MEMO.values = {}
+        try:
+            return compiled(value)
+        finally:
+            _MEMO.values = saved
+    return memo_scope
+
+
+def _memoized(compiled, memo_key):
+    # Shared subtrees are only evaluated when they're first needed,
+    # so short circuiting (||, &&) and the order of evaluation, and
+    # therefore which error is raised first, are unchanged.
+    def memoized(value):
+        values = _MEMO.values
+        try:
+            return values[memo_key]
+        except KeyError:
+            result = values[memo_key] = compiled(value)
+            return result
+    return memoized
+
+
+class _CompiledExpressionVisitor(object):
+    # Used as the "interpreter" of an ``_Expression`` (expref) so
+    # that functions such as sort_by() can call
+    # ``expref.visit(expref.expression, value)`` and have it
+    # evaluated by the compiled function instead of the tree
+    # interpreter.
+    def __init__(self, compiled):
+        self._compiled = compiled
+
+    def visit(self, node, value):
+        return self._compiled(value)
+
+
+class ClosureCompiler(Visitor):
+    """Compile an AST into a python callable.
+
+    The callable accepts a single argument, the value to search,
+    and returns the result of evaluating the expression against that
+    value.  The options (dict class and function table) are bound at
+    compile time.
+
+    The types inferred for the nodes of the AST (see ``inference``) are
+    used to leave out runtime checks that can't fail, the ``types``
+    attribute lists them after ``compile()``.
+
+    """
+    COMPARATOR_FUNC = TreeInterpreter.COMPARATOR_FUNC
+    # Comparators whose operands can't be the special cases of _equals.
+    _PLAIN_EQUALITY_FUNC = {'eq': operator.eq, 'ne': operator.ne}
+    _EQUALITY_OPS = TreeInterpreter._EQUALITY_OPS
+    MAP_TYPE = dict
+
+    def __init__(self, options=None):
+        super(ClosureCompiler, self).__init__()
+        self._dict_cls = self.MAP_TYPE
+        if options is None:
+            options = Options()
+        self._options = options
+        if options.dict_cls is not None:
+            self._dict_cls = self._options.dict_cls
+        if options.custom_functions is not None:
+            self._functions = self._options.custom_functions
+        else:
+            self._functions = functions.Functions()
+        # Maps the key of each subtree that appears more than once
+        # in the current scope to its key in the memo.
+        self._shared = {}
+        self._shared_compiled = {}
+        #: The ``inference.NodeTypes`` of the compiled AST.
+        self.types = inference.NodeTypes()
+
+    def compile(self, node, types=None):
+        """Compile the AST ``node``.
+
+        ``types`` is the ``inference.NodeTypes`` of an AST that
+        ``node`` is part of, if the types are inferred for ``node``
+        by default.
+
+        """
+        if types is None:
+            types = inference.infer_types(node, self._functions,
+                                          self._dict_cls)
+        self.types = types
+        return self._compile_scope(node)
+
+    def compile_for_schema(self, node, schema):
+        """Compile the AST ``node`` for the documents of ``schema``.
+
+        ``schema`` is returned by ``inference.parse_schema``.  The
+        checks that can't fail for these documents are left out, and
+        the fields that are always present are looked up directly.  In
+        exchange, the callable checks the values it reads whose types
+        it relies on, and raises a ``_SchemaViolation`` if a value
+        doesn't match the schema.
+
+        """
+        return _compile_for_schema(self, node, schema)
+
+    def _compile_scope(self, node):
+        # A scope is the set of nodes evaluated against the same
+        # value.  Structurally identical subtrees within a scope,
+        # such as the filter in
+        # {total: sum(items[?active].price), n: length(items[?active])},
+        # always produce the same result, so they are evaluated once
+        # per evaluation of the scope and shared.
+        saved = self._shared, self._shared_compiled
+        self._shared = self._find_common_subexpressions(node)
+        self._shared_compiled = {}
+        try:
+            compiled = self.visit(node)
+            if self._shared_compiled:
+                compiled = _new_memo_scope(compiled)
+        finally:
+            self._shared, self._shared_compiled = saved
+        return compiled
+
+    def _find_common_subexpressions(self, node):
+        counts = {}
+        remaining = [node]
+        while remaining:
+            current = remaining.pop()
+            keys = []
+            if current.type not in _NOT_WORTH_SHARING:
+                keys.append(repr(current))
+            # Sharing a filter's selection evaluates the condition for
+            # every element before the right hand side is evaluated for
+            # any element.
+            if current.type == 'filter_projection' and \
+                    _cannot_raise(current.children[1]):
+                keys.append(_filter_selection_key(current))
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+            remaining.extend(_same_input_children(current))
+        shared = {}
+        for key, count in counts.items():
+            if count > 1:
+                shared[key] = len(shared)
+        return shared
+
+    def visit(self, node):
+        if not self._shared:
+            return super(ClosureCompiler, self).visit(node)
+        key = repr(node)
+        memo_key = self._shared.get(key)
+        if memo_key is None:
+            return super(ClosureCompiler, self).visit(node)
+        compiled = self._shared_compiled.get(memo_key)
+        if compiled is None:
+            compiled = _memoized(
+                super(ClosureCompiler, self).visit(node), memo_key)
+            self._shared_compiled[memo_key] = compiled
+        return compiled
+
+    def default_visit(self, node, *args, **kwargs):
+        raise NotImplementedError(node.type)
+
+    def visit_subexpression(self, node):
+        return self._compile_chain(node.children)
+
+    def visit_index_expression(self, node):
+        return self._compile_chain(node.children)
+
+    def visit_pipe(self, node):
+        left, right = node.children
+        # a[*].b | [*].c: the right side projects over the result of
+        # the left side, so the two are fused.
+        if self._can_fuse(left) and self._can_fuse_with_source(right) and \
+                _fusion_is_safe([left, right]):
+            return self._compile_fused(right, self._compile_elements(left))
+        # a[?b] | [0]: only evaluated up to the element that's taken.
+        indexed = _stream_index(right)
+        if indexed is not None and not indexed[1] and \
+                self._can_fuse(left) and _fused_can_stop_early(left):
+            return self._compile_first_match(left, indexed[0])
+        # a[*].b | sum(@)
+        if right.type == 'function_expression':
+            position = _streamed_position(self._functions, right, True)
+            if position is not None and \
+                    self._can_stream(right.value, left):
+                return self._compile_streamed_function(right, position,
+                                                       left)
+        return self._compile_chain(node.children)
+
+    def _compile_first_match(self, node, index):
+        elements = self._compile_elements(node)
+
+        def first_match(value):
+            produced = elements(value)
+            if produced is None:
+                return None
+            return next(itertools.islice(produced, index, None), None)
+        return first_match
+
+    def _compile_chain(self, children):
+        # Only the first child is evaluated against the current value,
+        # every other child starts a new scope.
+        compiled = [self.visit(children[0])]
+        compiled.extend(self._compile_scope(child) for child in children[1:])
+        if len(compiled) == 2:
+            first, second = compiled
+
+            def chain(value):
+                return second(first(value))
+            return chain
+
+        def chain(value):
+            for child in compiled:
+                value = child(value)
+            return value
+        return chain
+
+    def visit_field(self, node):
+        key = node.value
+        if self.types.is_present(node, key):
+            return self._guard_read(node, _present_field(key))
+
+        def field(value):
+            try:
+                return value.get(key)
+            except AttributeError:
+                return None
+        return self._guard_read(node, field)
+
+    def visit_field_path(self, node):
+        keys = tuple(node.value)
+        if self.types.is_present(node, keys[0]):
+            first = _present_field(keys[0])
+            rest = _field_path(keys[1:])
+
+            def field_path(value):
+                return rest(first(value))
+            return self._guard_read(node, field_path)
+        return self._guard_read(node, _field_path(keys))
+
+    def _guard_elements(self, node, compiled):
+        # Same as _guard_read, for the elements ``node`` applies
+        # ``compiled`` to.
+        allowed = self.types.element_guard(node)
+        if allowed is None:
+            return compiled
+
+        def guarded_elements(element):
+            if type(element) not in allowed:
+                raise _SchemaViolation()
+            return compiled(element)
+        return guarded_elements
+
+    def _guard_read(self, node, read):
+        # The values read from a document whose types the compiled
+        # expression relies on are checked against the schema.
+        allowed = self.types.read_guard(node)
+        if allowed is None:
+            return read
+
+        def guarded_read(value):
+            result = read(value)
+            if type(result) not in allowed:
+                raise _SchemaViolation()
+            return result
+        return guarded_read
+
+    def visit_comparator(self, node):
+        comparator_func = self.COMPARATOR_FUNC[node.value]
+        left = self.visit(node.children[0])
+        right = self.visit(node.children[1])
+        if node.value in self._EQUALITY_OPS:
+            if self.types.is_plain_equality(node):
+                comparator_func = self._PLAIN_EQUALITY_FUNC[node.value]
+
+            def comparator(value):
+                return comparator_func(left(value), right(value))
+            return comparator
+        # Ordering operators are only valid for numbers (and
+        # strings).  Evaluating any other type with a comparison
+        # operator will yield a None value.
+        left_comparable = self.types.is_comparable(node.children[0])
+        right_comparable = self.types.is_comparable(node.children[1])
+        if left_comparable and right_comparable:
+            def comparator(value):
+                return comparator_func(left(value), right(value))
+        elif left_comparable:
+            def comparator(value):
+                left_value = left(value)
+                right_value = right(value)
+                if not _is_comparable(right_value):
+                    return None
+                return comparator_func(left_value, right_value)
+        elif right_comparable:
+            def comparator(value):
+                left_value = left(value)
+                right_value = right(value)
+                if not _is_comparable(left_value):
+                    return None
+                return comparator_func(left_value, right_value)
+        else:
+            def comparator(value):
+                left_value = left(value)
+                right_value = right(value)
+                if not (_is_comparable(left_value) and
+                        _is_comparable(right_value)):
+                    return None
+                return comparator_func(left_value, right_value)
+        return comparator
+
+    def visit_current(self, node):
+        return _identity
+
+    def visit_identity(self, node):
+        return _identity
+
+    def visit_expref(self, node):
+        compiled = self._guard_elements(
+            node, self._compile_scope(node.children[0]))
+        expref = _Expression(node.children[0],
+                             _CompiledExpressionVisitor(compiled))
+
+        def expref_value(value):
+            return expref
+        return expref_value
+
+    def visit_function_expression(self, node):
+        position = _streamed_position(self._functions, node)
+        if position is not None and \
+                self._can_stream(node.value, node.children[position]):
+            return self._compile_streamed_function(node, position)
+        # The function is bound to its implementation now, which
+        # raises any arity error at compile time.
+        call = self._functions.resolve_function(
+            node.value, self.types.argument_types(node, self._functions))
+        args = [self.visit(child) for child in node.children]
+        if len(args) == 1:
+            arg = args[0]
+
+            def function_expression(value):
+                return call([arg(value)])
+            return function_expression
+
+        def function_expression(value):
+            return call([arg(value) for arg in args])
+        return function_expression
+
+    # Aggregate pushdown.  The functions that can consume a projection
+    # one element at a time, such as sum(a[*].b), are given the
+    # elements of the fused projection stages as a _Projection, so
+    # the projected list is never built.
+
+    def _can_stream(self, name, projection):
+        if not self._can_fuse(projection):
+            return False
+        if name in _SHORT_CIRCUIT_FUNCTIONS:
+            return _fused_can_stop_early(projection)
+        return _fusion_is_safe([projection])
+
+    def _compile_streamed_function(self, node, position, projection=None):
+        # ``projection`` is the projection piped into the function,
+        # otherwise it's the streamed argument.
+        name = node.value
+        if projection is None:
+            projection = node.children[position]
+        elements = self._compile_elements(projection)
+
+        def projected(value):
+            produced = elements(value)
+            if produced is None:
+                return None
+            return _Projection(produced)
+        args = [self.visit(child) for child in node.children]
+        args[position] = projected
+        call_function = self._functions.call_function
+        call_streamed = self._functions.call_streamed
+
+        def streamed_function(value):
+            resolved_args = [arg(value) for arg in args]
+            if resolved_args[position] is None:
+                return call_function(name, resolved_args)
+            return call_streamed(name, resolved_args)
+        return streamed_function
+
+    def visit_filter_projection(self, node):
+        selection_key = self._shared.get(_filter_selection_key(node))
+        if selection_key is not None:
+            return self._compile_shared_filter_projection(node,
+                                                          selection_key)
+        if self._should_fuse(node):
+            return self._compile_fused(node)
+        left = self.visit(node.children[0])
+        right = self._compile_scope(node.children[1])
+        condition = self._compile_filter_condition(node)
+        if self.types.is_list(node.children[0]):
+            def filter_projection(value):
+                collected = []
+                for element in left(value):
+                    if condition(element):
+                        current = right(element)
+                        if current is not None:
+                            collected.append(current)
+                return collected
+            return filter_projection
+
+        def filter_projection(value):
+            base = left(value)
+            if not isinstance(base, list):
+                return None
+            collected = []
+            for element in base:
+                if condition(element):
+                    current = right(element)
+                    if current is not None:
+                        collected.append(current)
+            return collected
+        return filter_projection
+
+    def _compile_filter_condition(self, filter_node):
+        # Returns a function whose python truthiness matches the
+        # JMESPath truthiness of the condition.  It's evaluated first
+        # for every element, so it checks the elements if needed.
+        return self._guard_elements(
+            filter_node, self._compile_condition(filter_node.children[2]))
+
+    def _compile_condition(self, node):
+        predicate = kernels.compile_filter_predicate(node)
+        if predicate is not None:
+            return predicate
+        condition = self._compile_scope(node)
+        if _returns_boolean(node) or self.types.has_python_truthiness(node):
+            return condition
+
+        def predicate(element):
+            return not _is_false(condition(element))
+        return predicate
+
+    def _compile_shared_filter_projection(self, node, selection_key):
+        # Filters that only differ in their right hand side, such as
+        # items[?active].price and items[?active], share the list of
+        # elements that match the condition.
+        select = self._shared_compiled.get(selection_key)
+        if select is None:
+            left = self.visit(node.children[0])
+            condition = self._compile_filter_condition(node)
+            is_list = self.types.is_list(node.children[0])
+
+            def select(value):
+                base = left(value)
+                if not is_list and not isinstance(base, list):
+                    return None
+                return [element for element in base if condition(element)]
+            select = _memoized(select, selection_key)
+            self._shared_compiled[selection_key] = select
+        right = self._compile_scope(node.children[1])
+
+        def filter_projection(value):
+            selected = select(value)
+            if selected is None:
+                return None
+            collected = []
+            for element in selected:
+                current = right(element)
+                if current is not None:
+                    collected.append(current)
+            return collected
+        return filter_projection
+
+    def visit_flatten(self, node):
+        if self._should_fuse(node):
+            return self._compile_fused(node)
+        child = self.visit(node.children[0])
+        is_list = self.types.is_list(node.children[0])
+
+        def flatten(value):
+            base = child(value)
+            if not is_list and not isinstance(base, list):
+                # Can't flatten the object if it's not a list.
+                return None
+            merged_list = []
+            for element in base:
+                if isinstance(element, list):
+                    merged_list.extend(element)
+                else:
+                    merged_list.append(element)
+            return merged_list
+        return flatten
+
+    def visit_index(self, node):
+        return self._guard_read(node, self._compile_index(node))
+
+    def _compile_index(self, node):
+        index = node.value
+        if self.types.input_is_list(node):
+            def index_value(value):
+                try:
+                    return value[index]
+                except IndexError:
+                    return None
+            return index_value
+
+        def index_value(value):
+            # Even though we can index strings, we don't
+            # want to support that.
+            if not isinstance(value, list):
+                return None
+            try:
+                return value[index]
+            except IndexError:
+                return None
+        return index_value
+
+    def visit_slice(self, node):
+        s = slice(*node.children)
+        if self.types.input_is_list(node):
+            def slice_value(value):
+                return value[s]
+            return slice_value
+
+        def slice_value(value):
+            if not isinstance(value, list):
+                return None
+            return value[s]
+        return slice_value
+
+    def visit_key_val_pair(self, node):
+        return self.visit(node.children[0])
+
+    def visit_literal(self, node):
+        literal_value = node.value
+
+        def literal(value):
+            return literal_value
+        return literal
+
+    def visit_multi_select_dict(self, node):
+        pairs = [(child.value, self.visit(child))
+                 for child in node.children]
+        dict_cls = self._dict_cls
+
+        def multi_select_dict(value):
+            if value is None:
+                return None
+            collected = dict_cls()
+            for key, child in pairs:
+                collected[key] = child(value)
+            return collected
+        return multi_select_dict
+
+    def visit_multi_select_list(self, node):
+        children = [self.visit(child) for child in node.children]
+
+        def multi_select_list(value):
+            if value is None:
+                return None
+            return [child(value) for child in children]
+        return multi_select_list
+
+    def visit_or_expression(self, node):
+        left = self.visit(node.children[0])
+        right = self.visit(node.children[1])
+        if self.types.has_python_truthiness(node.children[0]):
+            def or_expression(value):
+                return left(value) or right(value)
+            return or_expression
+
+        def or_expression(value):
+            matched = left(value)
+            if _is_false(matched):
+                matched = right(value)
+            return matched
+        return or_expression
+
+    def visit_and_expression(self, node):
+        left = self.visit(node.children[0])
+        right = self.visit(node.children[1])
+        if self.types.has_python_truthiness(node.children[0]):
+            def and_expression(value):
+                return left(value) and right(value)
+            return and_expression
+
+        def and_expression(value):
+            matched = left(value)
+            if _is_false(matched):
+                return matched
+            return right(value)
+        return and_expression
+
+    def visit_not_expression(self, node):
+        child = self.visit(node.children[0])
+        if self.types.is_never_zero(node.children[0]):
+            def not_expression(value):
+                return not child(value)
+            return not_expression
+
+        def not_expression(value):
+            original_result = child(value)
+            if _is_actual_zero(original_result):
+                # Special case for 0, !0 should be false, not true.
+                # 0 is not a special cased integer in jmespath.
+                return False
+            return not original_result
+        return not_expression
+
+    def visit_projection(self, node):
+        if self._should_fuse(node):
+            return self._compile_fused(node)
+        left = self.visit(node.children[0])
+        right = self._guard_elements(
+            node, self._compile_scope(node.children[1]))
+        if self.types.is_list(node.children[0]):
+            def projection(value):
+                collected = []
+                for element in left(value):
+                    current = right(element)
+                    if current is not None:
+                        collected.append(current)
+                return collected
+            return projection
+
+        def projection(value):
+            base = left(value)
+            if not isinstance(base, list):
+                return None
+            collected = []
+            for element in base:
+                current = right(element)
+                if current is not None:
+                    collected.append(current)
+            return collected
+        return projection
+
+    def visit_value_projection(self, node):
+        left = self.visit(node.children[0])
+        right = self._compile_scope(node.children[1])
+
+        def value_projection(value):
+            base = left(value)
+            try:
+                base = base.values()
+            except AttributeError:
+                return None
+            collected = []
+            for element in base:
+                current = right(element)
+                if current is not None:
+                    collected.append(current)
+            return collected
+        return value_projection
+
+    # Projection fusion.  In a[].b[].c, every projection and flatten
+    # would build a list that's only used as the input of the next
+    # one.  Instead, each stage is compiled into a function that
+    # returns an iterator over the elements of its list (or None if
+    # the stage evaluates to null) and only the outermost stage builds
+    # a list.
+
+    def _can_fuse(self, node):
+        if node.type not in _FUSABLE:
+            return False
+        if self._shared:
+            # Shared subtrees need their result memoized, and shared
+            # filter selections are built by the memoized selection.
+            if repr(node) in self._shared or \
+                    _filter_selection_key(node) in self._shared:
+                return False
+        return True
+
+    def _can_fuse_with_source(self, node):
+        # Whether every stage on the left spine of ``node`` is fused,
+        # down to the identity node that the elements of a ``source``
+        # replace.  A stage that isn't fused would be evaluated against
+        # the input of ``node`` instead.
+        while node.type in _FUSABLE and node.type != 'value_projection':
+            if not self._can_fuse(node):
+                return False
+            node = node.children[0]
+        return node.type in ('identity', 'current')
+
+    def _should_fuse(self, node):
+        # Only worth it if there's a stage feeding into this one.
+        return (self._can_fuse(node.children[0]) and
+                _fusion_is_safe([node]))
+
+    def _compile_fused(self, node, source=None):
+        elements = self._compile_elements(node, source)
+
+        def fused(value):
+            produced = elements(value)
+            if produced is None:
+                return None
+            return list(produced)
+        return fused
+
+    def _compile_elements(self, node, source=None):
+        # ``source``, if given, produces the elements of the value
+        # that the identity node at the bottom of the left spine of
+        # ``node`` evaluates to.
+        node_type = node.type
+        children = node.children
+        if node_type == 'value_projection':
+            left = self.visit(children[0])
+            right = self._compile_scope(children[1])
+
+            def value_projection_elements(value):
+                try:
+                    base = left(value).values()
+                except AttributeError:
+                    return None
+                return _project_elements(base, right)
+            return value_projection_elements
+        base = self._compile_base_elements(children[0], source)
+        if node_type == 'flatten':
+            def flatten_elements(value):
+                elements = base(value)
+                if elements is None:
+                    return None
+                return _flatten_elements(elements)
+            return flatten_elements
+        if node_type == 'projection':
+            right = self._guard_elements(
+                node, self._compile_scope(children[1]))
+
+            def projection_elements(value):
+                elements = base(value)
+                if elements is None:
+                    return None
+                return _project_elements(elements, right)
+            return projection_elements
+        right = self._compile_scope(children[1])
+        condition = self._compile_filter_condition(node)
+
+        def filter_elements(value):
+            elements = base(value)
+            if elements is None:
+                return None
+            return _filter_elements(elements, condition, right)
+        return filter_elements
+
+    def _compile_base_elements(self, node, source):
+        if self._can_fuse(node):
+            return self._compile_elements(node, source)
+        elif source is not None and node.type in ('identity', 'current'):
+            return source
+        compiled = self.visit(node)
+        if self.types.is_list(node):
+            return compiled
+
+        def base_elements(value):
+            base = compiled(value)
+            if not isinstance(base, list):
+                return None
+            return base
+        return base_elements
+
+
+def _compile_for_schema(backend, node, schema):
+    # ``backend`` is a ClosureCompiler or a CodeGenerator.
+    types = inference.infer_types(node, backend._functions,
+                                  backend._dict_cls, schema)
+    compiled = backend.compile(node, types)
+    allowed = types.searched_guard()
+    if allowed is None:
+        return compiled
+
+    def checked(value):
+        if type(value) not in allowed:
+            raise _SchemaViolation()
+        return compiled(value)
+    if hasattr(compiled, 'source'):
+        checked.source = compiled.source
+    return checked
+
+
+def _identity(value):
+    return value
+
+
+def _present_field(key):
+    # Looks up a field that's required by the schema in an object.
+    def present_field(value):
+        try:
+            return value[key]
+        except KeyError:
+            raise _SchemaViolation()
+    return present_field
+
+
+def _field_path(keys):
+    if len(keys) == 1:
+        key, = keys
+
+        def field_path(value):
+            try:
+                return value.get(key)
+            except AttributeError:
+                return None
+        return field_path
+    elif len(keys) == 2:
+        first, second = keys
+
+        def field_path(value):
+            try:
+                return value.get(first).get(second)
+            except AttributeError:
+                return None
+        return field_path
+    elif len(keys) == 3:
+        first, second, third = keys
+
+        def field_path(value):
+            try:
+                return value.get(first).get(second).get(third)
+            except AttributeError:
+                return None
+        return field_path
+
+    def field_path(value):
+        for key in keys:
+            try:
+                value = value.get(key)
+            except AttributeError:
+                return None
+        return value
+    return field_path
+
+
+def _is_actual_zero(value):
+    # The tree interpreter checks ``value is 0``, which only
+    # matches the (cached) int 0, not 0.0 or False.
+    return type(value) is int and value == 0
@@ -120,3 +120,30 @@ class EmptyExpressionError(JMESPathError):
 
 class UnknownFunctionError(JMESPathError):
     pass
+
+
+class SchemaError(JMESPathError):
+    """Raised when a schema is invalid, or when an expression compiled
+    for a schema can't match any document of the schema."""
+    pass
+
+
+@with_str_method
+class CompileErrors(JMESPathError):
+    """Raised when some of the expressions given to compile_many() are
+    invalid.
+
+    ``errors`` maps every invalid expression to its error, ``results``
+    maps the valid expressions to their compiled expression.
+
+    """
+    def __init__(self, errors, results):
+        super(CompileErrors, self).__init__(errors)
+        self.errors = errors
+        self.results = results
+
+    def __str__(self):
+        return '%s invalid jmespath %s:\n\n%s' % (
+            len(self.errors),
+            'expression' if len(self.errors) == 1 else 'expressions',
+            '\n\n'.join(str(error) for error in self.errors.values()))
@@ -0,0 +1,288 @@
+"""Evaluate many expressions against the same document.
+
+An ``ExpressionSet`` combines the ASTs of its expressions into a trie of
+evaluation steps, so that the parts the expressions have in common are
+evaluated once per document.  Every expression is split into the chain
+of steps it applies to the document, one after the other:
+
+* Field lookups (``a.b.c`` is three steps).
+* Projections.  The right hand sides of the projections that project
+  the same value, with the same kind of projection (and the same
+  filter), are combined into a nested trie that's evaluated once per
+  projected element.  What follows a projection (``a[*].b | c``) is
+  a continuation specific to its right hand side.
+* Any other node, which is evaluated as a whole by the backend of the
+  set.  Identical nodes at the same position are shared.
+
+For example, ``Records[*].s3.bucket.name`` and ``Records[*].s3.object.key``
+share the ``Records`` lookup, the projection over it, and the ``s3``
+lookup of every record.
+
+Each step is evaluated with the same semantics as the corresponding node
+of the ``TreeInterpreter``, so every expression produces the result it
+would produce on its own.
+
+"""
+import functools
+
+from jmespath import ast
+from jmespath import exceptions
+from jmespath.compiler import _is_false
+from jmespath import parser
+from jmespath import visitor
+from jmespath.visitor import _resolve_field_path
+
+
+class ExpressionSet(object):
+    """Evaluate a set of expressions against the same document.
+
+    :param expressions: A dict mapping names to expressions, or an
+        iterable of expressions, which are then their own name.
+    :param backend: The backend used to evaluate the nodes that aren't
+        field lookups or projections.
+    :param options: The ``Options`` the expressions are evaluated
+        with.  Unlike ``ParsedResult.search``, these are bound when the
+        set is created.
+
+    Invalid expressions raise a ``CompileErrors``.
+
+    """
+    def __init__(self, expressions, backend=None, options=None):
+        named = _name_expressions(expressions)
+        results, errors = parser.Parser().parse_many(
+            expression for _, expression in named)
+        if errors:
+            raise exceptions.CompileErrors(errors, results)
+        self.expressions = dict(named)
+        builder = _PlanBuilder(backend, options)
+        self._root = _StepNode(None)
+        for name, expression in named:
+            builder.add(self._root, _chain(results[expression].ast), name)
+        self._root.compress()
+
+    def search(self, value):
+        """Return a dict mapping every name to its expression's result."""
+        results = {}
+        self._root.evaluate(value, results)
+        return results
+
+
+def _name_expressions(expressions):
+    # Returns a list of (name, expression) from a dict of names to
+    # expressions, or from expressions named after themselves.
+    if hasattr(expressions, 'items'):
+        return list(expressions.items())
+    return [(expression, expression) for expression in expressions]
+
+
+def _chain(node):
+    # Split an AST into the steps applied one after the other to the
+    # document.
+    node_type = node.type
+    if node_type in ('subexpression', 'index_expression', 'pipe'):
+        steps = []
+        for child in node.children:
+            steps.extend(_chain(child))
+        return steps
+    elif node_type == 'field':
+        return [('field', node.value)]
+    elif node_type == 'field_path':
+        return [('field', name) for name in node.value]
+    elif node_type in ('identity', 'current'):
+        return []
+    elif node_type in ('projection', 'value_projection'):
+        return _chain(node.children[0]) + [
+            ('projection', node_type, None, node.children[1])]
+    elif node_type == 'filter_projection':
+        return _chain(node.children[0]) + [
+            ('projection', node_type, node.children[2], node.children[1])]
+    elif node_type == 'flatten':
+        return _chain(node.children[0]) + [
+            ('node', ast.flatten(ast.identity()))]
+    return [('node', node)]
+
+
+class _PlanBuilder(object):
+    def __init__(self, backend, options):
+        if backend is None:
+            backend = parser.ParsedResult.DEFAULT_BACKEND
+        if backend not in parser.ParsedResult.BACKENDS:
+            raise ValueError(
+                "Unknown backend '%s', must be one of: %s" % (
+                    backend,
+                    ', '.join(sorted(parser.ParsedResult.BACKENDS))))
+        compiler_cls = parser.ParsedResult.BACKENDS[backend]
+        if compiler_cls is None:
+            interpreter = visitor.TreeInterpreter(options)
+            self._compile = lambda node: functools.partial(
+                interpreter.visit, node)
+        else:
+            self._compile = compiler_cls(options).compile
+        # Nodes that appear several times are only compiled once.
+        self._compiled = {}
+
+    def add(self, trie, steps, name):
+        for step in steps:
+            if step[0] == 'projection':
+                trie = self._add_projection(trie, step)
+                continue
+            if step[0] == 'field':
+                key = step
+            else:
+                key = ('node', repr(step[1]))
+            child = trie.children.get(key)
+            if child is None:
+                if step[0] == 'field':
+                    child = _FieldNode((step[1],))
+                else:
+                    child = _StepNode(self._compile_node(step[1]))
+                trie.children[key] = child
+            trie = child
+        trie.names.append(name)
+
+    def _add_projection(self, trie, step):
+        _, kind, condition, right = step
+        key = ('projection', kind, repr(condition))
+        group = trie.children.get(key)
+        if group is None:
+            if condition is not None:
+                condition = self._compile_node(condition)
+            group = _ProjectionNode(kind, condition)
+            trie.children[key] = group
+        right_key = repr(right)
+        label = group.labels.get(right_key)
+        if label is None:
+            label = group.labels[right_key] = len(group.continuations)
+            group.continuations.append(_StepNode(None))
+            self.add(group.inner, _chain(right), label)
+        # The steps after the projection are applied to the list it
+        # produces.
+        return group.continuations[label]
+
+    def _compile_node(self, node):
+        key = repr(node)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = self._compile(node)
+        return compiled
+
+
+class _StepNode(object):
+    # Applies ``step`` to its parent's value, its names are the
+    # expressions whose result is this value.
+    def __init__(self, step):
+        self.step = step
+        self.names = []
+        # Step key -> child node.  Replaced by a list in compress().
+        self.children = {}
+        # (field name, expression name) and (field path, expression
+        # name) of the children that are field lookups with nothing
+        # below them.  Set by compress().
+        self.leaf_fields = []
+        self.leaf_paths = []
+
+    def compress(self):
+        # The lookups of the leaf children are evaluated in a loop,
+        # without a method call for every child.
+        children = []
+        for child in self.children.values():
+            child = child.compress()
+            if isinstance(child, _FieldNode) and not child.children and \
+                    not child.leaf_fields and not child.leaf_paths:
+                path = child.field_path
+                for name in child.names:
+                    if len(path) == 1:
+                        self.leaf_fields.append((path[0], name))
+                    else:
+                        self.leaf_paths.append((path, name))
+            else:
+                children.append(child)
+        self.children = children
+        return self
+
+    def evaluate(self, value, results):
+        if self.step is not None:
+            value = self.step(value)
+        for name in self.names:
+            results[name] = value
+        if self.leaf_fields:
+            try:
+                get = value.get
+            except AttributeError:
+                for _, name in self.leaf_fields:
+                    results[name] = None
+            else:
+                for key, name in self.leaf_fields:
+                    results[name] = get(key)
+        for path, name in self.leaf_paths:
+            results[name] = _resolve_field_path(path, value)
+        for child in self.children:
+            child.evaluate(value, results)
+
+
+class _FieldNode(_StepNode):
+    def __init__(self, names):
+        super(_FieldNode, self).__init__(None)
+        self.field_path = names
+
+    def compress(self):
+        # A chain of field lookups that nothing else branches from is
+        # merged into a single lookup of the whole path.
+        node = self
+        while not node.names and len(node.children) == 1:
+            child = list(node.children.values())[0]
+            if not isinstance(child, _FieldNode):
+                break
+            merged = _FieldNode(node.field_path + child.field_path)
+            merged.names = child.names
+            merged.children = child.children
+            node = merged
+        node.step = functools.partial(_resolve_field_path, node.field_path)
+        return _StepNode.compress(node)
+
+
+class _ProjectionNode(object):
+    def __init__(self, kind, condition):
+        self.kind = kind
+        self.condition = condition
+        # Evaluated for every element, the names in this trie are the
+        # labels of the right hand sides.
+        self.inner = _StepNode(None)
+        # repr of a right hand side -> its label.
+        self.labels = {}
+        # Indexed by label, applied to the list projected by the
+        # corresponding right hand side.
+        self.continuations = []
+
+    def compress(self):
+        self.inner.compress()
+        for continuation in self.continuations:
+            continuation.compress()
+        return self
+
+    def evaluate(self, value, results):
+        if self.kind == 'value_projection':
+            try:
+                base = value.values()
+            except AttributeError:
+                base = None
+        else:
+            base = value if isinstance(value, list) else None
+        continuations = self.continuations
+        if base is None:
+            for continuation in continuations:
+                continuation.evaluate(None, results)
+            return
+        collected = [[] for _ in continuations]
+        condition = self.condition
+        inner = self.inner
+        for element in base:
+            if condition is not None and _is_false(condition(element)):
+                continue
+            projected = {}
+            inner.evaluate(element, projected)
+            for label, current in projected.items():
+                if current is not None:
+                    collected[label].append(current)
+        for label, continuation in enumerate(continuations):
+            continuation.evaluate(collected[label], results)
@@ -1,7 +1,10 @@
+import itertools
 import math
 import json
+from collections import OrderedDict
 
 from jmespath import exceptions
+from jmespath.compat import PY2
 from jmespath.compat import string_type as STRING_TYPE
 from jmespath.compat import get_methods, with_metaclass
 
@@ -35,6 +38,135 @@ REVERSE_TYPES_MAP = {
 }
 
 
+# The python types that are always available.  The compiled type checks
+# test the type of a value against sets of these types first, and only
+# fall back to comparing type names (the way the checks are defined)
+# for other types.
+_KNOWN_TYPES = [bool, list, dict, type(None), str, float, int, OrderedDict]
+if PY2:
+    _KNOWN_TYPES.extend([unicode, long])  # noqa
+
+
+def _python_types(typenames):
+    return frozenset(t for t in _KNOWN_TYPES if t.__name__ in typenames)
+
+
+def _allowed_typenames(types):
+    # Same as Functions._get_allowed_pytypes.
+    allowed_types = []
+    allowed_subtypes = []
+    for t in types:
+        type_ = t.split('-', 1)
+        if len(type_) == 2:
+            type_, subtype = type_
+            allowed_subtypes.append(REVERSE_TYPES_MAP[subtype])
+        else:
+            type_ = type_[0]
+        allowed_types.extend(REVERSE_TYPES_MAP[type_])
+    return allowed_types, allowed_subtypes
+
+
+def _compile_type_check(function_name, types):
+    # A function that raises the JMESPathTypeError that
+    # Functions._type_check_single raises, if any.
+    allowed_names, subtype_names = _allowed_typenames(types)
+    allowed_names = frozenset(allowed_names)
+    allowed_types = _python_types(allowed_names)
+    subtypes = [(_python_types(names), frozenset(names))
+                for names in subtype_names]
+
+    def check_elements(elements, element_types, element_names):
+        for element in elements:
+            element_type = type(element)
+            if element_type not in element_types and \
+                    element_type.__name__ not in element_names:
+                raise exceptions.JMESPathTypeError(
+                    function_name, element, element_type.__name__, types)
+
+    def type_check(current):
+        current_type = type(current)
+        if current_type not in allowed_types and \
+                current_type.__name__ not in allowed_names:
+            raise exceptions.JMESPathTypeError(
+                function_name, current,
+                TYPES_MAP.get(current_type.__name__, 'unknown'), types)
+        if len(subtypes) == 1:
+            check_elements(current, *subtypes[0])
+        elif len(subtypes) > 1 and current:
+            # The type of the first element decides which subtype the
+            # other elements must have.
+            first = type(current[0])
+            for element_types, element_names in subtypes:
+                if first in element_types or \
+                        first.__name__ in element_names:
+                    break
+            else:
+                raise exceptions.JMESPathTypeError(
+                    function_name, current[0], first.__name__, types)
+            check_elements(current, element_types, element_names)
+    return type_check
+
+
+def _is_allowed(known_type, types):
+    # Whether a value of the JMESPath type ``known_type``, which can be
+    # an array type with a subtype ('array-string'), always passes the
+    # type check for ``types``.
+    if known_type is None:
+        return False
+    return known_type in types or (
+        known_type.startswith('array-') and 'array' in types)
+
+
+def _check_arity(function_name, signature, count):
+    # Raises the arity error of Functions._validate_arguments, if any.
+    if signature and signature[-1].get('variadic'):
+        if count < len(signature):
+            raise exceptions.VariadictArityError(
+                len(signature), count, function_name)
+    elif count != len(signature):
+        raise exceptions.ArityError(len(signature), count, function_name)
+
+
+def _compile_validator(function_name, signature, known_types=None,
+                       check_arity=True):
+    """Compile a signature into a function that validates arguments.
+
+    The returned function takes the list of arguments and raises the
+    same errors as ``Functions._validate_arguments``.  ``known_types``
+    optionally lists the JMESPath type of each argument, or None, when
+    it's known before the function is called.  The type checks of the
+    arguments that are known to have an allowed type are skipped, and
+    so is the arity check if ``check_arity`` is false.
+
+    """
+    arity = len(signature)
+    variadic = bool(signature) and signature[-1].get('variadic')
+    if not check_arity:
+        variadic = arity = None
+    type_checks = []
+    for i, argument in enumerate(signature):
+        types = argument['types']
+        if not types:
+            continue
+        if known_types is not None and i < len(known_types) and \
+                _is_allowed(known_types[i], types):
+            continue
+        type_checks.append((i, _compile_type_check(function_name, types)))
+
+    def validate(args):
+        if arity is None:
+            pass
+        elif variadic:
+            if len(args) < arity:
+                raise exceptions.VariadictArityError(
+                    arity, len(args), function_name)
+        elif len(args) != arity:
+            raise exceptions.ArityError(arity, len(args), function_name)
+        for i, type_check in type_checks:
+            type_check(args[i])
+    return validate
+
+
 def signature(*arguments):
     def _record_signature(func):
         func.signature = arguments
@@ -42,6 +174,36 @@ def signature(*arguments):
     return _record_signature
 
 
+def _streamed(position):
+    # Marks a function that can consume the array argument at
+    # ``position`` one element at a time, see Functions.call_streamed.
+    def _record_streamed(func):
+        func.streamed_argument = position
+        return func
+    return _record_streamed
+
+
+class _InvalidElement(Exception):
+    # Raised when a streamed array has an element of the wrong type.
+    def __init__(self, element):
+        super(_InvalidElement, self).__init__(element)
+        self.element = element
+
+
+# The methods that define how arguments are validated.  The signatures
+# of a class that overrides any of them aren't compiled, its
+# _validate_arguments() is called instead.
+_VALIDATION_METHODS = (
+    '_validate_arguments', '_type_check', '_type_check_single',
+    '_get_allowed_pytypes', '_subtype_check', '_convert_to_jmespath_type',
+)
+
+
+def _function(method):
+    # The function of an (unbound, on python 2) method.
+    return getattr(method, '__func__', method)
+
+
 class FunctionRegistry(type):
     def __init__(cls, name, bases, attrs):
         cls._populate_function_table()
@@ -49,6 +211,12 @@ class FunctionRegistry(type):
 
     def _populate_function_table(cls):
         function_table = {}
+        standard = getattr(cls, '_STANDARD_VALIDATION', None)
+        # The standard methods aren't known yet when the registry
+        # populates the table of Functions itself.
+        compile_signatures = standard is None or all(
+            _function(getattr(cls, name)) is method
+            for name, method in zip(_VALIDATION_METHODS, standard))
         # Any method with a @signature decorator that also
         # starts with "_func_" is registered as a function.
         # _func_max_by -> max_by function.
@@ -57,11 +225,21 @@ class FunctionRegistry(type):
                 continue
             signature = getattr(method, 'signature', None)
             if signature is not None:
+                validator = None
+                if compile_signatures:
+                    validator = _compile_validator(name[6:], signature)
                 function_table[name[6:]] = {
                     'function': method,
                     'signature': signature,
+                    'validator': validator,
+                    'streamed_argument': getattr(
+                        method, 'streamed_argument', None),
                 }
         cls.FUNCTION_TABLE = function_table
+        cls._compiled_validation = compile_signatures
+        # The validators of resolve_function(), by function name and
+        # known argument types.
+        cls._resolved_validators = {}
 
 
 class Functions(with_metaclass(FunctionRegistry, object)):
@@ -76,10 +254,216 @@ class Functions(with_metaclass(FunctionRegistry, object)):
             raise exceptions.UnknownFunctionError(
                 "Unknown function: %s()" % function_name)
         function = spec['function']
-        signature = spec['signature']
-        self._validate_arguments(resolved_args, signature, function_name)
+        validator = spec['validator']
+        if validator is not None:
+            validator(resolved_args)
+        else:
+            self._validate_arguments(resolved_args, spec['signature'],
+                                     function_name)
         return function(self, *resolved_args)
 
+    def argument_validator(self, function_name, known_types=None):
+        """Return a function that validates the arguments of a function.
+
+        The returned function takes the list of arguments and raises
+        the error ``call_function`` would raise for them, if any.  When
+        ``known_types`` lists the JMESPath type of the arguments that
+        are known ahead of time (None for the others), checking them is
+        skipped.
+
+        """
+        try:
+            spec = self.FUNCTION_TABLE[function_name]
+        except KeyError:
+            raise exceptions.UnknownFunctionError(
+                "Unknown function: %s()" % function_name)
+        if spec['validator'] is None:
+            signature = spec['signature']
+
+            def validate(args):
+                self._validate_arguments(args, signature, function_name)
+            return validate
+        if not known_types or not any(known_types):
+            return spec['validator']
+        return _compile_validator(function_name, spec['signature'],
+                                  known_types)
+
+    def resolve_function(self, function_name, known_types):
+        """Return a function that calls a function with its arguments.
+
+        This is used to bind a function call to its implementation
+        when an expression is compiled.  ``known_types`` has an entry
+        per argument: its JMESPath type if it's known ahead of time,
+        otherwise None.  The returned function takes the list of
+        arguments and returns the same result, or raises the same
+        error, as ``call_function``.  The function is looked up and
+        the number of arguments is checked once, here, so an
+        ``ArityError`` is raised by this method.
+
+        Unknown functions (which may be added to a subclass used with
+        other options), and functions of a class that overrides
+        ``call_function`` or the type checks, are resolved when called.
+
+        """
+        spec = self._resolvable_spec(function_name)
+        if spec is None:
+            call_function = self.call_function
+
+            def call(args):
+                return call_function(function_name, args)
+            return call
+        key = (function_name, tuple(known_types))
+        validate = self._resolved_validators.get(key)
+        if validate is None:
+            _check_arity(function_name, spec['signature'], len(known_types))
+            validate = _compile_validator(function_name, spec['signature'],
+                                          known_types, check_arity=False)
+            self._resolved_validators[key] = validate
+        function = spec['function']
+
+        def call(args):
+            validate(args)
+            return function(self, *args)
+        return call
+
+    def skipped_type_checks(self, function_name, known_types):
+        """Return the positions of the arguments that aren't checked.
+
+        These are the arguments whose type checks are left out of the
+        function returned by ``resolve_function`` for the same
+        ``known_types``.
+
+        """
+        spec = self._resolvable_spec(function_name)
+        if spec is None:
+            return []
+        signature = spec['signature']
+        return [i for i, known_type in enumerate(known_types[:len(signature)])
+                if signature[i]['types'] and
+                _is_allowed(known_type, signature[i]['types'])]
+
+    def _resolvable_spec(self, function_name):
+        # The spec of a function that resolve_function() can bind, or
+        # None if it's resolved when called.
+        spec = self.FUNCTION_TABLE.get(function_name)
+        if spec is None or spec['validator'] is None or \
+                _function(type(self).call_function) is not \
+                _function(Functions.call_function):
+            return None
+        return spec
+
+    def streamed_argument(self, function_name, arity):
+        """Return the position of the argument that can be streamed.
+
+        Some builtin functions can consume an array argument one
+        element at a time, as a ``_Projection``.  Returns the position of
+        that argument if ``function_name`` is one of them (and isn't
+        overridden) and is called with ``arity`` arguments, otherwise
+        None.  Functions of a class that overrides ``call_function`` or
+        the type checks are never streamed.
+
+        """
+        spec = self._resolvable_spec(function_name)
+        if spec is None or len(spec['signature']) != arity:
+            return None
+        return spec['streamed_argument']
+
+    def call_streamed(self, function_name, resolved_args):
+        """Call a function with its streamed argument as a _Projection.
+
+        The result, and any error raised, is the same as with
+        ``call_function`` and the projection as a list.
+
+        """
+        return getattr(self, '_stream_' + function_name)(*resolved_args)
+
+    def _call_materialized(self, function_name, resolved_args, invalid):
+        # Raises the error call_function raises when the streamed
+        # argument is a list.  The elements are type checked in order,
+        # so the error is raised for the first invalid element, which
+        # is the last element of ``invalid``, after the first element
+        # (which decides whether max() takes numbers or strings).  The
+        # remaining elements are evaluated first, as they would be for
+        # a list, since that could raise a different error.
+        position = self.FUNCTION_TABLE[function_name]['streamed_argument']
+        resolved_args = list(resolved_args)
+        resolved_args[position] = invalid + resolved_args[position].to_list()
+        return self.call_function(function_name, resolved_args)
+
+    def _checked_chunks(self, chunks, typenames, lengths=None):
+        # ``lengths``, if given, collects the length of every chunk.
+        for chunk in chunks:
+            for element in chunk:
+                if type(element).__name__ not in typenames:
+                    raise _InvalidElement(element)
+            if lengths is not None:
+                lengths.append(len(chunk))
+            yield chunk
+
+    def _stream_avg(self, arg):
+        lengths = []
+        try:
+            total = sum(itertools.chain.from_iterable(self._checked_chunks(
+                arg.chunks(), REVERSE_TYPES_MAP['number'], lengths)))
+        except _InvalidElement as e:
+            return self._call_materialized('avg', [arg], [e.element])
+        if not lengths:
+            return None
+        return total / float(sum(lengths))
+
+    def _stream_contains(self, subject, search):
+        for element in subject:
+            if element is search or element == search:
+                return True
+        return False
+
+    def _stream_length(self, arg):
+        return sum(map(len, arg.chunks()))
+
+    def _stream_max(self, arg):
+        return self._stream_extreme('max', max, arg)
+
+    def _stream_min(self, arg):
+        return self._stream_extreme('min', min, arg)
+
+    def _stream_extreme(self, function_name, pick, arg):
+        chunks = arg.chunks()
+        for chunk in chunks:
+            break
+        else:
+            return None
+        first = chunk[0]
+        for typenames in (REVERSE_TYPES_MAP['number'],
+                          REVERSE_TYPES_MAP['string']):
+            if type(first).__name__ in typenames:
+                break
+        else:
+            return self._call_materialized(function_name, [arg], [first])
+        try:
+            return pick(itertools.chain.from_iterable(self._checked_chunks(
+                itertools.chain([chunk], chunks), typenames)))
+        except _InvalidElement as e:
+            return self._call_materialized(function_name, [arg],
+                                           [first, e.element])
+
+    def _stream_sum(self, arg):
+        try:
+            return sum(itertools.chain.from_iterable(self._checked_chunks(
+                arg.chunks(), REVERSE_TYPES_MAP['number'])))
+        except _InvalidElement as e:
+            return self._call_materialized('sum', [arg], [e.element])
+
+    def _stream_join(self, separator, array):
+        if type(separator).__name__ not in REVERSE_TYPES_MAP['string']:
+            return self._call_materialized('join', [separator, array], [])
+        try:
+            return separator.join(itertools.chain.from_iterable(
+                self._checked_chunks(array.chunks(),
+                                     REVERSE_TYPES_MAP['string'])))
+        except _InvalidElement as e:
+            return self._call_materialized('join', [separator, array],
+                                           [e.element])
+
     def _validate_arguments(self, args, signature, function_name):
         if signature and signature[-1].get('variadic'):
             if len(args) < len(signature):
@@ -166,6 +550,7 @@ class Functions(with_metaclass(FunctionRegistry, object)):
         return abs(arg)
 
     @signature({'types': ['array-number']})
+    @_streamed(0)
     def _func_avg(self, arg):
         if arg:
             return sum(arg) / float(len(arg))
@@ -211,10 +596,12 @@ class Functions(with_metaclass(FunctionRegistry, object)):
                     return None
 
     @signature({'types': ['array', 'string']}, {'types': []})
+    @_streamed(0)
     def _func_contains(self, subject, search):
         return search in subject
 
     @signature({'types': ['string', 'array', 'object']})
+    @_streamed(0)
     def _func_length(self, arg):
         return len(arg)
 
@@ -242,6 +629,7 @@ class Functions(with_metaclass(FunctionRegistry, object)):
         return math.floor(arg)
 
     @signature({"types": ['string']}, {"types": ['array-string']})
+    @_streamed(1)
     def _func_join(self, separator, array):
         return separator.join(array)
 
@@ -253,6 +641,7 @@ class Functions(with_metaclass(FunctionRegistry, object)):
         return result
 
     @signature({"types": ['array-number', 'array-string']})
+    @_streamed(0)
     def _func_max(self, arg):
         if arg:
             return max(arg)
@@ -267,6 +656,7 @@ class Functions(with_metaclass(FunctionRegistry, object)):
         return merged
 
     @signature({"types": ['array-number', 'array-string']})
+    @_streamed(0)
     def _func_min(self, arg):
         if arg:
             return min(arg)
@@ -278,6 +668,7 @@ class Functions(with_metaclass(FunctionRegistry, object)):
         return list(sorted(arg))
 
     @signature({"types": ['array-number']})
+    @_streamed(0)
     def _func_sum(self, arg):
         return sum(arg)
 
@@ -347,8 +738,16 @@ class Functions(with_metaclass(FunctionRegistry, object)):
             return None
 
     def _create_key_func(self, expref, allowed_types, function_name):
+        known_types = frozenset()
+        if self._compiled_validation:
+            known_types = _python_types(
+                [name for type_ in allowed_types
+                 for name in REVERSE_TYPES_MAP[type_]])
+
         def keyfunc(x):
             result = expref.visit(expref.expression, x)
+            if type(result) in known_types:
+                return result
             actual_typename = type(result).__name__
             jmespath_type = self._convert_to_jmespath_type(actual_typename)
             # allowed_types is in term of jmespath types, not python types.
@@ -360,3 +759,7 @@ class Functions(with_metaclass(FunctionRegistry, object)):
 
     def _convert_to_jmespath_type(self, pyobject):
         return TYPES_MAP.get(pyobject, 'unknown')
+
+
+Functions._STANDARD_VALIDATION = tuple(
+    _function(getattr(Functions, name)) for name in _VALIDATION_METHODS)
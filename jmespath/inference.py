@@ -0,0 +1,993 @@
+"""Infer the types of the nodes of a JMESPath AST.
+
+Evaluating an expression involves many runtime checks that only exist
+because the type of a value isn't known: a projection checks that its
+left hand side is a list, a filter or ``||`` checks the truthiness of a
+value with ``_is_false`` (``0`` is true in JMESPath), an ordering
+comparator checks both sides with ``_is_comparable``, and a function
+checks the types of its arguments.  Some values have a statically known
+type, though: literals, comparators, ``!``, multi-selects, projections
+and most builtin functions (``length()`` is a number, ``keys()`` and
+``sort_by()`` are arrays, ``contains()`` is a boolean).
+
+``infer_types`` walks the AST once and annotates every node with its
+*shape*: the set of types the node can evaluate to, and for arrays the
+shape of their elements.  The types are the JMESPath types plus
+``unknown``, which stands for any python value that isn't one of them
+(the documents being searched can contain anything).  Values read from
+the document are always assumed to have any type.
+
+The backends ask the returned ``NodeTypes`` whether a check can fail
+(``is_list``, ``has_python_truthiness``, ...) and leave it out when it
+can't.  Every check left out is recorded, ``explain()`` lists them.
+
+Given a JSON Schema of the documents (see ``parse_schema``), the values
+read from the document by fields and indexes have the types of the
+schema instead, and lookups that can't match any document raise a
+``SchemaError``.  The types of the schema are only assumed, so the
+compiled expression has to check the values it reads whose types a
+left out check relies on: every shape keeps the ids of the nodes that
+read the values its types depend on (its ``sources``).  Once the shapes
+are inferred, the checks the backends may leave out are looked up
+ahead of compilation, and the nodes they rely on are the ones whose
+values are checked.
+
+"""
+import itertools
+import json
+
+from jmespath import exceptions
+from jmespath import functions
+from jmespath.compat import string_type
+from jmespath.kernels import _is_special_equality_literal
+from jmespath.visitor import Visitor
+
+
+_TYPE_NAMES = ('array', 'boolean', 'null', 'number', 'object', 'string',
+               'unknown')
+
+
+_NO_SOURCES = frozenset()
+# The source of the types of the searched value.
+_SEARCHED = 'searched value'
+
+
+class _Shape(object):
+    # The types a value can have and, if it can be an array, the shape
+    # of its elements (None if any shape).  ``schema`` is the _Schema
+    # of the value if it's part of the document, and ``sources`` the
+    # nodes reading the values whose types ``types`` depends on (the
+    # elements have their own sources).
+    __slots__ = ('types', 'items', 'schema', 'sources')
+
+    def __init__(self, types, items=None, schema=None, sources=_NO_SOURCES):
+        self.types = frozenset(types)
+        self.items = items
+        self.schema = schema
+        self.sources = sources
+
+    def union(self, other):
+        items = None
+        if 'array' not in self.types:
+            items = other.items
+        elif 'array' not in other.types:
+            items = self.items
+        elif self.items is not None and other.items is not None:
+            items = self.items.union(other.items)
+        schema = self.schema
+        if schema is not other.schema:
+            # null has no fields or elements to describe.
+            if self.types <= _NULL_ONLY:
+                schema = other.schema
+            elif not other.types <= _NULL_ONLY:
+                schema = None
+        return _Shape(self.types | other.types, items, schema,
+                      self.sources | other.sources)
+
+    def without(self, *types):
+        return _Shape(self.types.difference(types), self.items, self.schema,
+                      self.sources)
+
+    def depending_on(self, *shapes):
+        sources = self.sources.union(*[shape.sources for shape in shapes])
+        return _Shape(self.types, self.items, self.schema, sources)
+
+    def item_shape(self):
+        if self.items is None or 'unknown' in self.types:
+            if self.schema is not None and self.schema.items is not None:
+                # The elements of a list of the document are only
+                # described by the schema, their types aren't checked.
+                return _Shape(_TYPE_NAMES, schema=self.schema.items)
+            # A list subclass is an unknown type that is a list.
+            return _ANY
+        return self.items
+
+    def __repr__(self):
+        if self.items is None or 'array' not in self.types:
+            return '<%s>' % '|'.join(sorted(self.types))
+        return '<%s, items %r>' % ('|'.join(sorted(self.types)), self.items)
+
+
+_ANY = _Shape(_TYPE_NAMES)
+_NULL = _Shape(['null'])
+_BOOLEAN = _Shape(['boolean'])
+_NUMBER = _Shape(['number'])
+_STRING = _Shape(['string'])
+_EXPREF = _Shape(['expref'])
+_ARRAY_ONLY = frozenset(['array'])
+_OBJECT_ONLY = frozenset(['object'])
+_NULL_ONLY = frozenset(['null'])
+_COMPARABLE = frozenset(['number', 'string'])
+# The types whose python truthiness is not their JMESPath truthiness.
+_PYTHON_FALSY = frozenset(['number', 'unknown'])
+# The types that may be false in JMESPath (_is_false compares values
+# of other types with '', [] and {}).
+_MAY_BE_FALSE = frozenset(['array', 'boolean', 'null', 'object', 'string',
+                           'unknown'])
+
+
+def _array(items=None, schema=None):
+    return _Shape(['array'], items, schema)
+
+
+def _literal_shape(value):
+    if value is None:
+        return _NULL
+    elif value is True or value is False:
+        return _BOOLEAN
+    elif isinstance(value, (int, float)):
+        return _NUMBER
+    elif isinstance(value, string_type):
+        return _STRING
+    elif isinstance(value, list):
+        items = None
+        for element in value:
+            shape = _literal_shape(element)
+            items = shape if items is None else items.union(shape)
+        return _array(items)
+    elif isinstance(value, dict):
+        return _Shape(['object'])
+    return _ANY
+
+
+def _reverse_shape(args):
+    shape = args[0]
+    return _Shape(shape.types & frozenset(['array', 'string']), shape.items,
+                  shape.schema, shape.sources)
+
+
+def _extreme_shape(args):
+    # max() and min() of an array of numbers or strings, or null.
+    items = args[0].item_shape()
+    return _Shape((items.types & _COMPARABLE) | frozenset(['null']),
+                  sources=items.sources)
+
+
+def _element_shape(args):
+    # max_by() and min_by() return an element of the array, or null.
+    return args[0].item_shape().union(_NULL)
+
+
+def _to_array_shape(args):
+    shape = args[0]
+    items = shape.without('array')
+    if 'array' in shape.types:
+        items = items.union(shape.item_shape())
+    result = _array(items).depending_on(shape)
+    if 'unknown' in shape.types:
+        # Subclasses of list are returned as is.
+        result = result.union(_Shape(['unknown']))
+    return result
+
+
+def _passed_through(shape, types):
+    # Functions that return their argument if it's an instance of a
+    # builtin type also return instances of its subclasses as is.
+    if 'unknown' in shape.types:
+        types = types | frozenset(['unknown'])
+    return _Shape(types, sources=shape.sources)
+
+
+# The shape of the result of the builtin functions, given the shapes of
+# their arguments.
+_RETURN_SHAPES = {
+    'abs': lambda args: _NUMBER,
+    'avg': lambda args: _Shape(['number', 'null']),
+    'ceil': lambda args: _NUMBER,
+    'contains': lambda args: _BOOLEAN,
+    'ends_with': lambda args: _BOOLEAN,
+    'floor': lambda args: _NUMBER,
+    'join': lambda args: _STRING,
+    'keys': lambda args: _array(),
+    'length': lambda args: _NUMBER,
+    'map': lambda args: _array(),
+    'max': _extreme_shape,
+    'max_by': _element_shape,
+    'merge': lambda args: _Shape(['object']),
+    'min': _extreme_shape,
+    'min_by': _element_shape,
+    'not_null': lambda args: _union(args),
+    'reverse': _reverse_shape,
+    'sort': lambda args: _array(args[0].items, args[0].schema),
+    'sort_by': lambda args: _array(args[0].items, args[0].schema),
+    'starts_with': lambda args: _BOOLEAN,
+    'sum': lambda args: _NUMBER,
+    'to_array': _to_array_shape,
+    'to_number': lambda args: _passed_through(
+        args[0], frozenset(['number', 'null'])),
+    'to_string': lambda args: _passed_through(args[0], frozenset(['string'])),
+    # type() returns None for values of other types.
+    'type': lambda args: _STRING.union(
+        _NULL if 'unknown' in args[0].types else _STRING).depending_on(
+            args[0]),
+    'values': lambda args: _array(),
+}
+
+
+# JSON Schema types and the JMESPath type of their values.
+_SCHEMA_TYPES = {
+    'array': 'array',
+    'boolean': 'boolean',
+    'integer': 'number',
+    'null': 'null',
+    'number': 'number',
+    'object': 'object',
+    'string': 'string',
+}
+
+
+class _Schema(object):
+    # A JSON Schema reduced to what type inference uses: the JMESPath
+    # types of the value (None if any type), the schemas of its
+    # properties, of the properties that aren't listed (None if any
+    # schema, False if there are none) and of its elements.
+    __slots__ = ('types', 'properties', 'required', 'additional', 'items')
+
+    def __init__(self, types=None, properties=None, required=(),
+                 additional=None, items=None):
+        self.types = types
+        self.properties = properties or {}
+        self.required = frozenset(required)
+        self.additional = additional
+        self.items = items
+
+    def property_schema(self, key):
+        # None if the objects of this schema can't have the property.
+        schema = self.properties.get(key)
+        if schema is not None:
+            return schema
+        elif self.additional is False:
+            return None
+        return self.additional or _ANY_SCHEMA
+
+
+_ANY_SCHEMA = _Schema()
+
+
+def parse_schema(schema):
+    """Parse a JSON Schema, given as a dict, for ``infer_types``.
+
+    Only ``type`` (``integer`` is a number), ``properties``,
+    ``required``, ``additionalProperties`` and the single schema form
+    of ``items`` are used, the other keywords are ignored.  Raises a
+    ``SchemaError`` if the schema is invalid.
+
+    """
+    if schema is True:
+        return _ANY_SCHEMA
+    if not isinstance(schema, dict):
+        raise exceptions.SchemaError('Invalid schema: %r' % (schema,))
+    types = schema.get('type')
+    if types is not None:
+        if isinstance(types, string_type):
+            types = [types]
+        try:
+            types = frozenset(_SCHEMA_TYPES[name] for name in types)
+        except (KeyError, TypeError):
+            raise exceptions.SchemaError(
+                'Invalid type in schema: %r' % (schema['type'],))
+    properties = dict((name, parse_schema(value)) for name, value
+                      in schema.get('properties', {}).items())
+    additional = schema.get('additionalProperties', True)
+    if additional is True:
+        additional = None
+    elif additional is not False:
+        additional = parse_schema(additional)
+    items = schema.get('items')
+    if isinstance(items, dict):
+        items = parse_schema(items)
+    else:
+        # A list of schemas describes the elements by position.
+        items = None
+    return _Schema(types, properties, schema.get('required', ()),
+                   additional, items)
+
+
+def _python_types(types):
+    # The python types of the values of these JMESPath types.
+    return functions._python_types(frozenset(itertools.chain.from_iterable(
+        functions.REVERSE_TYPES_MAP[name] for name in types)))
+
+
+def _check_possible(node, schema, type_name, key=None):
+    # Raises a SchemaError if ``node``, which only applies to values of
+    # type ``type_name``, is applied to values of ``schema``.  ``key``
+    # is the field of a field path that's looked up.
+    if schema is not None and schema.types is not None and \
+            type_name not in schema.types:
+        raise exceptions.SchemaError(
+            "%s can't match documents of the schema: %s is applied to a "
+            "value of type %s" % (
+                render(node), 'it' if key is None else _render_name(key),
+                ' or '.join(sorted(schema.types))))
+
+
+def _union(shapes):
+    result = _NULL
+    for shape in shapes:
+        result = result.union(shape)
+    return result
+
+
+def _is_builtin(functions_table, name):
+    # Whether calling ``name`` calls the builtin function.
+    if functions_table is None:
+        return True
+    spec = functions_table.FUNCTION_TABLE.get(name)
+    builtin = functions.Functions.FUNCTION_TABLE.get(name)
+    return (spec is not None and builtin is not None and
+            spec['function'] is builtin['function'] and
+            functions._function(type(functions_table).call_function) is
+            functions._function(functions.Functions.call_function))
+
+
+class NodeTypes(object):
+    """The shapes inferred for the nodes of an AST by ``infer_types``.
+
+    The methods that tell whether a check can be left out record the
+    check if it can, ``explain()`` lists the recorded checks.  Nodes
+    that weren't annotated can have any type.
+
+    With a schema, ``infer_types`` records the nodes reading values
+    whose types the checks that can be left out rely on, and
+    ``read_guard`` tells which types these values must be checked
+    against.  A check relying on any other value is kept.
+
+    """
+    def __init__(self):
+        self._shapes = {}
+        self._input_shapes = {}
+        self._removed = []
+        self._recorded = set()
+        # The types of the values read by the nodes, according to the
+        # schema, and the nodes whose values must have these types.
+        self._read_types = {}
+        self._element_types = {}
+        self._relied = set()
+        # Whether the checked values are known: only checks relying on
+        # them can be left out from then on.
+        self._guards_known = False
+        #: The types of the searched value according to the schema, or
+        #  None if it can have any type.
+        self.searched_types = None
+
+    def shape(self, node):
+        return self._shapes.get(id(node), _ANY)
+
+    def types(self, node):
+        """The types ``node`` can evaluate to, as a frozenset."""
+        return self.shape(node).types
+
+    def _annotate(self, node, input_shape, shape):
+        # A node may be evaluated in more than one context.
+        current = self._input_shapes.get(id(node))
+        if current is not None:
+            input_shape = current.union(input_shape)
+            shape = self._shapes[id(node)].union(shape)
+        self._input_shapes[id(node)] = input_shape
+        self._shapes[id(node)] = shape
+
+    def _add_read(self, node, types, read_types=None):
+        if read_types is None:
+            read_types = self._read_types
+        current = read_types.get(id(node))
+        if current is not None:
+            types = current | types
+        read_types[id(node)] = types
+
+    def record_removed(self, check, node, *shapes):
+        # ``shapes`` are the shapes the check relies on.  Returns False
+        # if the check relies on values that aren't checked.
+        if self._guards_known:
+            for shape in shapes:
+                if not shape.sources <= self._relied:
+                    return False
+        else:
+            for shape in shapes:
+                self._relied.update(shape.sources)
+        key = (check, id(node))
+        if key not in self._recorded:
+            self._recorded.add(key)
+            self._removed.append((check, node))
+        return True
+
+    def _find_guards(self, root, functions_table):
+        # Asks whether the checks the backends may leave out can be,
+        # which records the values these checks rely on.  The recorded
+        # checks themselves are only the ones the backends leave out.
+        remaining = [root]
+        while remaining:
+            node = remaining.pop()
+            node_type = node.type
+            children = node.children
+            if node_type in ('projection', 'filter_projection', 'flatten'):
+                self.is_list(children[0])
+            if node_type == 'filter_projection':
+                self.has_python_truthiness(children[2])
+            elif node_type in ('index', 'slice'):
+                self.input_is_list(node)
+            elif node_type in ('or_expression', 'and_expression'):
+                self.has_python_truthiness(children[0])
+            elif node_type == 'not_expression':
+                self.is_never_zero(children[0])
+            elif node_type == 'comparator':
+                if node.value in ('eq', 'ne'):
+                    self.is_plain_equality(node)
+                else:
+                    self.is_comparable(children[0])
+                    self.is_comparable(children[1])
+            elif node_type == 'function_expression' and \
+                    functions_table is not None:
+                self.argument_types(node, functions_table)
+            remaining.extend(child for child in children
+                             if hasattr(child, 'tag'))
+        self._removed = []
+        self._recorded = set()
+        self._guards_known = True
+
+    def read_guard(self, node):
+        """The python types of the value read by ``node``, or None.
+
+        The value read by ``node`` has to be one of these types for the
+        checks left out to be left out, None if it can be any value.
+
+        """
+        types = self._read_types.get(id(node))
+        if types is None or id(node) not in self._relied:
+            return None
+        return _python_types(types)
+
+    def element_guard(self, node):
+        """The python types of the elements ``node`` iterates over, or None.
+
+        ``node`` is a projection, or an expression reference applied to
+        the elements of an array.  Same as ``read_guard``.
+
+        """
+        types = self._element_types.get(id(node))
+        if types is None or ('elements', id(node)) not in self._relied:
+            return None
+        return _python_types(types)
+
+    def searched_guard(self):
+        """The python types of the searched value, or None."""
+        if self.searched_types is None:
+            return None
+        return _python_types(self.searched_types)
+
+    def is_present(self, node, key):
+        """Whether the field ``key`` is in the value ``node`` is read from.
+
+        The field must be required by the schema and the value checked
+        to be an object.
+
+        """
+        shape = self._input_shapes.get(id(node), _ANY)
+        schema = shape.schema
+        checked = self._relied
+        if self.searched_types is not None:
+            checked = checked | set([_SEARCHED])
+        return (schema is not None and key in schema.required and
+                shape.types == _OBJECT_ONLY and shape.sources <= checked and
+                self.record_removed('presence check', node))
+
+    def is_list(self, node):
+        """Whether ``node`` always evaluates to a list."""
+        shape = self.shape(node)
+        return shape.types == _ARRAY_ONLY and \
+            self.record_removed('list check', node, shape)
+
+    def input_is_list(self, node):
+        """Whether ``node`` is always evaluated against a list."""
+        shape = self._input_shapes.get(id(node), _ANY)
+        return shape.types == _ARRAY_ONLY and \
+            self.record_removed('list check of the input', node, shape)
+
+    def has_python_truthiness(self, node):
+        """Whether ``not value`` is the same as ``_is_false(value)``."""
+        shape = self.shape(node)
+        return not shape.types & _PYTHON_FALSY and \
+            self.record_removed('truthiness check', node, shape)
+
+    def is_never_zero(self, node):
+        """Whether ``node`` never evaluates to the integer 0."""
+        shape = self.shape(node)
+        return 'number' not in shape.types and \
+            self.record_removed('zero check', node, shape)
+
+    def is_comparable(self, node):
+        """Whether ``_is_comparable`` is true for the value of ``node``."""
+        shape = self.shape(node)
+        return bool(shape.types) and shape.types <= _COMPARABLE and \
+            self.record_removed('comparable check', node, shape)
+
+    def is_plain_equality(self, node):
+        """Whether the equality comparator ``node`` is python's ``==``.
+
+        ``_equals`` special cases comparing the integers 0 and 1 with
+        booleans, which requires a number on one side and a boolean on
+        the other.
+
+        """
+        if any(child.type == 'literal' and
+               not _is_special_equality_literal(child.value)
+               for child in node.children):
+            # Whatever the other value is.
+            return self.record_removed('equality special case', node)
+        shapes = [self.shape(child) for child in node.children]
+        left, right = [shape.types for shape in shapes]
+        if ('number' in left and 'boolean' in right) or \
+                ('boolean' in left and 'number' in right):
+            return False
+        return self.record_removed('equality special case', node, *shapes)
+
+    def argument_types(self, node, functions_table):
+        """The known types of the arguments of a function expression.
+
+        Returns a list, with an entry per argument, of the JMESPath type
+        of the argument (for example ``'array-string'``) if it's known,
+        otherwise None, as expected by ``Functions.resolve_function``.
+
+        """
+        known_types = [self._known_type(self.shape(child))
+                       for child in node.children]
+        for position in functions_table.skipped_type_checks(
+                node.value, known_types):
+            child = node.children[position]
+            shapes = [self.shape(child)]
+            if '-' in known_types[position]:
+                # The types of the elements are relied on as well.
+                shapes.append(shapes[0].items)
+            if not self.record_removed('type check', child, *shapes):
+                known_types[position] = None
+        return known_types
+
+    def _known_type(self, shape):
+        if len(shape.types) != 1 or 'unknown' in shape.types:
+            return None
+        type_name = next(iter(shape.types))
+        if type_name == 'array' and shape.items is not None and \
+                len(shape.items.types) == 1:
+            item_type = next(iter(shape.items.types))
+            if item_type in ('number', 'string'):
+                return 'array-' + item_type
+        return type_name
+
+    def explain(self):
+        """Describe the checks that were left out, one per line."""
+        return ['%s: %s' % (check, render(node))
+                for check, node in self._removed]
+
+
+class _TypeInference(Visitor):
+    # Each visit method takes the node and the shape of its input value
+    # and returns the shape of its result.
+    def __init__(self, functions_table=None, dict_cls=None):
+        super(_TypeInference, self).__init__()
+        self._functions = functions_table
+        self._object = _Shape(['object'])
+        if dict_cls is not None and dict_cls.__name__ not in \
+                functions.REVERSE_TYPES_MAP['object']:
+            self._object = _Shape(['unknown'])
+        self.types = NodeTypes()
+
+    def visit(self, node, shape):
+        result = super(_TypeInference, self).visit(node, shape)
+        self.types._annotate(node, shape, result)
+        return result
+
+    def default_visit(self, node, shape):
+        for child in node.children:
+            if hasattr(child, 'tag'):
+                self.visit(child, _ANY)
+        return _ANY
+
+    def visit_literal(self, node, shape):
+        return _literal_shape(node.value)
+
+    def visit_current(self, node, shape):
+        return shape
+
+    def visit_identity(self, node, shape):
+        return shape
+
+    def visit_field(self, node, shape):
+        return self._field(node, node.value, shape)
+
+    def visit_field_path(self, node, shape):
+        keys = node.value
+        for key in keys[:-1]:
+            shape = self._field(node, key, shape, read=False)
+        return self._field(node, keys[-1], shape)
+
+    def _field(self, node, key, shape, read=True):
+        # ``read`` is false for the fields of a field path that aren't
+        # the last one, only the value of the path is checked.
+        schema = shape.schema
+        if schema is None:
+            if shape.types & frozenset(['object', 'unknown']):
+                return _ANY
+            return _NULL.depending_on(shape)
+        _check_possible(node, schema, 'object', key)
+        field_schema = schema.property_schema(key)
+        if field_schema is None:
+            raise exceptions.SchemaError(
+                "%s can't match documents of the schema: the objects %s "
+                "is applied to have no such field" % (render(node),
+                                                      _render_name(key)))
+        optional = key not in schema.required or \
+            shape.types != _OBJECT_ONLY
+        return self._read(node, field_schema, optional, read)
+
+    def _read(self, node, schema, optional, read=True):
+        # The shape of a value read from the document by ``node``.
+        if schema.types is None:
+            return _Shape(_TYPE_NAMES, schema=schema)
+        types = schema.types
+        if optional:
+            types = types | _NULL_ONLY
+        if not read:
+            return _Shape(types, schema=schema)
+        self.types._add_read(node, types)
+        return _Shape(types, schema=schema, sources=frozenset([id(node)]))
+
+    def _visit_chain(self, node, shape):
+        for child in node.children:
+            shape = self.visit(child, shape)
+        return shape
+
+    visit_subexpression = _visit_chain
+    visit_index_expression = _visit_chain
+    visit_pipe = _visit_chain
+
+    def visit_index(self, node, shape):
+        schema = shape.schema
+        _check_possible(node, schema, 'array')
+        if shape.items is None and schema is not None and \
+                schema.items is not None:
+            return self._read(node, schema.items, True)
+        if shape.types & frozenset(['array', 'unknown']):
+            return shape.item_shape().union(_NULL)
+        return _NULL.depending_on(shape)
+
+    def visit_slice(self, node, shape):
+        _check_possible(node, shape.schema, 'array')
+        return self._list_result(
+            shape, _array(shape.item_shape(), shape.schema))
+
+    def _list_result(self, base, result):
+        # The result of a node that evaluates to null unless ``base``
+        # is a list.
+        if not base.types & frozenset(['array', 'unknown']):
+            return _NULL.depending_on(base)
+        if base.types != _ARRAY_ONLY:
+            result = result.union(_NULL)
+        return result.depending_on(base)
+
+    def _visit_base(self, node, shape, type_name='array'):
+        # Visits the left hand side of a projection.
+        base = self.visit(node, shape)
+        _check_possible(node, base.schema, type_name)
+        return base
+
+    def _elements(self, node, base):
+        # The shape of the elements of ``base`` that ``node`` applies an
+        # expression to.  The elements of a list of the document have
+        # the types of the schema, which ``node`` checks if needed.
+        elements = base.item_shape()
+        schema = elements.schema
+        if 'unknown' not in elements.types or schema is None or \
+                schema.types is None:
+            return elements
+        self.types._add_read(node, schema.types, self.types._element_types)
+        return _Shape(schema.types, schema=schema,
+                      sources=frozenset([('elements', id(node))]))
+
+    def visit_projection(self, node, shape):
+        base = self._visit_base(node.children[0], shape)
+        projected = self.visit(node.children[1], self._elements(node, base))
+        return self._list_result(base, _array(projected.without('null')))
+
+    def visit_filter_projection(self, node, shape):
+        base = self._visit_base(node.children[0], shape)
+        elements = self._elements(node, base)
+        self.visit(node.children[2], elements)
+        projected = self.visit(node.children[1], elements)
+        return self._list_result(base, _array(projected.without('null')))
+
+    def visit_flatten(self, node, shape):
+        base = self._visit_base(node.children[0], shape)
+        elements = base.item_shape()
+        items = elements.without('array')
+        if elements.types & frozenset(['array', 'unknown']):
+            items = items.union(elements.item_shape())
+        schema = _flattened_schema(elements.schema)
+        if schema is not None and 'unknown' in items.types:
+            # Projecting the result applies to elements of the schema.
+            items = None
+        return self._list_result(base, _array(items, schema))
+
+    def visit_value_projection(self, node, shape):
+        base = self._visit_base(node.children[0], shape, 'object')
+        projected = self.visit(node.children[1], _ANY)
+        result = _array(projected.without('null'))
+        if base.types != frozenset(['object']):
+            result = result.union(_NULL)
+        return result.depending_on(base)
+
+    def visit_comparator(self, node, shape):
+        left, right = [self.visit(child, shape) for child in node.children]
+        result = _BOOLEAN
+        if node.value not in ('eq', 'ne') and not (
+                left.types <= _COMPARABLE and right.types <= _COMPARABLE):
+            result = _Shape(['boolean', 'null'])
+        if 'unknown' in left.types or 'unknown' in right.types:
+            # Comparing other types may return anything.
+            result = result.union(_Shape(['unknown']))
+        return result.depending_on(left, right)
+
+    def visit_or_expression(self, node, shape):
+        left = self.visit(node.children[0], shape)
+        right = self.visit(node.children[1], shape)
+        return left.without('null').union(right)
+
+    def visit_and_expression(self, node, shape):
+        left = self.visit(node.children[0], shape)
+        right = self.visit(node.children[1], shape)
+        falsy = _Shape(left.types & _MAY_BE_FALSE, left.items, left.schema,
+                       left.sources)
+        return falsy.union(right)
+
+    def visit_not_expression(self, node, shape):
+        self.visit(node.children[0], shape)
+        return _BOOLEAN
+
+    def visit_multi_select_list(self, node, shape):
+        items = _union_or_none(
+            [self.visit(child, shape) for child in node.children])
+        return self._null_if_null(shape, _array(items))
+
+    def visit_multi_select_dict(self, node, shape):
+        for child in node.children:
+            self.visit(child, shape)
+        return self._null_if_null(shape, self._object)
+
+    def _null_if_null(self, shape, result):
+        if 'null' in shape.types:
+            result = result.union(_NULL)
+        return result.depending_on(shape)
+
+    def visit_key_val_pair(self, node, shape):
+        return self.visit(node.children[0], shape)
+
+    def visit_expref(self, node, shape):
+        # ``shape`` is the shape of the values the expression is
+        # applied to.
+        self.visit(node.children[0], shape)
+        return _EXPREF
+
+    def visit_function_expression(self, node, shape):
+        builtin = _is_builtin(self._functions, node.value)
+        args = [None if child.type == 'expref' else self.visit(child, shape)
+                for child in node.children]
+        array = None
+        position = _EXPREF_ARRAYS.get(node.value)
+        if builtin and position is not None and position < len(args):
+            array = args[position]
+        for position, child in enumerate(node.children):
+            if args[position] is None:
+                elements = _ANY
+                if array is not None:
+                    elements = self._elements(child, array)
+                args[position] = self.visit(child, elements)
+        if not builtin:
+            return _ANY
+        try:
+            return _RETURN_SHAPES[node.value](args)
+        except (KeyError, IndexError):
+            # Called with the wrong number of arguments, which is an
+            # error anyway.
+            return _ANY
+
+
+# The builtin functions applying an expression reference to the
+# elements of an array, and the position of the array.
+_EXPREF_ARRAYS = {'map': 1, 'max_by': 0, 'min_by': 0, 'sort_by': 0}
+
+
+def _flattened_schema(elements):
+    # The schema of the list flattening lists of ``elements``.
+    if elements is None or elements.types is None:
+        return None
+    elif 'array' not in elements.types:
+        items = elements
+    elif elements.types == _ARRAY_ONLY:
+        items = elements.items
+    else:
+        return None
+    return _Schema(_ARRAY_ONLY, items=items)
+
+
+def _union_or_none(shapes):
+    if not shapes:
+        return None
+    result = shapes[0]
+    for shape in shapes[1:]:
+        result = result.union(shape)
+    return result
+
+
+def infer_types(node, functions_table=None, dict_cls=None, schema=None):
+    """Infer the shape of every node of the AST ``node``.
+
+    ``functions_table`` is the ``Functions`` instance the expression
+    is evaluated with, the result types are only known for the builtin
+    functions.  ``dict_cls`` is the class of the dicts created by
+    multi-select hashes.  ``schema``, if given, is the schema of the
+    searched documents returned by ``parse_schema``.  Returns a
+    ``NodeTypes``.
+
+    """
+    inference = _TypeInference(functions_table, dict_cls)
+    shape = _ANY
+    if schema is not None:
+        shape = _Shape(_TYPE_NAMES, schema=schema)
+        if schema.types is not None:
+            shape = _Shape(schema.types, schema=schema,
+                           sources=frozenset([_SEARCHED]))
+            inference.types.searched_types = schema.types
+    inference.visit(node, shape)
+    if schema is not None:
+        inference.types._find_guards(node, functions_table)
+    return inference.types
+
+
+# Rendering an AST back into an expression, to describe nodes.
+
+_BINARY_OPERATORS = {
+    'pipe': ('|', 1),
+    'or_expression': ('||', 2),
+    'and_expression': ('&&', 3),
+}
+_COMPARATORS = {
+    'eq': '==', 'ne': '!=', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>=',
+}
+_PRECEDENCE = dict((node_type, precedence) for node_type, (_, precedence)
+                   in _BINARY_OPERATORS.items())
+_PRECEDENCE['comparator'] = 4
+_PRECEDENCE['not_expression'] = 5
+
+
+def render(node):
+    """Return an expression that parses into ``node``.
+
+    This is meant for describing nodes, the result is not guaranteed to
+    be the original expression (or to parse into the exact same AST).
+
+    """
+    return _render(node) or '@'
+
+
+def _render_operand(node, precedence):
+    text = render(node)
+    if _PRECEDENCE.get(node.type, 6) < precedence:
+        return '(%s)' % text
+    return text
+
+
+def _render_name(name):
+    if name and (name[0].isalpha() or name[0] == '_') and \
+            all(c.isalnum() or c == '_' for c in name):
+        return name
+    return json.dumps(name)
+
+
+def _render_continued(text, node):
+    # Appends the rendered ``node`` to ``text``, a chain of
+    # subexpressions.
+    rendered = _render(node)
+    if not rendered:
+        return text
+    if not text:
+        return rendered
+    if rendered.startswith('[') and node.type != 'multi_select_list':
+        return text + rendered
+    return '%s.%s' % (text, rendered)
+
+
+def _render(node):
+    # Renders the identity node as '', so it disappears from chains.
+    node_type = node.type
+    children = node.children
+    if node_type == 'field':
+        return _render_name(node.value)
+    elif node_type == 'field_path':
+        return '.'.join(_render_name(name) for name in node.value)
+    elif node_type == 'identity':
+        return ''
+    elif node_type == 'current':
+        return '@'
+    elif node_type == 'literal':
+        return '`%s`' % json.dumps(
+            node.value, separators=(',', ':')).replace('`', '\\`')
+    elif node_type == 'index':
+        return '[%s]' % node.value
+    elif node_type == 'slice':
+        parts = ['' if part is None else str(part) for part in children]
+        if parts[2] == '':
+            parts.pop()
+        return '[%s]' % ':'.join(parts)
+    elif node_type in ('subexpression', 'index_expression'):
+        text = _render_projected(children[0])
+        for child in children[1:]:
+            text = _render_continued(text, child)
+        return text
+    elif node_type in _BINARY_OPERATORS:
+        operator, precedence = _BINARY_OPERATORS[node_type]
+        return '%s %s %s' % (_render_operand(children[0], precedence),
+                             operator,
+                             _render_operand(children[1], precedence + 1))
+    elif node_type == 'comparator':
+        return '%s %s %s' % (_render_operand(children[0], 5),
+                             _COMPARATORS[node.value],
+                             _render_operand(children[1], 5))
+    elif node_type == 'not_expression':
+        return '!' + _render_operand(children[0], 5)
+    elif node_type == 'function_expression':
+        return '%s(%s)' % (node.value,
+                           ', '.join(render(child) for child in children))
+    elif node_type == 'expref':
+        return '&' + render(children[0])
+    elif node_type == 'multi_select_list':
+        return '[%s]' % ', '.join(render(child) for child in children)
+    elif node_type == 'multi_select_dict':
+        return '{%s}' % ', '.join(
+            '%s: %s' % (_render_name(child.value), render(child.children[0]))
+            for child in children)
+    elif node_type == 'flatten':
+        return _render_projected(children[0]) + '[]'
+    elif node_type == 'projection':
+        left = children[0]
+        if left.type == 'flatten' or (
+                left.type == 'index_expression' and
+                left.children[-1].type == 'slice'):
+            text = _render(left)
+        else:
+            text = _render_projected(left) + '[*]'
+        return _render_continued(text, children[1])
+    elif node_type == 'value_projection':
+        text = _render_projected(children[0])
+        text = '%s.*' % text if text else '*'
+        return _render_continued(text, children[1])
+    elif node_type == 'filter_projection':
+        text = '%s[?%s]' % (_render_projected(children[0]),
+                            render(children[2]))
+        return _render_continued(text, children[1])
+    return node_type
+
+
+def _render_projected(node):
+    # The left hand side of a projection.
+    if node.type in _PRECEDENCE:
+        return '(%s)' % render(node)
+    return _render(node)
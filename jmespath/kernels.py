@@ -0,0 +1,194 @@
+"""Specialized predicates for common filter conditions.
+
+Most filters compare a field of each element against a literal, for
+example ``[?state == 'running']`` or ``[?size > `10`]``.  Evaluating
+the generic compiled comparator for every element means calling a
+function for each side of the comparison, then calling the comparator
+function (``_equals``, or ``_is_comparable`` for each side followed by
+the ordering operator), and finally checking the result with
+``_is_false``.
+
+``compile_filter_predicate`` recognizes these shapes and builds a single
+function per condition, with the field names and the literal bound and
+the comparison semantics inlined.  A conjunction of two ordering
+comparisons on the same field (``[?a > `1` && a < `5`]``) is fused into
+a single range check that only looks up the field once.
+
+The predicates return a value with the same truthiness, in the JMESPath
+sense, as the condition they replace, which is all a filter needs.
+
+"""
+import operator
+
+from jmespath.compat import string_type
+from jmespath.visitor import _equals, _is_comparable
+
+
+_FLIPPED_COMPARATORS = {
+    'eq': 'eq',
+    'ne': 'ne',
+    'lt': 'gt',
+    'gt': 'lt',
+    'lte': 'gte',
+    'gte': 'lte',
+}
+_ORDERING_FUNC = {
+    'lt': operator.lt,
+    'gt': operator.gt,
+    'lte': operator.le,
+    'gte': operator.ge,
+}
+_FAST_NUMBER_TYPES = (int, float)
+
+
+def compile_filter_predicate(node):
+    """Compile a filter condition into a specialized predicate.
+
+    Returns None if the condition is not one of the recognized shapes.
+
+    """
+    if node.type == 'comparator':
+        return _compile_comparison(node)
+    elif node.type == 'and_expression':
+        return _compile_range(node)
+    return None
+
+
+def _compile_getter(node):
+    node_type = node.type
+    if node_type == 'field':
+        key = node.value
+
+        def get_field(element):
+            try:
+                return element.get(key)
+            except AttributeError:
+                return None
+        return get_field
+    elif node_type == 'field_path':
+        keys = tuple(node.value)
+
+        def get_field_path(element):
+            for key in keys:
+                try:
+                    element = element.get(key)
+                except AttributeError:
+                    return None
+            return element
+        return get_field_path
+    elif node_type in ('current', 'identity'):
+        return _identity
+    return None
+
+
+def _split_comparison(node):
+    # Returns (getter_node, comparator, literal value) with the
+    # literal normalized to the right hand side, or None.
+    left, right = node.children
+    comparator = node.value
+    if right.type == 'literal' and left.type != 'literal':
+        return left, comparator, right.value
+    elif left.type == 'literal' and right.type != 'literal':
+        return right, _FLIPPED_COMPARATORS[comparator], left.value
+    return None
+
+
+def _compile_comparison(node):
+    split = _split_comparison(node)
+    if split is None:
+        return None
+    getter_node, comparator, literal = split
+    getter = _compile_getter(getter_node)
+    if getter is None:
+        return None
+    if comparator == 'eq':
+        return _equality_predicate(getter, literal)
+    elif comparator == 'ne':
+        return _inequality_predicate(getter, literal)
+    return _ordering_predicate(getter, comparator, literal)
+
+
+def _is_special_equality_literal(literal):
+    # _equals() special cases comparing 0/1 with true/false.  For any
+    # other literal it's the same as ==.
+    return literal is True or literal is False or \
+        (type(literal) is int and literal in (0, 1))
+
+
+def _equality_predicate(getter, literal):
+    if _is_special_equality_literal(literal):
+        def predicate(element):
+            return _equals(getter(element), literal)
+    else:
+        def predicate(element):
+            return getter(element) == literal
+    return predicate
+
+
+def _inequality_predicate(getter, literal):
+    if _is_special_equality_literal(literal):
+        def predicate(element):
+            return not _equals(getter(element), literal)
+    else:
+        def predicate(element):
+            return getter(element) != literal
+    return predicate
+
+
+def _ordering_predicate(getter, comparator, literal):
+    if not _is_comparable(literal):
+        # The comparison is always null, so nothing is selected.
+        return _never
+    compare = _ORDERING_FUNC[comparator]
+
+    def predicate(element):
+        value = getter(element)
+        if type(value) in _FAST_NUMBER_TYPES or _is_comparable(value):
+            return compare(value, literal)
+        return False
+    return predicate
+
+
+def _compile_range(node):
+    # [?a > `1` && a < `5`] -> one lookup of "a", then both checks.
+    left, right = node.children
+    if left.type != 'comparator' or right.type != 'comparator':
+        return None
+    lower = _split_comparison(left)
+    upper = _split_comparison(right)
+    if lower is None or upper is None:
+        return None
+    if lower[0] != upper[0] or lower[1] not in _ORDERING_FUNC or \
+            upper[1] not in _ORDERING_FUNC:
+        return None
+    getter = _compile_getter(lower[0])
+    if getter is None:
+        return None
+    if not (_is_comparable(lower[2]) and _is_comparable(upper[2])):
+        # At least one side is always null, so the && expression is
+        # always false.  Note that the left comparison can still
+        # raise an error for mismatched types, so only fold the
+        # case where it can't be evaluated at all.
+        if not _is_comparable(lower[2]):
+            return _never
+        return None
+    first_compare = _ORDERING_FUNC[lower[1]]
+    first_literal = lower[2]
+    second_compare = _ORDERING_FUNC[upper[1]]
+    second_literal = upper[2]
+
+    def predicate(element):
+        value = getter(element)
+        if type(value) in _FAST_NUMBER_TYPES or _is_comparable(value):
+            return (first_compare(value, first_literal) and
+                    second_compare(value, second_literal))
+        return False
+    return predicate
+
+
+def _identity(value):
+    return value
+
+
+def _never(element):
+    return False
@@ -1,3 +1,4 @@
+import re
 import string
 import warnings
 from json import loads
@@ -5,162 +6,184 @@ from json import loads
 from jmespath.exceptions import LexerError, EmptyExpressionError
 
 
+class Token(object):
+    """A single lexer token.
+
+    Tokens also support the dict style access (``token['type']``) of
+    the dicts the lexer used to yield.
+
+    """
+    __slots__ = ('type', 'value', 'start', 'end')
+
+    def __init__(self, type, value, start, end):
+        self.type = type
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if isinstance(other, Token):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        return {'type': self.type, 'value': self.value,
+                'start': self.start, 'end': self.end}
+
+
 class Lexer(object):
-    START_IDENTIFIER = set(string.ascii_letters + '_')
-    VALID_IDENTIFIER = set(string.ascii_letters + string.digits + '_')
-    VALID_NUMBER = set(string.digits)
-    WHITESPACE = set(" \t\n\r")
-    SIMPLE_TOKENS = {
-        '.': 'dot',
-        '*': 'star',
-        ']': 'rbracket',
-        ',': 'comma',
-        ':': 'colon',
-        '@': 'current',
-        '(': 'lparen',
-        ')': 'rparen',
-        '{': 'lbrace',
-        '}': 'rbrace',
+    """Tokenize a JMESPath expression.
+
+    The expression is split into lexemes in a single pass with one
+    compiled regex, ``TOKEN_REGEX``.  Each lexeme is then classified
+    by a table lookup on the lexeme (for operators) or on its first
+    character.
+
+    """
+    # Maps operators and punctuation to the token type and the
+    # offset of the token's "end" from its "start".
+    OPERATORS = {
+        '.': ('dot', 1),
+        '*': ('star', 1),
+        ']': ('rbracket', 1),
+        ',': ('comma', 1),
+        ':': ('colon', 1),
+        '@': ('current', 1),
+        '(': ('lparen', 1),
+        ')': ('rparen', 1),
+        '{': ('lbrace', 1),
+        '}': ('rbrace', 1),
+        '[': ('lbracket', 1),
+        '[]': ('flatten', 2),
+        '[?': ('filter', 2),
+        '||': ('or', 1),
+        '|': ('pipe', 0),
+        '&&': ('and', 1),
+        '&': ('expref', 0),
+        '<=': ('lte', 1),
+        '<': ('lt', 0),
+        '>=': ('gte', 1),
+        '>': ('gt', 0),
+        '!=': ('ne', 1),
+        '!': ('not', 0),
+        '==': ('eq', 1),
+    }
+    # Every character of an expression is matched by exactly one
+    # alternative, so the tokens are contiguous and their positions
+    # can be computed from their lengths.  Delimited tokens allow any
+    # character to be escaped with "\".  Their loops are unrolled so
+    # an unclosed delimiter fails in linear time.  Anything else is
+    # matched one character at a time and reported as an error.
+    TOKEN_REGEX = re.compile(r"""
+        [a-zA-Z_][a-zA-Z0-9_]*
+      | \|\| | && | <= | >= | != | == | \[[\]?]? | [.*\],:@(){}|&<>!]
+      | [ \t\n\r]+
+      | -?[0-9]+
+      | "[^"\\]*(?:\\.[^"\\]*)*"
+      | '[^'\\]*(?:\\.[^'\\]*)*'
+      | `[^`\\]*(?:\\.[^`\\]*)*`
+      | .
+    """, re.VERBOSE | re.DOTALL)
+    START_IDENTIFIER = frozenset(string.ascii_letters + '_')
+    START_NUMBER = frozenset(string.digits + '-')
+    WHITESPACE = frozenset(' \t\n\r')
+    DELIMITERS = {
+        '"': 'quoted_identifier',
+        "'": 'raw_string',
+        '`': 'literal',
     }
 
     def tokenize(self, expression):
-        self._initialize_for_expression(expression)
-        while self._current is not None:
-            if self._current in self.SIMPLE_TOKENS:
-                yield {'type': self.SIMPLE_TOKENS[self._current],
-                       'value': self._current,
-                       'start': self._position, 'end': self._position + 1}
-                self._next()
-            elif self._current in self.START_IDENTIFIER:
-                start = self._position
-                buff = self._current
-                while self._next() in self.VALID_IDENTIFIER:
-                    buff += self._current
-                yield {'type': 'unquoted_identifier', 'value': buff,
-                       'start': start, 'end': start + len(buff)}
-            elif self._current in self.WHITESPACE:
-                self._next()
-            elif self._current == '[':
-                start = self._position
-                next_char = self._next()
-                if next_char == ']':
-                    self._next()
-                    yield {'type': 'flatten', 'value': '[]',
-                           'start': start, 'end': start + 2}
-                elif next_char == '?':
-                    self._next()
-                    yield {'type': 'filter', 'value': '[?',
-                           'start': start, 'end': start + 2}
-                else:
-                    yield {'type': 'lbracket', 'value': '[',
-                           'start': start, 'end': start + 1}
-            elif self._current == "'":
-                yield self._consume_raw_string_literal()
-            elif self._current == '|':
-                yield self._match_or_else('|', 'or', 'pipe')
-            elif self._current == '&':
-                yield self._match_or_else('&', 'and', 'expref')
-            elif self._current == '`':
-                yield self._consume_literal()
-            elif self._current in self.VALID_NUMBER:
-                start = self._position
-                buff = self._consume_number()
-                yield {'type': 'number', 'value': int(buff),
-                       'start': start, 'end': start + len(buff)}
-            elif self._current == '-':
-                # Negative number.
-                start = self._position
-                buff = self._consume_number()
-                if len(buff) > 1:
-                    yield {'type': 'number', 'value': int(buff),
-                           'start': start, 'end': start + len(buff)}
-                else:
-                    raise LexerError(lexer_position=start,
-                                     lexer_value=buff,
-                                     message="Unknown token '%s'" % buff)
-            elif self._current == '"':
-                yield self._consume_quoted_identifier()
-            elif self._current == '<':
-                yield self._match_or_else('=', 'lte', 'lt')
-            elif self._current == '>':
-                yield self._match_or_else('=', 'gte', 'gt')
-            elif self._current == '!':
-                yield self._match_or_else('=', 'ne', 'not')
-            elif self._current == '=':
-                if self._next() == '=':
-                    yield {'type': 'eq', 'value': '==',
-                        'start': self._position - 1, 'end': self._position}
-                    self._next()
-                else:
-                    if self._current is None:
-                        # If we're at the EOF, we never advanced
-                        # the position so we don't need to rewind
-                        # it back one location.
-                        position = self._position
-                    else:
-                        position = self._position - 1
-                    raise LexerError(
-                        lexer_position=position,
-                        lexer_value='=',
-                        message="Unknown token '='")
-            else:
-                raise LexerError(lexer_position=self._position,
-                                 lexer_value=self._current,
-                                 message="Unknown token %s" % self._current)
-        yield {'type': 'eof', 'value': '',
-               'start': self._length, 'end': self._length}
-
-    def _consume_number(self):
-        start = self._position
-        buff = self._current
-        while self._next() in self.VALID_NUMBER:
-            buff += self._current
-        return buff
-
-    def _initialize_for_expression(self, expression):
+        for token in self.scan(expression):
+            yield Token(*token)
+
+    def scan(self, expression):
+        """Return the tokens of an expression as a list of tuples.
+
+        Each token is a ``(type, value, start, end)`` tuple.  This is
+        what the parser consumes, ``tokenize`` yields the same tokens
+        as ``Token`` objects.
+
+        """
         if not expression:
             raise EmptyExpressionError()
-        self._position = 0
-        self._expression = expression
-        self._chars = list(self._expression)
-        self._current = self._chars[self._position]
-        self._length = len(self._expression)
-
-    def _next(self):
-        if self._position == self._length - 1:
-            self._current = None
-        else:
-            self._position += 1
-            self._current = self._chars[self._position]
-        return self._current
-
-    def _consume_until(self, delimiter):
-        # Consume until the delimiter is reached,
-        # allowing for the delimiter to be escaped with "\".
-        start = self._position
-        buff = ''
-        self._next()
-        while self._current != delimiter:
-            if self._current == '\\':
-                buff += '\\'
-                self._next()
-            if self._current is None:
-                # We're at the EOF.
-                raise LexerError(lexer_position=start,
-                                 lexer_value=self._expression[start:],
-                                 message="Unclosed %s delimiter" % delimiter)
-            buff += self._current
-            self._next()
-        # Skip the closing delimiter.
-        self._next()
-        return buff
-
-    def _consume_literal(self):
-        start = self._position
-        lexeme = self._consume_until('`').replace('\\`', '`')
+        operators = self.OPERATORS
+        start_identifier = self.START_IDENTIFIER
+        whitespace = self.WHITESPACE
+        start_number = self.START_NUMBER
+        length = len(expression)
+        tokens = []
+        append = tokens.append
+        end = 0
+        for lexeme in self.TOKEN_REGEX.findall(expression):
+            start = end
+            end += len(lexeme)
+            operator = operators.get(lexeme)
+            if operator is not None:
+                append((operator[0], lexeme, start, start + operator[1]))
+                continue
+            first = lexeme[0]
+            if first in start_identifier:
+                append(('unquoted_identifier', lexeme, start, end))
+            elif first in whitespace:
+                continue
+            elif first in start_number and lexeme != '-':
+                append(('number', int(lexeme), start, end))
+            elif first in self.DELIMITERS and len(lexeme) > 1:
+                append(self._delimited_token(
+                    self.DELIMITERS[first], lexeme, expression,
+                    start, length))
+            else:
+                raise self._unknown_token_error(expression, start)
+        append(('eof', '', length, length))
+        return tokens
+
+    def _delimited_token(self, kind, lexeme, expression, start, length):
+        # The "end" of a delimited token has always been reported as
+        # its length, not counting the closing delimiter if it's the
+        # last character of the expression.
+        token_len = len(lexeme)
+        if start + token_len == length:
+            token_len -= 1
+        lexeme = lexeme[1:-1]
+        if kind == 'literal':
+            value = self._parse_literal(
+                lexeme.replace('\\`', '`'), expression, start)
+            return ('literal', value, start, token_len)
+        elif kind == 'raw_string':
+            return ('literal', lexeme.replace("\\'", "'"),
+                    start, token_len)
+        lexeme = '"' + lexeme + '"'
+        try:
+            return ('quoted_identifier', loads(lexeme), start, token_len)
+        except ValueError as e:
+            error_message = str(e).split(':')[0]
+            raise LexerError(lexer_position=start,
+                             lexer_value=lexeme,
+                             message=error_message)
+
+    def _parse_literal(self, lexeme, expression, start):
         try:
             # Assume it is valid JSON and attempt to parse.
-            parsed_json = loads(lexeme)
+            return loads(lexeme)
         except ValueError:
             try:
                 # Invalid JSON values should be converted to quoted
@@ -168,41 +191,23 @@ class Lexer(object):
                 parsed_json = loads('"%s"' % lexeme.lstrip())
                 warnings.warn("deprecated string literal syntax",
                               PendingDeprecationWarning)
+                return parsed_json
             except ValueError:
                 raise LexerError(lexer_position=start,
-                                 lexer_value=self._expression[start:],
+                                 lexer_value=expression[start:],
                                  message="Bad token %s" % lexeme)
-        token_len = self._position - start
-        return {'type': 'literal', 'value': parsed_json,
-                'start': start, 'end': token_len}
-
-    def _consume_quoted_identifier(self):
-        start = self._position
-        lexeme = '"' + self._consume_until('"') + '"'
-        try:
-            token_len = self._position - start
-            return {'type': 'quoted_identifier', 'value': loads(lexeme),
-                    'start': start, 'end': token_len}
-        except ValueError as e:
-            error_message = str(e).split(':')[0]
-            raise LexerError(lexer_position=start,
-                             lexer_value=lexeme,
-                             message=error_message)
 
-    def _consume_raw_string_literal(self):
-        start = self._position
-        lexeme = self._consume_until("'").replace("\\'", "'")
-        token_len = self._position - start
-        return {'type': 'literal', 'value': lexeme,
-                'start': start, 'end': token_len}
-
-    def _match_or_else(self, expected, match_type, else_type):
-        start = self._position
-        current = self._current
-        next_char = self._next()
-        if next_char == expected:
-            self._next()
-            return {'type': match_type, 'value': current + next_char,
-                    'start': start, 'end': start + 1}
-        return {'type': else_type, 'value': current,
-                'start': start, 'end': start}
+    def _unknown_token_error(self, expression, position):
+        current = expression[position]
+        if current in ('`', "'", '"'):
+            return LexerError(lexer_position=position,
+                              lexer_value=expression[position:],
+                              message="Unclosed %s delimiter" % current)
+        elif current in ('-', '='):
+            # A "-" not followed by a number, or a single "=".
+            return LexerError(lexer_position=position,
+                              lexer_value=current,
+                              message="Unknown token '%s'" % current)
+        return LexerError(lexer_position=position,
+                          lexer_value=current,
+                          message="Unknown token %s" % current)
@@ -12,29 +12,61 @@ general idea behind a Pratt parser:
 
 A few notes on the implementation.
 
-* All the nud/led tokens are on the Parser class itself, and are dispatched
-  using getattr().  This keeps all the parsing logic contained to a single
-  class.
+* All the nud/led tokens are on the Parser class itself.  This keeps all
+  the parsing logic contained to a single class.  The ``_token_nud_<type>``
+  and ``_token_led_<type>`` methods are collected into per-class dispatch
+  tables keyed by token type the first time a class is instantiated, so
+  parsing doesn't look up methods by name for every token.
 * We use two passes through the data.  One to create a list of token,
-  then one pass through the tokens to create the AST.  While the lexer actually
-  yields tokens, we convert it to a list so we can easily implement two tokens
-  of lookahead.  A previous implementation used a fixed circular buffer, but it
-  was significantly slower.  Also, the average jmespath expression typically
-  does not have a large amount of token so this is not an issue.  And
-  interestingly enough, creating a token list first is actually faster than
-  consuming from the token iterator one token at a time.
+  then one pass through the tokens to create the AST.  Having a list of
+  tokens makes it easy to implement two tokens of lookahead.  A previous
+  implementation used a fixed circular buffer, but it was significantly
+  slower.  Also, the average jmespath expression typically does not have a
+  large amount of token so this is not an issue.
+* Tokens are the ``(type, value, start, end)`` tuples returned by
+  ``Lexer.scan``, which are much cheaper to create than token objects.
 
 """
-import random
+import functools
+import threading
 
+from jmespath import cache
+from jmespath import cachefile
 from jmespath import lexer
+from jmespath.compat import imap
 from jmespath.compat import with_repr_method
 from jmespath import ast
+from jmespath import codegen
+from jmespath import compiler
 from jmespath import exceptions
+from jmespath import inference
 from jmespath import visitor
 
 
+class _PendingParse(object):
+    # An expression that's being parsed by another thread.
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
 class Parser(object):
+    """Parse JMESPath expressions into ``ParsedResult`` objects.
+
+    A ``Parser`` can be shared between threads.  The concurrency model
+    is:
+
+    * Cache lookups don't take a lock (see ``jmespath.cache``).
+    * On a cache miss, an expression is parsed by a single thread.
+      Other threads that miss the cache for the same expression
+      (and backend) wait for that parse and share its result, or
+      its error.  A lock is only held to register or look up the
+      pending parse.
+    * The parsing state (the tokens and the current index) belongs to
+      a copy of the ``Parser`` made for each parse.
+
+    """
     BINDING_POWER = {
         'eof': 0,
         'unquoted_identifier': 0,
@@ -70,30 +102,141 @@ class Parser(object):
     # The maximum binding power for a token that can stop
     # a projection.
     _PROJECTION_STOP = 10
-    # The _MAX_SIZE most recent expressions are cached in
-    # _CACHE dict.
-    _CACHE = {}
+    # Parsed expressions are cached in _CACHE, by default the
+    # _MAX_SIZE most recently used ones.  See set_cache().
     _MAX_SIZE = 128
-
-    def __init__(self, lookahead=2):
-        self.tokenizer = None
+    _CACHE = cache.LRUCache(max_entries=_MAX_SIZE)
+    # Cache key -> ParsedResult for the expressions frozen with
+    # freeze().  This dict is never modified, freeze() replaces it.
+    _FROZEN = {}
+    # Cache key -> _PendingParse for the expressions being parsed.
+    _PENDING = {}
+    _PENDING_LOCK = threading.Lock()
+
+    def __init__(self, lookahead=2, backend=None, optimize=True):
         self._tokens = [None] * lookahead
         self._buffer_size = lookahead
         self._index = 0
+        if backend is None:
+            backend = ParsedResult.DEFAULT_BACKEND
+        if backend not in ParsedResult.BACKENDS:
+            raise ValueError(
+                "Unknown backend '%s', must be one of: %s" % (
+                    backend, ', '.join(sorted(ParsedResult.BACKENDS))))
+        self.backend = backend
+        self.optimize = optimize
+        if '_NUD_TABLE' not in type(self).__dict__:
+            type(self)._build_dispatch_tables()
+
+    @classmethod
+    def _build_dispatch_tables(cls):
+        # Maps a token type to the (unbound) nud/led method for that
+        # token type.
+        nud_table = {}
+        led_table = {}
+        for name in dir(cls):
+            if name.startswith('_token_nud_'):
+                nud_table[name[len('_token_nud_'):]] = getattr(cls, name)
+            elif name.startswith('_token_led_'):
+                led_table[name[len('_token_led_'):]] = getattr(cls, name)
+        cls._NUD_TABLE = nud_table
+        cls._LED_TABLE = led_table
 
     def parse(self, expression):
-        cached = self._CACHE.get(expression)
+        # The same expression compiled for different backends (or
+        # with optimizations disabled) produces different
+        # ParsedResults, so these are part of the cache key.
+        key = (self.backend, self.optimize, expression)
+        frozen = self._FROZEN.get(key)
+        if frozen is not None:
+            return frozen
+        cached = self._CACHE.get(key)
         if cached is not None:
             return cached
-        parsed_result = self._do_parse(expression)
-        self._CACHE[expression] = parsed_result
-        if len(self._CACHE) > self._MAX_SIZE:
-            self._free_cache_entries()
-        return parsed_result
+        with self._PENDING_LOCK:
+            # The expression may have been cached since the lookup
+            # above, by a parse that's no longer pending.
+            cached = self._CACHE.peek(key)
+            if cached is not None:
+                return cached
+            pending = self._PENDING.get(key)
+            is_parsing = pending is None
+            if is_parsing:
+                pending = self._PENDING[key] = _PendingParse()
+        if not is_parsing:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+        try:
+            pending.result = self._do_parse(expression)
+            self._CACHE.put(key, pending.result)
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._PENDING_LOCK:
+                del self._PENDING[key]
+            pending.done.set()
+        return pending.result
+
+    def parse_many(self, expressions, cache_file=None):
+        """Parse every expression in ``expressions``.
+
+        Unlike ``parse``, an invalid expression doesn't stop the other
+        expressions from being parsed.  Returns a tuple of two dicts,
+        one mapping the valid expressions to their ``ParsedResult``,
+        the other mapping the invalid expressions to their error.
+
+        If ``cache_file`` is given, the ASTs stored in this file (see
+        ``jmespath.cachefile``) are used instead of parsing the
+        expressions again.  If any valid expression isn't in the file,
+        the file is rewritten with the ASTs of all the expressions
+        it had and the ones parsed.
+
+        """
+        stored = {}
+        if cache_file is not None:
+            stored = cachefile.load(cache_file, optimized=self.optimize)
+        results = {}
+        errors = {}
+        parsed_new = False
+        for expression in expressions:
+            if expression in results or expression in errors:
+                continue
+            node = stored.get(expression)
+            try:
+                if node is not None:
+                    result = self._from_ast(expression, node)
+                else:
+                    result = self.parse(expression)
+                    parsed_new = True
+                result.bind()
+            except exceptions.JMESPathError as e:
+                errors[expression] = e
+            else:
+                results[expression] = result
+        if cache_file is not None and parsed_new:
+            for expression, result in results.items():
+                stored[expression] = result.ast
+            cachefile.save(cache_file, stored, optimized=self.optimize)
+        return results, errors
+
+    def _from_ast(self, expression, node):
+        key = (self.backend, self.optimize, expression)
+        cached = self._CACHE.get(key)
+        if cached is None:
+            cached = ParsedResult(expression, node, backend=self.backend)
+            self._CACHE.put(key, cached)
+        return cached
 
     def _do_parse(self, expression):
+        # Parse with a copy of this parser so the parsing state isn't
+        # shared between threads.
+        parser = object.__new__(type(self))
+        parser.__dict__.update(self.__dict__)
         try:
-            return self._parse(expression)
+            return parser._parse(expression)
         except exceptions.LexerError as e:
             e.expression = expression
             raise
@@ -105,49 +248,52 @@ class Parser(object):
             raise
 
     def _parse(self, expression):
-        self.tokenizer = lexer.Lexer().tokenize(expression)
-        self._tokens = list(self.tokenizer)
+        self._tokens = lexer.Lexer().scan(expression)
         self._index = 0
         parsed = self._expression(binding_power=0)
         if not self._current_token() == 'eof':
             t = self._lookahead_token(0)
-            raise exceptions.ParseError(t['start'], t['value'], t['type'],
-                                        "Unexpected token: %s" % t['value'])
-        return ParsedResult(expression, parsed)
+            raise exceptions.ParseError(t[2], t[1], t[0],
+                                        "Unexpected token: %s" % t[1])
+        if self.optimize:
+            parsed = ASTOptimizer().optimize(parsed)
+        return ParsedResult(expression, parsed, backend=self.backend)
 
     def _expression(self, binding_power=0):
-        left_token = self._lookahead_token(0)
-        self._advance()
-        nud_function = getattr(
-            self, '_token_nud_%s' % left_token['type'],
-            self._error_nud_token)
-        left = nud_function(left_token)
-        current_token = self._current_token()
-        while binding_power < self.BINDING_POWER[current_token]:
-            led = getattr(self, '_token_led_%s' % current_token, None)
+        tokens = self._tokens
+        left_token = tokens[self._index]
+        self._index += 1
+        nud_function = self._NUD_TABLE.get(left_token[0])
+        if nud_function is None:
+            self._error_nud_token(left_token)
+        left = nud_function(self, left_token)
+        led_table = self._LED_TABLE
+        powers = self.BINDING_POWER
+        current_token = tokens[self._index][0]
+        while binding_power < powers[current_token]:
+            led = led_table.get(current_token)
             if led is None:
-                error_token = self._lookahead_token(0)
-                self._error_led_token(error_token)
+                self._error_led_token(tokens[self._index])
             else:
-                self._advance()
-                left = led(left)
-                current_token = self._current_token()
+                self._index += 1
+                left = led(self, left)
+                current_token = tokens[self._index][0]
         return left
 
     def _token_nud_literal(self, token):
-        return ast.literal(token['value'])
+        return ast.literal(token[1])
 
     def _token_nud_unquoted_identifier(self, token):
-        return ast.field(token['value'])
+        return ast.field(token[1])
 
     def _token_nud_quoted_identifier(self, token):
-        field = ast.field(token['value'])
+        field = ast.field(token[1])
         # You can't have a quoted identifier as a function
         # name.
         if self._current_token() == 'lparen':
             t = self._lookahead_token(0)
             raise exceptions.ParseError(
-                0, t['value'], t['type'],
+                0, t[1], t[0],
                 'Quoted identifier not allowed for function names.')
         return field
 
@@ -207,7 +353,7 @@ class Parser(object):
             return self._parse_slice_expression()
         else:
             # Parse the syntax [number]
-            node = ast.index(self._lookahead_token(0)['value'])
+            node = ast.index(self._lookahead_token(0)[1])
             self._advance()
             self._match('rbracket')
             return node
@@ -227,7 +373,7 @@ class Parser(object):
                         self._lookahead_token(0), 'syntax error')
                 self._advance()
             elif current_token == 'number':
-                parts[index] = self._lookahead_token(0)['value']
+                parts[index] = self._lookahead_token(0)[1]
                 self._advance()
             else:
                 self._raise_parse_error_for_token(
@@ -246,9 +392,15 @@ class Parser(object):
     def _token_led_dot(self, left):
         if not self._current_token() == 'star':
             right = self._parse_dot_rhs(self.BINDING_POWER['dot'])
-            if left['type'] == 'subexpression':
-                left['children'].append(right)
+            if left.type == 'subexpression':
+                last = left.children[-1]
+                if self._can_join_fields(last, right):
+                    left.children[-1] = self._join_fields(last, right)
+                else:
+                    left.children.append(right)
                 return left
+            elif self._can_join_fields(left, right):
+                return self._join_fields(left, right)
             else:
                 return ast.subexpression([left, right])
         else:
@@ -258,6 +410,18 @@ class Parser(object):
                 self.BINDING_POWER['dot'])
             return ast.value_projection(left, right)
 
+    def _can_join_fields(self, left, right):
+        return (right.type == 'field' and
+                left.type in ('field', 'field_path'))
+
+    def _join_fields(self, left, right):
+        # Optimization: consecutive field lookups are combined
+        # into a single field_path node.
+        if left.type == 'field':
+            return ast.field_path([left.value, right.value])
+        left.value.append(right.value)
+        return left
+
     def _token_led_pipe(self, left):
         right = self._expression(self.BINDING_POWER['pipe'])
         return ast.pipe(left, right)
@@ -271,15 +435,15 @@ class Parser(object):
         return ast.and_expression(left, right)
 
     def _token_led_lparen(self, left):
-        if left['type'] != 'field':
+        if left.type != 'field':
             #  0 - first func arg or closing paren.
             # -1 - '(' token
             # -2 - invalid function "name".
             prev_t = self._lookahead_token(-2)
             raise exceptions.ParseError(
-                prev_t['start'], prev_t['value'], prev_t['type'],
-                "Invalid function name '%s'" % prev_t['value'])
-        name = left['value']
+                prev_t[2], prev_t[1], prev_t[0],
+                "Invalid function name '%s'" % prev_t[1])
+        name = left.value
         args = []
         while not self._current_token() == 'rparen':
             expression = self._expression()
@@ -326,13 +490,13 @@ class Parser(object):
 
     def _token_led_lbracket(self, left):
         token = self._lookahead_token(0)
-        if token['type'] in ['number', 'colon']:
+        if token[0] in ['number', 'colon']:
             right = self._parse_index_expression()
-            if left['type'] == 'index_expression':
+            if left.type == 'index_expression':
                 # Optimization: if the left node is an index expr,
                 # we can avoid creating another node and instead just add
                 # the right node as a child of the left.
-                left['children'].append(right)
+                left.children.append(right)
                 return left
             else:
                 return self._project_if_slice(left, right)
@@ -345,7 +509,7 @@ class Parser(object):
 
     def _project_if_slice(self, left, right):
         index_expr = ast.index_expression([left, right])
-        if right['type'] == 'slice':
+        if right.type == 'slice':
             return ast.projection(
                 index_expr,
                 self._parse_projection_rhs(self.BINDING_POWER['star']))
@@ -376,7 +540,7 @@ class Parser(object):
             # an identifier.
             self._match_multiple_tokens(
                 token_types=['quoted_identifier', 'unquoted_identifier'])
-            key_name = key_token['value']
+            key_name = key_token[1]
             self._match('colon')
             value = self._expression(0)
             node = ast.key_val_pair(key_name=key_name, node=value)
@@ -429,14 +593,14 @@ class Parser(object):
             allowed = ['quoted_identifier', 'unquoted_identifier',
                        'lbracket', 'lbrace']
             msg = (
-                "Expecting: %s, got: %s" % (allowed, t['type'])
+                "Expecting: %s, got: %s" % (allowed, t[0])
             )
             self._raise_parse_error_for_token(t, msg)
 
     def _error_nud_token(self, token):
-        if token['type'] == 'eof':
+        if token[0] == 'eof':
             raise exceptions.IncompleteExpressionError(
-                token['start'], token['value'], token['type'])
+                token[2], token[1], token[0])
         self._raise_parse_error_for_token(token, 'invalid token')
 
     def _error_led_token(self, token):
@@ -461,25 +625,21 @@ class Parser(object):
         self._index += 1
 
     def _current_token(self):
-        return self._tokens[self._index]['type']
+        return self._tokens[self._index][0]
 
     def _lookahead(self, number):
-        return self._tokens[self._index + number]['type']
+        return self._tokens[self._index + number][0]
 
     def _lookahead_token(self, number):
         return self._tokens[self._index + number]
 
     def _raise_parse_error_for_token(self, token, reason):
-        lex_position = token['start']
-        actual_value = token['value']
-        actual_type = token['type']
+        actual_type, actual_value, lex_position, _ = token
         raise exceptions.ParseError(lex_position, actual_value,
                                     actual_type, reason)
 
     def _raise_parse_error_maybe_eof(self, expected_type, token):
-        lex_position = token['start']
-        actual_value = token['value']
-        actual_type = token['type']
+        actual_type, actual_value, lex_position, _ = token
         if actual_type == 'eof':
             raise exceptions.IncompleteExpressionError(
                 lex_position, actual_value, actual_type)
@@ -488,26 +648,398 @@ class Parser(object):
         raise exceptions.ParseError(
             lex_position, actual_value, actual_type, message)
 
-    def _free_cache_entries(self):
-        for key in random.sample(self._CACHE.keys(), int(self._MAX_SIZE / 2)):
-            del self._CACHE[key]
-
     @classmethod
     def purge(cls):
         """Clear the expression compilation cache."""
         cls._CACHE.clear()
 
+    @classmethod
+    def set_cache(cls, compile_cache):
+        """Replace the expression compilation cache.
+
+        ``compile_cache`` is a ``jmespath.cache.BaseCache``, for
+        example ``LFUCache(max_bytes=50 * 1024 * 1024)``.
+
+        """
+        cls._CACHE = compile_cache
+
+    @classmethod
+    def get_cache(cls):
+        """Return the expression compilation cache.
+
+        The cache counters are available from ``get_cache().stats()``.
+
+        """
+        return cls._CACHE
+
+    def freeze(self, expressions, cache_file=None):
+        """Parse ``expressions`` and keep them for the process lifetime.
+
+        The frozen expressions are looked up before the compilation
+        cache.  They're never evicted, and looking them up doesn't
+        update any cache entry, so the memory pages holding them aren't
+        written to.  This is meant for a process that forks workers:
+        the frozen expressions are shared by all the workers.
+
+        Returns the same tuple as ``parse_many``.  Only the valid
+        expressions are frozen.
+
+        """
+        results, errors = self.parse_many(expressions, cache_file=cache_file)
+        frozen = dict(Parser._FROZEN)
+        for expression, result in results.items():
+            frozen[(self.backend, self.optimize, expression)] = result
+        Parser._FROZEN = frozen
+        return results, errors
+
+    @classmethod
+    def unfreeze(cls):
+        """Forget the expressions frozen with ``freeze``."""
+        Parser._FROZEN = {}
+
+
+class ASTOptimizer(visitor.Visitor):
+    """Simplify an AST before it's evaluated.
+
+    Subtrees whose result does not depend on the value being searched
+    are evaluated once, here, instead of on every search:
+
+    * Comparisons between two literals are folded into a literal.
+    * ``!`` applied to a literal is folded into a literal.
+    * ``||`` and ``&&`` with a literal on the left side are replaced
+      by the branch that would be taken.
+    * Filters with a literal, truthy condition become projections.
+    * Pipes with ``@`` on either side are replaced by the other side.
+    * Taking an element of a projection, ``a[?b] | [0].c[*].d``, is
+      split into ``(a[?b] | [0]) | c[*].d``.  The backends evaluate
+      ``<projection> | [n]`` by stopping at the n-th element.
+
+    Each ``visit_*`` method returns the optimized node.  Nodes are never
+    modified in place.
+
+    """
+    def __init__(self):
+        super(ASTOptimizer, self).__init__()
+        # Constant subtrees are folded by evaluating them, which
+        # guarantees the folded value is what a search would produce.
+        self._interpreter = visitor.TreeInterpreter()
+
+    def optimize(self, node):
+        return self.visit(node)
+
+    def default_visit(self, node):
+        children = node.children
+        optimized = [self.visit(child) if isinstance(child, ast.Node)
+                     else child for child in children]
+        if all(new is old for new, old in zip(optimized, children)):
+            return node
+        return ast.Node(node.type, optimized, node.value)
+
+    def _is_literal(self, node):
+        return node.type == 'literal'
+
+    def _fold(self, node):
+        # Evaluating a constant subtree can fail (for example ordering
+        # a string against a number raises a TypeError on python3).
+        # Those errors are left to happen at search time.
+        try:
+            return ast.literal(self._interpreter.visit(node, None))
+        except Exception:
+            return node
+
+    def visit_comparator(self, node):
+        node = self.default_visit(node)
+        left, right = node.children
+        if self._is_literal(left) and self._is_literal(right):
+            return self._fold(node)
+        return node
+
+    def visit_not_expression(self, node):
+        node = self.default_visit(node)
+        if self._is_literal(node.children[0]):
+            return self._fold(node)
+        return node
+
+    def visit_or_expression(self, node):
+        node = self.default_visit(node)
+        left, right = node.children
+        if self._is_literal(left):
+            if self._interpreter._is_false(left.value):
+                return right
+            return left
+        return node
+
+    def visit_and_expression(self, node):
+        node = self.default_visit(node)
+        left, right = node.children
+        if self._is_literal(left):
+            if self._interpreter._is_false(left.value):
+                return left
+            return right
+        return node
+
+    def visit_filter_projection(self, node):
+        node = self.default_visit(node)
+        left, right, condition = node.children
+        if self._is_literal(condition) and \
+                self._interpreter._is_true(condition.value):
+            return ast.projection(left, right)
+        return node
+
+    def visit_pipe(self, node):
+        node = self.default_visit(node)
+        left, right = node.children
+        if left.type in ('identity', 'current'):
+            return right
+        elif right.type in ('identity', 'current'):
+            return left
+        elif left.type in visitor._PROJECTIONS:
+            split = self._split_leading_index(right)
+            if split is not None and split[1].type != 'identity':
+                index, rest = split
+                return ast.pipe(
+                    ast.pipe(left, ast.index_expression(
+                        [ast.identity(), ast.index(index)])),
+                    rest)
+        return node
+
+    def _split_leading_index(self, node):
+        # If the first thing ``node`` does with its input is take the
+        # element ``[n]``, n >= 0, returns n and the node that is
+        # applied to that element, otherwise None.
+        children = node.children
+        if node.type == 'index_expression' and \
+                children[0].type in ('identity', 'current') and \
+                children[1].type == 'index' and children[1].value >= 0:
+            if len(children) == 2:
+                return children[1].value, ast.identity()
+            return children[1].value, ast.index_expression(
+                [children[0]] + list(children[2:]))
+        elif node.type not in compiler._FIRST_CHILD_SAME_INPUT:
+            # The input could be used by other children.
+            return None
+        split = self._split_leading_index(children[0])
+        if split is None:
+            return None
+        index, first = split
+        rest = list(children[1:])
+        if first.type == 'identity' and node.type in ('pipe',
+                                                      'subexpression'):
+            if len(rest) == 1:
+                return index, rest[0]
+            return index, ast.subexpression(rest)
+        return index, ast.Node(node.type, [first] + rest, node.value)
+
+
+# The search function of a search_many() worker process.
+_WORKER_SEARCH = None
+
+
+def _init_search_worker(parsed, options):
+    global _WORKER_SEARCH
+    _WORKER_SEARCH = parsed._search_function(options)
+
+
+def _search_in_worker(value):
+    return _WORKER_SEARCH(value)
+
+
+# Interpreters don't keep any state between searches, so they're shared
+# by all the searches that use the same options, across threads.
+_DEFAULT_INTERPRETER = visitor.TreeInterpreter()
+_INTERPRETERS = visitor._OptionsCache()
+
 
 @with_repr_method
 class ParsedResult(object):
-    def __init__(self, expression, parsed):
+    # Maps the name of an evaluation backend to the class that
+    # compiles the AST into a callable.  The interpreter backend
+    # walks the AST with the TreeInterpreter on every search.
+    BACKENDS = {
+        'interpreter': None,
+        'closure': compiler.ClosureCompiler,
+        'codegen': codegen.CodeGenerator,
+    }
+    DEFAULT_BACKEND = 'interpreter'
+
+    def __init__(self, expression, parsed, backend=DEFAULT_BACKEND):
         self.expression = expression
-        self.parsed = parsed
+        if isinstance(parsed, dict):
+            parsed = ast.from_dict(parsed)
+        #: The root ``ast.Node`` of the parsed expression.
+        self.ast = parsed
+        self.backend = backend
+        self._compiler_cls = self.BACKENDS[backend]
+        #: The expression compiled with the default options, or None
+        #  if the backend evaluates ``ast`` directly.
+        self.compiled = None
+        # The types inferred when the expression was compiled.
+        self._types = None
+        # Whether a function is called with the wrong number of
+        # arguments for the default function table.
+        self._default_arity_error = False
+        if self._compiler_cls is not None:
+            try:
+                self.compiled, self._types = self._compile_default()
+            except exceptions.ArityError:
+                # The function may have another arity in the function
+                # table of custom options, the error is only raised
+                # when the default table is used (see bind()).
+                self._default_arity_error = True
+                self.compiled = self._raise_default_arity_error
+        #: If the whole expression is a chain of field lookups
+        #  ("a.b.c"), this is a tuple of the field names, otherwise
+        #  None.  These expressions are resolved without an
+        #  interpreter or compiled backend.
+        self.field_path = None
+        if parsed.type == 'field':
+            self.field_path = (parsed.value,)
+        elif parsed.type == 'field_path':
+            self.field_path = tuple(parsed.value)
+        # The expression compiled for custom options, created on first
+        # use.
+        self._compiled_for_options = None
+
+    @property
+    def parsed(self):
+        """The AST in its dict form.
+
+        This is a compatibility view that is built on every access,
+        the AST itself is stored as compact ``ast.Node`` objects
+        (see ``ast``).
+
+        """
+        return self.ast.to_dict()
+
+    def explain(self):
+        """List the runtime checks left out of the compiled expression.
+
+        The ``closure`` and ``codegen`` backends infer the types of the
+        nodes of the AST and leave out the checks that can't fail, such
+        as checking that the result of ``sort_by()`` is a list before
+        projecting it.  Returns a list with a line per check, naming the
+        check and the expression it checks.  The ``interpreter`` backend
+        performs every check, so the list is empty.
+
+        """
+        if self._types is None:
+            return []
+        return self._types.explain()
 
     def search(self, value, options=None):
-        interpreter = visitor.TreeInterpreter(options)
-        result = interpreter.visit(self.parsed, value)
-        return result
+        if self.field_path is not None:
+            return visitor._resolve_field_path(self.field_path, value)
+        if self.compiled is None:
+            if options is None:
+                interpreter = _DEFAULT_INTERPRETER
+            else:
+                interpreter = _INTERPRETERS.get(
+                    options, visitor.TreeInterpreter)
+            return interpreter.visit(self.ast, value)
+        if options is None:
+            return self.compiled(value)
+        # The dict class and function table are bound at compile
+        # time, so custom options require their own compilation.
+        if self._compiled_for_options is None:
+            self._compiled_for_options = visitor._OptionsCache()
+        compiled = self._compiled_for_options.get(options, self._compile)
+        return compiled(value)
+
+    def bind(self, options=None):
+        """Bind the function calls of the expression to ``options``.
+
+        The ``closure`` and ``codegen`` backends bind every function
+        call to its implementation in the function table of the options
+        the expression is searched with.  This compiles the expression
+        for ``options`` ahead of the first search with them, and raises
+        an ``ArityError`` if a function of this table is called with
+        the wrong number of arguments.  The ``interpreter`` backend
+        checks the arguments when searching, so this does nothing.
+
+        """
+        if self._compiler_cls is None:
+            return
+        if options is None:
+            if self._default_arity_error:
+                self._compile_default()
+            return
+        if self._compiled_for_options is None:
+            self._compiled_for_options = visitor._OptionsCache()
+        self._compiled_for_options.get(options, self._compile)
+
+    def _compile(self, options):
+        return self._compiler_cls(options).compile(self.ast)
+
+    def _compile_default(self):
+        compiler = self._compiler_cls()
+        return compiler.compile(self.ast), compiler.types
+
+    def _raise_default_arity_error(self, value):
+        # Compiling again raises the error.
+        self._compile_default()
+
+    def specialize(self, schema):
+        """Compile the expression for the documents of a JSON Schema.
+
+        See ``SchemaParsedResult``.  Raises a ``SchemaError`` if the
+        schema is invalid or if the expression looks up a field or an
+        index that can't be in any document of the schema.
+
+        """
+        return SchemaParsedResult(self, schema)
+
+    def search_many(self, values, options=None, workers=None,
+                    chunksize=256):
+        """Search every value in ``values``.
+
+        Returns an iterator over the results, in the same order as
+        ``values``.  The interpreter or compiled expression is looked up
+        once, rather than once per value.
+
+        If ``workers`` is given, the values are searched by a pool of
+        this many processes.  The expression is sent once to every
+        worker, and the values are sent in chunks of ``chunksize``.
+        The values, the results and ``options`` must be picklable.
+
+        """
+        if workers is None:
+            return imap(self._search_function(options), values)
+        return self._search_in_pool(values, options, workers, chunksize)
+
+    def _search_function(self, options):
+        # Returns the function search() would call for these options.
+        if self.field_path is not None:
+            return functools.partial(visitor._resolve_field_path,
+                                     self.field_path)
+        if self.compiled is None:
+            if options is None:
+                interpreter = _DEFAULT_INTERPRETER
+            else:
+                interpreter = _INTERPRETERS.get(
+                    options, visitor.TreeInterpreter)
+            return functools.partial(interpreter.visit, self.ast)
+        if options is None:
+            return self.compiled
+        if self._compiled_for_options is None:
+            self._compiled_for_options = visitor._OptionsCache()
+        return self._compiled_for_options.get(options, self._compile)
+
+    def _search_in_pool(self, values, options, workers, chunksize):
+        import multiprocessing
+        pool = multiprocessing.Pool(workers, _init_search_worker,
+                                    (self, options))
+        try:
+            for result in pool.imap(_search_in_worker, values, chunksize):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def __reduce__(self):
+        # Compiled expressions can't be pickled, they're compiled again
+        # from the AST when unpickling.
+        return (ParsedResult, (self.expression, self.ast, self.backend))
 
     def _render_dot_file(self):
         """Render the parsed AST as a dot file.
@@ -520,8 +1052,91 @@ class ParsedResult(object):
 
         """
         renderer = visitor.GraphvizVisitor()
-        contents = renderer.visit(self.parsed)
+        contents = renderer.visit(self.ast)
         return contents
 
     def __repr__(self):
         return repr(self.parsed)
+
+
+class SchemaParsedResult(object):
+    """An expression compiled for the documents of a JSON Schema.
+
+    The expression is compiled with the types of the schema (see
+    ``inference.parse_schema``) by the ``codegen`` backend if it's the
+    backend of ``parsed``, otherwise by the ``closure`` backend: the
+    checks that can't fail for the documents of the schema are left out
+    and the required fields are looked up directly.  The values the
+    compiled expression relies on are checked as they are read, and a
+    document that doesn't match the schema is searched by ``parsed``,
+    the expression compiled for any document, instead.  Note that
+    custom functions may then be called twice for the same document.
+
+    """
+    def __init__(self, parsed, schema):
+        self.expression = parsed.expression
+        self.ast = parsed.ast
+        #: The ``ParsedResult`` searching documents that don't match
+        #  the schema.
+        self.parsed = parsed
+        self.schema = schema
+        self._schema = inference.parse_schema(schema)
+        self._compiler_cls = compiler.ClosureCompiler
+        if parsed.backend == 'codegen':
+            self._compiler_cls = codegen.CodeGenerator
+        self._default_arity_error = False
+        try:
+            self.compiled, self._types = self._compile_default()
+        except exceptions.ArityError:
+            # Same as ParsedResult.
+            self._default_arity_error = True
+            self.compiled = self._raise_default_arity_error
+            self._types = inference.NodeTypes()
+        self._compiled_for_options = None
+
+    def explain(self):
+        """List the runtime checks left out of the compiled expression.
+
+        Same as ``ParsedResult.explain``, including the fields looked up
+        directly (``presence check``).
+
+        """
+        return self._types.explain()
+
+    def search(self, value, options=None):
+        if options is None:
+            compiled = self.compiled
+        else:
+            if self._compiled_for_options is None:
+                self._compiled_for_options = visitor._OptionsCache()
+            compiled = self._compiled_for_options.get(options, self._compile)
+        try:
+            return compiled(value)
+        except compiler._SchemaViolation:
+            return self.parsed.search(value, options=options)
+
+    def bind(self, options=None):
+        """Same as ``ParsedResult.bind``."""
+        self.parsed.bind(options)
+        if options is None:
+            if self._default_arity_error:
+                self._compile_default()
+            return
+        if self._compiled_for_options is None:
+            self._compiled_for_options = visitor._OptionsCache()
+        self._compiled_for_options.get(options, self._compile)
+
+    def _compile(self, options):
+        return self._compiler_cls(options).compile_for_schema(
+            self.ast, self._schema)
+
+    def _compile_default(self):
+        specializer = self._compiler_cls()
+        compiled = specializer.compile_for_schema(self.ast, self._schema)
+        return compiled, specializer.types
+
+    def _raise_default_arity_error(self, value):
+        self._compile_default()
+
+    def __repr__(self):
+        return repr(self.parsed)
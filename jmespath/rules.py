@@ -0,0 +1,119 @@
+"""Match a document against many boolean expressions.
+
+A ``RuleSet`` finds which of its rules (expressions) are true for a
+document without evaluating every rule.  Most rules check that some
+fields have given values::
+
+    detail.state == 'stopped' && region == 'us-east-1'
+
+The rules are indexed by one of their ``<field path> == <literal>``
+conjuncts (the terms of a top level ``&&``).  Matching a document looks
+up the value of every indexed field path once, then fully evaluates
+only the rules indexed under that value, and the rules that have no
+such conjunct.
+
+When a rule has several of these conjuncts, it's indexed by the one
+shared by the fewest rules, which is likely the most selective one.
+
+The index only narrows down the rules that are evaluated, whether a
+rule matches is always decided by evaluating it, with the usual
+semantics.  Values that are equal in python are equal for the index
+(``1`` and ``true``, for example), the evaluation then tells them
+apart.  A rule that can't match isn't evaluated, so it doesn't raise
+errors it would raise if it were evaluated.
+
+"""
+from numbers import Number
+
+from jmespath import exceptions
+from jmespath import parser
+from jmespath.compat import string_type
+from jmespath.compiler import _is_false
+from jmespath.expressionset import _name_expressions
+from jmespath.visitor import _resolve_field_path
+
+
+class RuleSet(object):
+    """Find the rules that are true for a document.
+
+    :param rules: A dict mapping names to expressions, or an iterable
+        of expressions, which are then their own name.
+    :param backend: The backend used to evaluate the rules.
+    :param options: The ``Options`` the rules are evaluated with.
+
+    Invalid rules raise a ``CompileErrors``.
+
+    """
+    def __init__(self, rules, backend=None, options=None):
+        named = _name_expressions(rules)
+        results, errors = parser.Parser(backend=backend).parse_many(
+            expression for _, expression in named)
+        if errors:
+            raise exceptions.CompileErrors(errors, results)
+        self.names = [name for name, _ in named]
+        self._searches = [results[expression]._search_function(options)
+                          for _, expression in named]
+        conjuncts = [_indexable_conjuncts(results[expression].ast)
+                     for _, expression in named]
+        rule_counts = {}
+        for rule_conjuncts in conjuncts:
+            for conjunct in rule_conjuncts:
+                rule_counts[conjunct] = rule_counts.get(conjunct, 0) + 1
+        # field path -> {literal: [rule index]}
+        index = {}
+        # The rules evaluated for every document.
+        self._unindexed = []
+        for i, rule_conjuncts in enumerate(conjuncts):
+            if not rule_conjuncts:
+                self._unindexed.append(i)
+                continue
+            path, literal = min(rule_conjuncts, key=rule_counts.get)
+            index.setdefault(path, {}).setdefault(literal, []).append(i)
+        self._index = list(index.items())
+
+    def match(self, value):
+        """Return the names of the rules that are true for ``value``.
+
+        The names are in the same order as the rules.
+
+        """
+        candidates = list(self._unindexed)
+        for path, rules_by_literal in self._index:
+            current = _resolve_field_path(path, value)
+            try:
+                rules = rules_by_literal.get(current)
+            except TypeError:
+                # Lists and objects can't be equal to an indexed
+                # literal.
+                continue
+            if rules is not None:
+                candidates.extend(rules)
+        candidates.sort()
+        names = self.names
+        searches = self._searches
+        return [names[i] for i in candidates
+                if not _is_false(searches[i](value))]
+
+
+def _indexable_conjuncts(node):
+    # Returns the (field path, literal) of the "<field path> == <literal>"
+    # terms of a top level &&.
+    if node.type == 'and_expression':
+        return (_indexable_conjuncts(node.children[0]) +
+                _indexable_conjuncts(node.children[1]))
+    if node.type != 'comparator' or node.value != 'eq':
+        return []
+    first, second = node.children
+    if first.type == 'literal':
+        first, second = second, first
+    if second.type != 'literal' or not _is_indexable(second.value):
+        return []
+    if first.type == 'field':
+        return [((first.value,), second.value)]
+    elif first.type == 'field_path':
+        return [(tuple(first.value), second.value)]
+    return []
+
+
+def _is_indexable(literal):
+    return literal is None or isinstance(literal, (string_type, Number))
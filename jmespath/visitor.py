@@ -1,5 +1,8 @@
+import itertools
 import operator
+import weakref
 
+from jmespath import ast
 from jmespath import functions
 from jmespath.compat import string_type
 from numbers import Number
@@ -56,6 +59,148 @@ def _is_actual_number(x):
     return isinstance(x, Number)
 
 
+def _resolve_field_path(keys, value):
+    for key in keys:
+        try:
+            value = value.get(key)
+        except AttributeError:
+            return None
+    return value
+
+
+_MAY_RAISE = frozenset(['function_expression', 'expref'])
+# Node types that evaluate to a list, or None, whose elements can be
+# produced one at a time.
+_PROJECTIONS = frozenset([
+    'filter_projection', 'flatten', 'projection', 'value_projection',
+])
+# The builtin functions that can consume a _Projection, see
+# Functions.streamed_argument.
+_STREAMED_FUNCTIONS = frozenset([
+    'avg', 'contains', 'join', 'length', 'max', 'min', 'sum',
+])
+# The functions that may return before consuming every element.
+_SHORT_CIRCUIT_FUNCTIONS = frozenset(['contains'])
+
+
+def _cannot_raise(node):
+    # Whether evaluating ``node`` can never raise an error.  Changing
+    # the order in which nodes are evaluated, or not evaluating some of
+    # them, is only unobservable for nodes that can't.  Ordering
+    # comparators (str vs number) and functions can raise.
+    node_type = node.type
+    if node_type in _MAY_RAISE:
+        return False
+    elif node_type == 'comparator' and node.value not in ('eq', 'ne'):
+        return False
+    elif node_type == 'slice':
+        return node.children[2] != 0
+    return all(_cannot_raise(child) for child in node.children
+               if isinstance(child, ast.Node))
+
+
+def _flatten_elements(elements):
+    for element in elements:
+        if isinstance(element, list):
+            for item in element:
+                yield item
+        else:
+            yield element
+
+
+class _Projection(object):
+    """The elements of a projection, evaluated as they're consumed.
+
+    A consumer iterates over the projection once, either one element
+    at a time or in chunks, which is cheaper for consumers that use
+    every element.  The elements that have been consumed aren't kept.
+
+    """
+    __slots__ = ('_elements',)
+    CHUNK_SIZE = 1024
+
+    def __init__(self, elements):
+        self._elements = iter(elements)
+
+    def __iter__(self):
+        return self._elements
+
+    def chunks(self):
+        # Lists of the next CHUNK_SIZE elements.
+        elements = self._elements
+        size = self.CHUNK_SIZE
+        while True:
+            chunk = list(itertools.islice(elements, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def to_list(self):
+        # The elements that haven't been consumed.
+        return list(self._elements)
+
+
+def _streamed_position(functions, node, piped=False):
+    # The position of the argument of the function_expression ``node``
+    # that can be passed as a _Projection, or None.  The streamed
+    # argument is evaluated after the other arguments, which is only
+    # unobservable if they can't raise.  When a projection is piped
+    # into the function (``a[*].b | max(@)``), the streamed argument is
+    # ``@`` and the other arguments, which are evaluated against the
+    # list the projection evaluates to (which isn't built), must be
+    # literals.
+    if node.value not in _STREAMED_FUNCTIONS:
+        return None
+    children = node.children
+    position = functions.streamed_argument(node.value, len(children))
+    if position is None:
+        return None
+    if piped:
+        if children[position].type not in ('current', 'identity'):
+            return None
+        other_allowed = _is_literal
+    else:
+        if children[position].type not in _PROJECTIONS:
+            return None
+        other_allowed = _cannot_raise
+    for i, child in enumerate(children):
+        if i != position and not other_allowed(child):
+            return None
+    return position
+
+
+def _is_literal(node):
+    return node.type == 'literal'
+
+
+def _stream_index(node):
+    # If ``node`` starts with ``[n]``, ``n >= 0``, returns ``n`` and the
+    # nodes that are then applied one after the other (``[n].b[1]``),
+    # otherwise None.
+    rest = []
+    if node.type == 'subexpression':
+        rest = node.children[1:]
+        node = node.children[0]
+    if node.type != 'index_expression':
+        return None
+    current, index = node.children[:2]
+    if current.type not in ('identity', 'current') or \
+            index.type != 'index' or index.value < 0:
+        return None
+    return index.value, list(node.children[2:]) + list(rest)
+
+
+def _can_stop_early(projection):
+    # A consumer that doesn't consume every element of a projection
+    # skips the evaluation of the remaining elements, which must not be
+    # able to raise an error.
+    return all(_cannot_raise(child) for child in projection.children[1:])
+
+
+# Returned when an expression can't be evaluated lazily.
+_NOT_STREAMED = object()
+
+
 class Options(object):
     """Options to control how a JMESPath function is evaluated."""
     def __init__(self, dict_cls=None, custom_functions=None):
@@ -71,6 +216,31 @@ class Options(object):
         self.custom_functions = custom_functions
 
 
+class _OptionsCache(object):
+    # Caches an object built from an Options instance (an interpreter
+    # or a compiled expression), for as long as the Options instance
+    # is alive.  If the options are modified, the object is rebuilt.
+    def __init__(self):
+        self._entries = weakref.WeakKeyDictionary()
+
+    def get(self, options, factory):
+        try:
+            entry = self._entries.get(options)
+        except TypeError:
+            # Options that can't be weakly referenced aren't cached.
+            return factory(options)
+        dict_cls = options.dict_cls
+        custom_functions = options.custom_functions
+        if entry is None or entry[0] is not dict_cls or \
+                entry[1] is not custom_functions:
+            # The object is built from a copy of the options, it would
+            # otherwise keep its own key alive.
+            entry = (dict_cls, custom_functions,
+                     factory(Options(dict_cls, custom_functions)))
+            self._entries[options] = entry
+        return entry[2]
+
+
 class _Expression(object):
     def __init__(self, expression, interpreter):
         self.expression = expression
@@ -82,20 +252,32 @@ class _Expression(object):
 
 class Visitor(object):
     def __init__(self):
-        self._method_cache = {}
+        # Indexed by the node's integer type tag.
+        self._method_cache = [None] * len(ast.NODE_TYPES)
 
     def visit(self, node, *args, **kwargs):
-        node_type = node['type']
-        method = self._method_cache.get(node_type)
+        try:
+            tag = node.tag
+        except AttributeError:
+            # An AST in dict form, such as ParsedResult.parsed.
+            return self.visit(ast.from_dict(node), *args, **kwargs)
+        method = self._method_cache[tag]
         if method is None:
             method = getattr(
-                self, 'visit_%s' % node['type'], self.default_visit)
-            self._method_cache[node_type] = method
+                self, 'visit_%s' % node.type, self.default_visit)
+            self._method_cache[tag] = method
         return method(node, *args, **kwargs)
 
     def default_visit(self, node, *args, **kwargs):
         raise NotImplementedError("default_visit")
 
+    def _fill_method_cache(self):
+        # Look up the methods for every node type ahead of time, so
+        # visiting doesn't modify the visitor.
+        for tag, node_type in enumerate(ast.NODE_TYPES):
+            self._method_cache[tag] = getattr(
+                self, 'visit_%s' % node_type, self.default_visit)
+
 
 class TreeInterpreter(Visitor):
     COMPARATOR_FUNC = {
@@ -123,34 +305,37 @@ class TreeInterpreter(Visitor):
             self._functions = functions.Functions()
 
     def default_visit(self, node, *args, **kwargs):
-        raise NotImplementedError(node['type'])
+        raise NotImplementedError(node.type)
 
     def visit_subexpression(self, node, value):
         result = value
-        for node in node['children']:
+        for node in node.children:
             result = self.visit(node, result)
         return result
 
     def visit_field(self, node, value):
         try:
-            return value.get(node['value'])
+            return value.get(node.value)
         except AttributeError:
             return None
 
+    def visit_field_path(self, node, value):
+        return _resolve_field_path(node.value, value)
+
     def visit_comparator(self, node, value):
         # Common case: comparator is == or !=
-        comparator_func = self.COMPARATOR_FUNC[node['value']]
-        if node['value'] in self._EQUALITY_OPS:
+        comparator_func = self.COMPARATOR_FUNC[node.value]
+        if node.value in self._EQUALITY_OPS:
             return comparator_func(
-                self.visit(node['children'][0], value),
-                self.visit(node['children'][1], value)
+                self.visit(node.children[0], value),
+                self.visit(node.children[1], value)
             )
         else:
             # Ordering operators are only valid for numbers.
             # Evaluating any other type with a comparison operator
             # will yield a None value.
-            left = self.visit(node['children'][0], value)
-            right = self.visit(node['children'][1], value)
+            left = self.visit(node.children[0], value)
+            right = self.visit(node.children[1], value)
             num_types = (int, float)
             if not (_is_comparable(left) and
                     _is_comparable(right)):
@@ -161,30 +346,34 @@ class TreeInterpreter(Visitor):
         return value
 
     def visit_expref(self, node, value):
-        return _Expression(node['children'][0], self)
+        return _Expression(node.children[0], self)
 
     def visit_function_expression(self, node, value):
+        if node.value in _STREAMED_FUNCTIONS:
+            result = self._stream_function(node, value)
+            if result is not _NOT_STREAMED:
+                return result
         resolved_args = []
-        for child in node['children']:
+        for child in node.children:
             current = self.visit(child, value)
             resolved_args.append(current)
-        return self._functions.call_function(node['value'], resolved_args)
+        return self._functions.call_function(node.value, resolved_args)
 
     def visit_filter_projection(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
         if not isinstance(base, list):
             return None
-        comparator_node = node['children'][2]
+        comparator_node = node.children[2]
         collected = []
         for element in base:
             if self._is_true(self.visit(comparator_node, element)):
-                current = self.visit(node['children'][1], element)
+                current = self.visit(node.children[1], element)
                 if current is not None:
                     collected.append(current)
         return collected
 
     def visit_flatten(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
         if not isinstance(base, list):
             # Can't flatten the object if it's not a list.
             return None
@@ -205,58 +394,58 @@ class TreeInterpreter(Visitor):
         if not isinstance(value, list):
             return None
         try:
-            return value[node['value']]
+            return value[node.value]
         except IndexError:
             return None
 
     def visit_index_expression(self, node, value):
         result = value
-        for node in node['children']:
+        for node in node.children:
             result = self.visit(node, result)
         return result
 
     def visit_slice(self, node, value):
         if not isinstance(value, list):
             return None
-        s = slice(*node['children'])
+        s = slice(*node.children)
         return value[s]
 
     def visit_key_val_pair(self, node, value):
-        return self.visit(node['children'][0], value)
+        return self.visit(node.children[0], value)
 
     def visit_literal(self, node, value):
-        return node['value']
+        return node.value
 
     def visit_multi_select_dict(self, node, value):
         if value is None:
             return None
         collected = self._dict_cls()
-        for child in node['children']:
-            collected[child['value']] = self.visit(child, value)
+        for child in node.children:
+            collected[child.value] = self.visit(child, value)
         return collected
 
     def visit_multi_select_list(self, node, value):
         if value is None:
             return None
         collected = []
-        for child in node['children']:
+        for child in node.children:
             collected.append(self.visit(child, value))
         return collected
 
     def visit_or_expression(self, node, value):
-        matched = self.visit(node['children'][0], value)
+        matched = self.visit(node.children[0], value)
         if self._is_false(matched):
-            matched = self.visit(node['children'][1], value)
+            matched = self.visit(node.children[1], value)
         return matched
 
     def visit_and_expression(self, node, value):
-        matched = self.visit(node['children'][0], value)
+        matched = self.visit(node.children[0], value)
         if self._is_false(matched):
             return matched
-        return self.visit(node['children'][1], value)
+        return self.visit(node.children[1], value)
 
     def visit_not_expression(self, node, value):
-        original_result = self.visit(node['children'][0], value)
+        original_result = self.visit(node.children[0], value)
         if original_result is 0:
             # Special case for 0, !0 should be false, not true.
             # 0 is not a special cased integer in jmespath.
@@ -264,31 +453,130 @@ class TreeInterpreter(Visitor):
         return not original_result
 
     def visit_pipe(self, node, value):
+        left, right = node.children
+        if left.type in _PROJECTIONS:
+            result = self._stream_pipe(left, right, value)
+            if result is not _NOT_STREAMED:
+                return result
         result = value
-        for node in node['children']:
+        for node in node.children:
             result = self.visit(node, result)
         return result
 
+    # Lazy projections.  Consumers that only need the elements of a
+    # projection one at a time (an index after a pipe, and some
+    # functions) are given the elements as they're evaluated, as a
+    # _Projection, instead of a list.
+
+    def _stream_function(self, node, value, piped=None):
+        # ``piped`` is the projection piped into the function, whose
+        # argument is then ``@``.
+        position = _streamed_position(self._functions, node,
+                                      piped is not None)
+        if position is None:
+            return _NOT_STREAMED
+        children = node.children
+        projection = children[position] if piped is None else piped
+        if node.value in _SHORT_CIRCUIT_FUNCTIONS and \
+                not _can_stop_early(projection):
+            return _NOT_STREAMED
+        resolved_args = []
+        for i, child in enumerate(children):
+            if i != position:
+                resolved_args.append(self.visit(child, value))
+                continue
+            elements = self._projected_elements(projection, value)
+            if elements is None:
+                resolved_args.append(None)
+            else:
+                resolved_args.append(_Projection(elements))
+        if resolved_args[position] is None:
+            return self._functions.call_function(node.value, resolved_args)
+        return self._functions.call_streamed(node.value, resolved_args)
+
+    def _stream_pipe(self, left, right, value):
+        indexed = _stream_index(right)
+        if indexed is not None:
+            if not _can_stop_early(left):
+                return _NOT_STREAMED
+            index, rest = indexed
+            elements = self._projected_elements(left, value)
+            result = None
+            if elements is not None:
+                result = next(itertools.islice(elements, index, None), None)
+            for node in rest:
+                result = self.visit(node, result)
+            return result
+        if right.type == 'function_expression' and \
+                right.value in _STREAMED_FUNCTIONS:
+            return self._stream_function(right, value, left)
+        return _NOT_STREAMED
+
+    def _projected_elements(self, node, value):
+        # An iterator over the elements of the list the projection (or
+        # flatten) ``node`` evaluates to, or None if it evaluates to
+        # null.
+        node_type = node.type
+        base_node = node.children[0]
+        if node_type == 'value_projection':
+            try:
+                base = self.visit(base_node, value).values()
+            except AttributeError:
+                return None
+        elif base_node.type in _PROJECTIONS and _can_stop_early(base_node):
+            # Nothing is observable when the elements of a nested
+            # projection that can't raise are evaluated one at a time
+            # too.
+            base = self._projected_elements(base_node, value)
+            if base is None:
+                return None
+        else:
+            base = self.visit(base_node, value)
+            if not isinstance(base, list):
+                return None
+        if node_type == 'flatten':
+            return _flatten_elements(base)
+        elif node_type == 'filter_projection':
+            return self._filtered_elements(base, node.children[2],
+                                           node.children[1])
+        return self._projected_values(base, node.children[1])
+
+    def _projected_values(self, base, right):
+        visit = self.visit
+        for element in base:
+            current = visit(right, element)
+            if current is not None:
+                yield current
+
+    def _filtered_elements(self, base, comparator_node, right):
+        visit = self.visit
+        is_true = self._is_true
+        for element in base:
+            if is_true(visit(comparator_node, element)):
+                current = visit(right, element)
+                if current is not None:
+                    yield current
+
     def visit_projection(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
         if not isinstance(base, list):
             return None
         collected = []
         for element in base:
-            current = self.visit(node['children'][1], element)
+            current = self.visit(node.children[1], element)
             if current is not None:
                 collected.append(current)
         return collected
 
     def visit_value_projection(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
         try:
             base = base.values()
         except AttributeError:
             return None
         collected = []
         for element in base:
-            current = self.visit(node['children'][1], element)
+            current = self.visit(node.children[1], element)
             if current is not None:
                 collected.append(current)
         return collected
@@ -312,17 +600,20 @@ class GraphvizVisitor(Visitor):
 
     def visit(self, node, *args, **kwargs):
         self._lines.append('digraph AST {')
-        current = '%s%s' % (node['type'], self._count)
+        current = '%s%s' % (node.type, self._count)
         self._count += 1
         self._visit(node, current)
         self._lines.append('}')
         return '\n'.join(self._lines)
 
     def _visit(self, node, current):
+        value = node.get('value', '')
+        if node.type == 'field_path':
+            value = '.'.join(value)
         self._lines.append('%s [label="%s(%s)"]' % (
-            current, node['type'], node.get('value', '')))
+            current, node.type, value))
         for child in node.get('children', []):
-            child_name = '%s%s' % (child['type'], self._count)
+            child_name = '%s%s' % (child.type, self._count)
             self._count += 1
             self._lines.append('  %s -> %s' % (current, child_name))
             self._visit(child, child_name)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Compare an ExpressionSet with searching its expressions one by one.
+
+The expressions are generated to look like the routing rules of an
+event pipeline: they share prefixes like ``detail.requestParameters``
+or ``Records[*].s3``.
+
+"""
+import argparse
+import sys
+import timeit
+
+import jmespath
+
+
+def generate_expressions(count):
+    templates = [
+        'detail.requestParameters.field%s',
+        'detail.responseElements.items[0].field%s',
+        'Records[*].s3.object.field%s',
+        'Records[*].s3.bucket.field%s | [0]',
+        "Records[?eventName == 'ObjectCreated:Put'].field%s",
+        'detail.userIdentity.sessionContext.attributes.field%s',
+    ]
+    return [templates[i % len(templates)] % i for i in range(count)]
+
+
+def generate_document(count):
+    fields = dict(('field%s' % i, i) for i in range(count))
+    record = {'eventName': 'ObjectCreated:Put',
+              's3': {'object': fields, 'bucket': fields}}
+    record.update(fields)
+    return {
+        'detail': {
+            'requestParameters': fields,
+            'responseElements': {'items': [fields]},
+            'userIdentity': {'sessionContext': {'attributes': fields}},
+        },
+        'Records': [record] * 3,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--num-expressions', type=int,
+                            default=300)
+    arg_parser.add_argument('-b', '--backend', default=None)
+    arg_parser.add_argument('--number', type=int, default=200)
+    args = arg_parser.parse_args()
+    expressions = generate_expressions(args.num_expressions)
+    document = generate_document(args.num_expressions)
+    compiled = [(e, jmespath.compile(e, backend=args.backend))
+                for e in expressions]
+    expression_set = jmespath.ExpressionSet(expressions,
+                                            backend=args.backend)
+
+    def one_by_one():
+        return dict((e, c.search(document)) for e, c in compiled)
+
+    if one_by_one() != expression_set.search(document):
+        raise RuntimeError("ExpressionSet results don't match")
+    for name, function in [('one by one', one_by_one),
+                           ('expression set', lambda: expression_set.search(
+                               document))]:
+        duration = timeit.timeit(function, number=args.number)
+        sys.stdout.write("%s: %10.2fus per document\n" % (
+            name, duration / args.number * 1000000))
+
+
+if __name__ == '__main__':
+    main()
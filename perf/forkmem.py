@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""Measure the memory used by forked workers that search expressions.
+
+This simulates a pre-fork server (e.g. gunicorn with --preload): a
+parent process compiles the expressions, then forks workers that
+search every expression a few times.  The memory reported for each
+worker is the growth of its private memory (the pages it doesn't share
+with the parent anymore), read from /proc/self/smaps_rollup, so this
+only runs on Linux.
+
+The modes are:
+
+* cold - The parent doesn't compile anything, every worker compiles
+  the expressions into its own cache.
+* cached - The parent compiles the expressions into the compilation
+  cache.
+* frozen - The parent compiles the expressions with jmespath.freeze().
+
+"""
+import argparse
+import gc
+import os
+import sys
+import traceback
+
+import jmespath
+from jmespath import cache
+from jmespath import parser
+
+
+def generate_expressions(count):
+    templates = [
+        'foo%s.bar[0].baz',
+        'foo%s[?bar > `1`].baz | [0]',
+        'length(foo%s[*].bar || `[]`)',
+        '{a: foo%s.a, b: foo%s.b[-1]}',
+        'not_null(foo%s.*.bar, `[]`) | sort(@)',
+    ]
+    expressions = []
+    for i in range(count):
+        template = templates[i % len(templates)]
+        expressions.append(template.replace('%s', str(i)))
+    return expressions
+
+
+def private_memory():
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1])
+    return total * 1024
+
+
+def run_worker(expressions, iterations, collect, write_end):
+    data = {'foo1': {'bar': [{'baz': 1}]}}
+    before = private_memory()
+    for _ in range(iterations):
+        for expression in expressions:
+            jmespath.search(expression, data)
+        if collect:
+            # A long running worker eventually runs full collections.
+            gc.collect()
+    growth = private_memory() - before
+    os.write(write_end, ('%s\n' % growth).encode('ascii'))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-m', '--mode', default='frozen',
+                            choices=['cold', 'cached', 'frozen'])
+    arg_parser.add_argument('-n', '--num-expressions', type=int,
+                            default=2000)
+    arg_parser.add_argument('-w', '--workers', type=int, default=4)
+    arg_parser.add_argument('-i', '--iterations', type=int, default=3)
+    arg_parser.add_argument('-c', '--collect', action='store_true',
+                            help='Run a full garbage collection in the '
+                                 'workers after every iteration.')
+    args = arg_parser.parse_args()
+    expressions = generate_expressions(args.num_expressions)
+    parser.Parser.set_cache(cache.LRUCache(max_entries=len(expressions)))
+    if args.mode == 'cached':
+        jmespath.compile_many(expressions)
+        gc.collect()
+    elif args.mode == 'frozen':
+        jmespath.freeze(expressions)
+    read_end, write_end = os.pipe()
+    pids = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(expressions, args.iterations, args.collect,
+                           write_end)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        growths = [int(line) for line in f]
+    sys.stdout.write(
+        "mode: %s, expressions: %s, private memory growth per worker: "
+        "%.1fKB\n" % (args.mode, len(expressions),
+                      sum(growths) / float(len(growths)) / 1024))
+
+
+if __name__ == '__main__':
+    main()
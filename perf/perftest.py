@@ -18,6 +18,7 @@ _clock = timeit.default_timer
 
 from jmespath.parser import Parser
 from jmespath.lexer import Lexer
+from jmespath.visitor import Options
 
 
 BENCHMARK_FILE = os.path.join(
@@ -28,7 +29,7 @@ BENCHMARK_FILE = os.path.join(
 APPROX_RUN_TIME = 0.5
 
 
-def run_tests(tests):
+def run_tests(tests, backend=None, options=None):
     times = []
     for test in tests:
         given = test['given']
@@ -38,8 +39,9 @@ def run_tests(tests):
         lex_time = _lex_time(expression)
         parse_time = _parse_time(expression)
         if should_search:
-            search_time = _search_time(expression, given)
-            combined_time = _combined_time(expression, given, result)
+            search_time = _search_time(expression, given, backend, options)
+            combined_time = _combined_time(expression, given, result,
+                                           backend, options)
         else:
             search_time = 0
             combined_time = 0
@@ -52,6 +54,19 @@ def run_tests(tests):
         sys.stdout.write("name: %s\n" % test['name'])
 
 
+def run_parse_tests(tests):
+    # Only the lexer and the parser are timed.  The AST isn't
+    # optimized, compiled or searched.
+    for test in tests:
+        expression = test['expression']
+        lex_time = _lex_time(expression)
+        parse_time = _parse_time(expression, optimize=False)
+        sys.stdout.write(
+            "lex_time: %10.5fus, parse_time: %10.5fus " % (
+                1000000 * lex_time, 1000000 * parse_time))
+        sys.stdout.write("name: %s\n" % test['name'])
+
+
 def _lex_time(expression, clock=_clock):
     lex = Lexer()
     duration = 0
@@ -59,7 +74,7 @@ def _lex_time(expression, clock=_clock):
     while True:
         i += 1
         start = clock()
-        list(lex.tokenize(expression))
+        lex.scan(expression)
         end = clock()
         total = end - start
         duration += total
@@ -68,15 +83,16 @@ def _lex_time(expression, clock=_clock):
     return duration / i
 
 
-def _search_time(expression, given, clock=_clock):
-    p = Parser()
+def _search_time(expression, given, backend=None, options=None,
+                 clock=_clock):
+    p = Parser(backend=backend)
     parsed = p.parse(expression)
     duration =  0
     i = 0
     while True:
         i += 1
         start = clock()
-        parsed.search(given)
+        parsed.search(given, options=options)
         end = clock()
         total = end - start
         duration += total
@@ -85,9 +101,9 @@ def _search_time(expression, given, clock=_clock):
     return duration / i
 
 
-def _parse_time(expression, clock=_clock):
+def _parse_time(expression, optimize=True, clock=_clock):
     best = float('inf')
-    p = Parser()
+    p = Parser(optimize=optimize)
     duration = 0
     i = 0
     while True:
@@ -103,16 +119,17 @@ def _parse_time(expression, clock=_clock):
     return duration / i
 
 
-def _combined_time(expression, given, result, clock=_clock):
+def _combined_time(expression, given, result, backend=None, options=None,
+                   clock=_clock):
     best = float('inf')
-    p = Parser()
+    p = Parser(backend=backend)
     duration = 0
     i = 0
     while True:
         i += 1
         p.purge()
         start = clock()
-        r = p.parse(expression).search(given)
+        r = p.parse(expression).search(given, options=options)
         end = clock()
         total = end - start
         if r != result:
@@ -152,10 +169,21 @@ def _add_cases(data, loaded, filename):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-f', '--filename', default=BENCHMARK_FILE)
+    parser.add_argument('-b', '--backend', default=None,
+                        help='The backend used to evaluate expressions.')
+    parser.add_argument('-p', '--parse-only', action='store_true',
+                        help='Only time the lexer and the parser.')
+    parser.add_argument('-o', '--with-options', action='store_true',
+                        help='Search with an explicit Options instance, '
+                             'shared by all the searches.')
     args = parser.parse_args()
     collected_tests = []
     collected_tests.extend(load_tests(args.filename))
-    run_tests(collected_tests)
+    if args.parse_only:
+        run_parse_tests(collected_tests)
+    else:
+        options = Options() if args.with_options else None
+        run_tests(collected_tests, args.backend, options)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Measure how matching a RuleSet scales with the number of rules.
+
+For every rule count, this reports the time to match one event with a
+RuleSet, and with evaluating every rule, one after the other.  Most of
+the generated rules are indexed (they check field values), some of them
+can only be evaluated (they compare numbers).
+
+"""
+import argparse
+import random
+import sys
+import timeit
+
+import jmespath
+
+
+STATES = ['pending', 'running', 'stopping', 'stopped', 'terminated']
+REGIONS = ['us-east-1', 'us-west-2', 'eu-west-1', 'ap-south-1']
+
+
+def generate_rules(count, unindexed_ratio, rng):
+    rules = []
+    for i in range(count):
+        if rng.random() < unindexed_ratio:
+            rules.append('detail.count > `%s`' % rng.randint(0, 1000))
+        else:
+            rules.append(
+                "detail.state == '%s' && region == '%s' && "
+                "account == '%s'" % (rng.choice(STATES), rng.choice(REGIONS),
+                                     rng.randint(0, count // 10)))
+    return rules
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-c', '--counts', default='100,1000,10000,100000',
+                            help='Comma separated rule counts.')
+    arg_parser.add_argument('-u', '--unindexed-ratio', type=float,
+                            default=0.01)
+    arg_parser.add_argument('-b', '--backend', default=None)
+    args = arg_parser.parse_args()
+    rng = random.Random(0)
+    event = {'detail': {'state': 'stopped', 'count': 500},
+             'region': 'us-east-1', 'account': '7'}
+    for count in [int(c) for c in args.counts.split(',')]:
+        rules = generate_rules(count, args.unindexed_ratio, rng)
+        rule_set = jmespath.RuleSet(rules, backend=args.backend)
+        compiled = [jmespath.compile(rule, backend=args.backend)
+                    for rule in rules]
+
+        def evaluate_all():
+            return [rule.expression for rule in compiled
+                    if rule.search(event)]
+
+        if sorted(evaluate_all()) != sorted(rule_set.match(event)):
+            raise RuntimeError("RuleSet matches don't match")
+        number = max(1, 100000 // count)
+        indexed = timeit.timeit(lambda: rule_set.match(event),
+                                number=number) / number
+        number = max(1, 10000 // count)
+        linear = timeit.timeit(evaluate_all, number=number) / number
+        sys.stdout.write(
+            "rules: %7s, rule set: %10.2fus, every rule: %12.2fus\n" % (
+                count, indexed * 1000000, linear * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Measure the search throughput of many threads sharing the cache.
+
+Every thread searches the same cached expressions for a fixed
+duration, and the total number of searches per second is reported
+for each number of threads.  With the GIL the searches can't run in
+parallel, but adding threads shouldn't make the total throughput much
+worse, which is what lock contention would do.
+
+"""
+import argparse
+import sys
+import threading
+import time
+
+import jmespath
+from jmespath import cache
+from jmespath import parser
+
+
+def generate_expressions(count):
+    expressions = []
+    for i in range(count):
+        if i % 2:
+            expressions.append('foo%s.bar[?@ > `%s`] | length(@)' % (i, i))
+        else:
+            expressions.append('foo%s.bar[%s]' % (i, i % 3))
+    return expressions
+
+
+def throughput(expressions, data, num_threads, duration):
+    counts = []
+
+    def search():
+        count = 0
+        end = time.time() + duration
+        while time.time() < end:
+            for expression in expressions:
+                jmespath.search(expression, data)
+            count += len(expressions)
+        counts.append(count)
+
+    threads = [threading.Thread(target=search) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--num-expressions', type=int,
+                            default=20)
+    arg_parser.add_argument('-t', '--threads', type=int, nargs='+',
+                            default=[1, 2, 4, 16])
+    arg_parser.add_argument('-d', '--duration', type=float, default=1.0,
+                            help='Seconds each thread searches for.')
+    args = arg_parser.parse_args()
+    expressions = generate_expressions(args.num_expressions)
+    data = dict(('foo%s' % i, {'bar': [i, i + 1, i + 2]})
+                for i in range(args.num_expressions))
+    parser.Parser.set_cache(cache.LRUCache(max_entries=len(expressions)))
+    for num_threads in args.threads:
+        sys.stdout.write("threads: %s, searches per second: %.0f\n" % (
+            num_threads,
+            throughput(expressions, data, num_threads, args.duration)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import gc
+import sys
+
+from tests import unittest
+
+import jmespath
+
+from jmespath import ast
+from jmespath import cache
+from jmespath import exceptions
+from jmespath import parser
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = cache.LRUCache(max_entries=2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.put('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(len(lru), 2)
+
+    def test_replacing_a_value(self):
+        lru = cache.LRUCache(max_entries=2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.put('a', 3)
+        lru.put('c', 4)
+        self.assertEqual(lru.get('a'), 3)
+        self.assertIsNone(lru.get('b'))
+
+    def test_stats(self):
+        lru = cache.LRUCache(max_entries=1)
+        lru.put('a', 1)
+        lru.get('a')
+        lru.get('b')
+        lru.put('b', 2)
+        self.assertEqual(lru.stats(), {'hits': 1, 'misses': 1,
+                                       'evictions': 1, 'entries': 1,
+                                       'bytes': None})
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+        self.assertEqual(lru.stats()['hits'], 1)
+        lru.reset_stats()
+        self.assertEqual(lru.stats()['hits'], 0)
+
+    def test_byte_budget(self):
+        lru = cache.LRUCache(max_bytes=10, sizeof=len)
+        lru.put('a', 'xxxx')
+        lru.put('b', 'xxxx')
+        self.assertEqual(lru.stats()['bytes'], 8)
+        lru.put('c', 'xxxx')
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.stats()['bytes'], 8)
+        # A value larger than the budget isn't cached at all.
+        lru.put('d', 'x' * 11)
+        self.assertEqual(len(lru), 0)
+        self.assertEqual(lru.stats()['bytes'], 0)
+
+
+class TestLFUCache(unittest.TestCase):
+    def test_evicts_least_frequently_used(self):
+        lfu = cache.LFUCache(max_entries=2)
+        lfu.put('a', 1)
+        lfu.put('b', 2)
+        lfu.get('a')
+        lfu.get('a')
+        lfu.get('b')
+        lfu.put('c', 3)
+        self.assertIsNone(lfu.get('b'))
+        self.assertEqual(lfu.get('a'), 1)
+        self.assertEqual(lfu.get('c'), 3)
+
+    def test_ties_evict_least_recently_used(self):
+        lfu = cache.LFUCache(max_entries=2)
+        lfu.put('a', 1)
+        lfu.put('b', 2)
+        lfu.put('c', 3)
+        self.assertIsNone(lfu.get('a'))
+        self.assertEqual(lfu.get('b'), 2)
+
+    def test_many_hits_keep_heap_bounded(self):
+        lfu = cache.LFUCache(max_entries=10)
+        for i in range(10):
+            lfu.put(i, i)
+        for _ in range(1000):
+            lfu.get(3)
+        self.assertLess(len(lfu._heap), 100)
+        for i in range(10, 20):
+            lfu.put(i, i)
+        self.assertEqual(lfu.get(3), 3)
+        self.assertEqual(lfu.stats()['evictions'], 10)
+
+    def test_byte_budget(self):
+        lfu = cache.LFUCache(max_bytes=10, sizeof=len)
+        lfu.put('a', 'xxxx')
+        lfu.get('a')
+        lfu.put('b', 'xxxx')
+        lfu.put('c', 'xxxx')
+        self.assertEqual(lfu.get('a'), 'xxxx')
+        self.assertIsNone(lfu.get('b'))
+
+
+class TestApproximateSize(unittest.TestCase):
+    def test_size_grows_with_the_ast(self):
+        small = parser.Parser().parse('a')
+        large = parser.Parser().parse('a.b[?c == `1`].{d: e, f: g[0]}')
+        self.assertLess(cache.approximate_size(small),
+                        cache.approximate_size(large))
+
+    def test_shared_objects_are_counted_once(self):
+        node = ast.field('foo')
+        self.assertEqual(
+            cache.approximate_size([node, node]) -
+            cache.approximate_size([node]),
+            sys.getsizeof([node, node]) - sys.getsizeof([node]))
+
+
+class TestParserCache(unittest.TestCase):
+    def setUp(self):
+        self.original = parser.Parser.get_cache()
+
+    def tearDown(self):
+        parser.Parser.set_cache(self.original)
+
+    def test_parser_uses_configured_cache(self):
+        lfu = cache.LFUCache(max_entries=2)
+        parser.Parser.set_cache(lfu)
+        p = parser.Parser()
+        first = p.parse('foo')
+        self.assertIs(p.parse('foo'), first)
+        p.parse('bar')
+        p.parse('baz')
+        self.assertEqual(len(lfu), 2)
+        self.assertEqual(lfu.stats()['hits'], 1)
+        self.assertEqual(lfu.stats()['misses'], 3)
+        self.assertEqual(lfu.stats()['evictions'], 1)
+        parser.Parser.purge()
+        self.assertEqual(len(lfu), 0)
+
+    def test_working_set_larger_than_default_size(self):
+        lru = cache.LRUCache(max_entries=1000)
+        parser.Parser.set_cache(lru)
+        p = parser.Parser()
+        for _ in range(2):
+            for i in range(500):
+                p.parse('foo%s' % i)
+        self.assertEqual(lru.stats()['hits'], 500)
+        self.assertEqual(lru.stats()['evictions'], 0)
+
+
+class TestFrozenExpressions(unittest.TestCase):
+    def setUp(self):
+        self.original = parser.Parser.get_cache()
+        self.lru = cache.LRUCache(max_entries=1)
+        parser.Parser.set_cache(self.lru)
+
+    def tearDown(self):
+        parser.Parser.unfreeze()
+        parser.Parser.set_cache(self.original)
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+    def test_frozen_expressions_bypass_the_cache(self):
+        p = parser.Parser()
+        results, errors = p.freeze(['foo.bar', 'foo[0]'])
+        self.assertEqual(errors, {})
+        self.assertIs(p.parse('foo[0]'), results['foo[0]'])
+        self.assertIs(p.parse('foo.bar'), results['foo.bar'])
+        self.assertEqual(self.lru.stats()['hits'], 0)
+        self.assertEqual(self.lru.stats()['misses'], 2)
+        parser.Parser.purge()
+        self.assertIs(p.parse('foo[0]'), results['foo[0]'])
+
+    def test_frozen_per_backend(self):
+        results, _ = parser.Parser(backend='closure').freeze(['a[0]'])
+        self.assertIs(parser.Parser(backend='closure').parse('a[0]'),
+                      results['a[0]'])
+        self.assertIsNot(parser.Parser().parse('a[0]'), results['a[0]'])
+
+    def test_freeze_adds_to_frozen_expressions(self):
+        first, _ = parser.Parser().freeze(['a[0]'])
+        parser.Parser().freeze(['b[0]'])
+        self.assertIs(parser.Parser().parse('a[0]'), first['a[0]'])
+        parser.Parser.unfreeze()
+        self.assertIsNot(parser.Parser().parse('a[0]'), first['a[0]'])
+
+    def test_jmespath_freeze(self):
+        results = jmespath.freeze(['foo[0]'])
+        self.assertEqual(jmespath.search('foo[0]', {'foo': [1]}), 1)
+        self.assertIs(jmespath.compile('foo[0]'), results['foo[0]'])
+        if hasattr(gc, 'get_freeze_count'):
+            self.assertGreater(gc.get_freeze_count(), 0)
+
+    def test_jmespath_freeze_errors(self):
+        with self.assertRaises(exceptions.CompileErrors) as e:
+            jmespath.freeze(['foo[0]', 'foo['])
+        self.assertEqual(list(e.exception.errors), ['foo['])
+        self.assertIs(jmespath.compile('foo[0]'),
+                      e.exception.results['foo[0]'])
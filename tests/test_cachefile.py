@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from tests import unittest
+
+import jmespath
+from jmespath import cachefile
+from jmespath import exceptions
+from jmespath import parser
+
+
+class CountingParser(parser.Parser):
+    parsed = []
+
+    def _parse(self, expression):
+        CountingParser.parsed.append(expression)
+        return super(CountingParser, self)._parse(expression)
+
+
+class TestCacheFile(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'expressions.cache')
+        self.original = parser.Parser.get_cache()
+        parser.Parser.purge()
+        CountingParser.parsed = []
+
+    def tearDown(self):
+        parser.Parser.set_cache(self.original)
+        shutil.rmtree(self.tempdir)
+
+    def save(self, expressions):
+        cachefile.save(self.filename, dict(
+            (e, parser.Parser().parse(e).ast) for e in expressions))
+
+    def test_round_trip(self):
+        expressions = ['foo.bar', 'a[?b == `1`].c | [0]', 'a[1:-1:2]',
+                       '{a: a, b: `[1, {"x": null}]`}', 'sort_by(@, &a)',
+                       '`1` == `1`']
+        asts = dict((e, parser.Parser().parse(e).ast) for e in expressions)
+        cachefile.save(self.filename, asts)
+        self.assertEqual(cachefile.load(self.filename), asts)
+
+    def test_concurrent_saves(self):
+        expressions = [['foo'], ['bar', 'baz']]
+        errors = []
+
+        def save(expressions):
+            try:
+                for _ in range(20):
+                    self.save(expressions)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save, args=(e,))
+                   for e in expressions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIn(sorted(cachefile.load(self.filename)), expressions)
+        self.assertEqual(os.listdir(self.tempdir), ['expressions.cache'])
+
+    def test_failed_save_removes_temporary_file(self):
+        os.mkdir(self.filename)
+        with self.assertRaises(OSError):
+            self.save(['foo'])
+        self.assertEqual(os.listdir(self.tempdir), ['expressions.cache'])
+
+    def test_missing_file(self):
+        self.assertEqual(cachefile.load(self.filename), {})
+
+    def test_corrupted_file_is_ignored(self):
+        self.save(['foo'])
+        with open(self.filename, 'rb') as f:
+            contents = f.read()
+        with open(self.filename, 'wb') as f:
+            f.write(contents[:-1] + b'x')
+        self.assertEqual(cachefile.load(self.filename), {})
+        with open(self.filename, 'wb') as f:
+            f.write(b'not a cache file')
+        self.assertEqual(cachefile.load(self.filename), {})
+
+    def test_other_version_is_ignored(self):
+        self.save(['foo'])
+        original = cachefile.FORMAT_VERSION
+        cachefile.FORMAT_VERSION = original + 1
+        try:
+            self.assertEqual(cachefile.load(self.filename), {})
+        finally:
+            cachefile.FORMAT_VERSION = original
+        self.assertEqual(len(cachefile.load(self.filename)), 1)
+        self.assertEqual(cachefile.load(self.filename, optimized=False), {})
+
+    def test_warm_start_doesnt_parse(self):
+        expressions = ['foo.bar[0]', 'foo[*].bar', 'length(foo)']
+        results, errors = CountingParser().parse_many(
+            expressions, cache_file=self.filename)
+        self.assertEqual(errors, {})
+        self.assertEqual(sorted(CountingParser.parsed), sorted(expressions))
+        parser.Parser.purge()
+        CountingParser.parsed = []
+        loaded, errors = CountingParser().parse_many(
+            expressions, cache_file=self.filename)
+        self.assertEqual(CountingParser.parsed, [])
+        for expression in expressions:
+            self.assertEqual(loaded[expression].ast, results[expression].ast)
+        self.assertEqual(
+            loaded['foo[*].bar'].search({'foo': [{'bar': 1}]}), [1])
+
+    def test_new_expressions_are_added_to_file(self):
+        CountingParser().parse_many(['foo'], cache_file=self.filename)
+        parser.Parser.purge()
+        CountingParser.parsed = []
+        CountingParser().parse_many(['foo', 'bar'], cache_file=self.filename)
+        self.assertEqual(CountingParser.parsed, ['bar'])
+        self.assertEqual(sorted(cachefile.load(self.filename)),
+                         ['bar', 'foo'])
+
+
+class TestCompileMany(unittest.TestCase):
+    def test_compile_many(self):
+        results = jmespath.compile_many(['foo', 'foo.bar'],
+                                        backend='closure')
+        self.assertEqual(sorted(results), ['foo', 'foo.bar'])
+        self.assertEqual(results['foo.bar'].search({'foo': {'bar': 1}}), 1)
+        self.assertEqual(results['foo'].backend, 'closure')
+
+    def test_reports_every_error(self):
+        with self.assertRaises(exceptions.CompileErrors) as e:
+            jmespath.compile_many(['foo', 'foo.', 'foo[', 'bar', ''])
+        errors = e.exception.errors
+        self.assertEqual(sorted(errors), ['', 'foo.', 'foo['])
+        self.assertIsInstance(errors['foo.'], exceptions.ParseError)
+        self.assertIsInstance(errors[''], exceptions.EmptyExpressionError)
+        self.assertEqual(sorted(e.exception.results), ['bar', 'foo'])
+        self.assertIn('3 invalid jmespath expressions', str(e.exception))
+        self.assertIn('"foo["', str(e.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from tests import unittest, OrderedDict
+
+import jmespath
+from jmespath import codegen
+from jmespath import functions
+from jmespath import parser
+
+
+class TestCodeGenerator(unittest.TestCase):
+    def setUp(self):
+        self.parser = parser.Parser(backend='codegen')
+
+    def test_generated_source_is_available(self):
+        parsed = self.parser.parse('foo.bar')
+        self.assertIn('def search(value):', parsed.compiled.source)
+        self.assertEqual(parsed.search({'foo': {'bar': 'baz'}}), 'baz')
+
+    def test_field_chain_is_single_get_chain(self):
+        source = self.parser.parse('a.b.c').compiled.source
+        self.assertIn(".get('a').get('b').get('c')", source)
+        self.assertEqual(source.count('try:'), 1)
+
+    def test_field_chain_with_non_dict_values(self):
+        parsed = self.parser.parse('a.b.c')
+        self.assertIsNone(parsed.search({'a': {'b': 'string'}}))
+        self.assertIsNone(parsed.search({'a': [1, 2]}))
+        self.assertIsNone(parsed.search(None))
+
+    def test_projections_are_loops(self):
+        parsed = self.parser.parse('a[*].b[?c > `1`].d')
+        self.assertEqual(parsed.compiled.source.count('for '), 2)
+        data = {'a': [{'b': [{'c': 1, 'd': 'x'}, {'c': 2, 'd': 'y'}]},
+                      {'b': 'notalist'}]}
+        self.assertEqual(parsed.search(data), [['y']])
+
+    def test_exprefs_are_generated_functions(self):
+        parsed = self.parser.parse('max_by(@, &a.b).c')
+        self.assertIn('def _expref0_search(value):', parsed.compiled.source)
+        self.assertEqual(
+            parsed.search([{'a': {'b': 1}, 'c': 1}, {'a': {'b': 2}, 'c': 2}]),
+            2)
+
+    def test_deeply_nested_expressions_fall_back_to_closures(self):
+        expression = 'a' + '[*].a' * 50
+        data = {'a': [{'a': 1}]}
+        compiled = self.parser.parse(expression)
+        expected = jmespath.compile(expression).search(data)
+        self.assertEqual(compiled.search(data), expected)
+
+    def test_options_dict_cls(self):
+        parsed = self.parser.parse('{a: a, b: b, c: c}')
+        result = parsed.search(
+            {'c': 'c', 'b': 'b', 'a': 'a'},
+            options=jmespath.Options(dict_cls=OrderedDict))
+        self.assertIsInstance(result, OrderedDict)
+        self.assertEqual(list(result), ['a', 'b', 'c'])
+
+    def test_options_custom_functions(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['number']})
+            def _func_double(self, x):
+                return x * 2
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        compiled = codegen.CodeGenerator(options).compile(
+            parser.Parser().parse('double(a)').ast)
+        self.assertEqual(compiled({'a': 2}), 4)
@@ -0,0 +1,354 @@
+from tests import unittest, OrderedDict
+
+import jmespath
+from jmespath import compiler
+from jmespath import exceptions
+from jmespath import functions
+from jmespath import parser
+
+
+class TestClosureCompiler(unittest.TestCase):
+    def setUp(self):
+        self.parser = parser.Parser(backend='closure')
+
+    def test_compiled_callable_cached_on_parsed_result(self):
+        parsed = self.parser.parse('foo.bar')
+        self.assertTrue(callable(parsed.compiled))
+        self.assertIs(self.parser.parse('foo.bar'), parsed)
+        self.assertEqual(parsed.compiled({'foo': {'bar': 'baz'}}), 'baz')
+
+    def test_interpreter_backend_has_no_compiled_callable(self):
+        parsed = parser.Parser().parse('foo.bar')
+        self.assertIsNone(parsed.compiled)
+
+    def test_backends_are_cached_separately(self):
+        closure = self.parser.parse('foo')
+        interpreted = parser.Parser().parse('foo')
+        self.assertEqual(closure.backend, 'closure')
+        self.assertEqual(interpreted.backend, 'interpreter')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            jmespath.compile('foo', backend='unknown')
+
+    def test_can_compile_directly(self):
+        compiled = compiler.ClosureCompiler().compile(
+            parser.Parser().parse('a[?b > `1`].c').ast)
+        self.assertEqual(
+            compiled({'a': [{'b': 1, 'c': 'x'}, {'b': 2, 'c': 'y'}]}), ['y'])
+
+    def test_exprefs_evaluated_by_compiled_expression(self):
+        parsed = self.parser.parse('sort_by(@, &a)[*].a')
+        self.assertEqual(parsed.search([{'a': 2}, {'a': 1}]), [1, 2])
+
+    def test_not_zero_is_false(self):
+        parsed = self.parser.parse('!@')
+        self.assertIs(parsed.search(0), False)
+        self.assertIs(parsed.search(0.0), True)
+
+    def test_options_dict_cls(self):
+        parsed = self.parser.parse('{a: a, b: b, c: c}')
+        result = parsed.search(
+            {'c': 'c', 'b': 'b', 'a': 'a'},
+            options=jmespath.Options(dict_cls=OrderedDict))
+        self.assertIsInstance(result, OrderedDict)
+        self.assertEqual(list(result), ['a', 'b', 'c'])
+
+    def test_options_custom_functions(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['number']})
+            def _func_double(self, x):
+                return x * 2
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        parsed = self.parser.parse('double(a)')
+        self.assertEqual(parsed.search({'a': 2}, options=options), 4)
+        with self.assertRaises(exceptions.UnknownFunctionError):
+            parsed.search({'a': 2})
+
+
+class CountingFunctions(functions.Functions):
+    def __init__(self):
+        self.calls = 0
+
+    @functions.signature({'types': []})
+    def _func_count(self, x):
+        self.calls += 1
+        return x
+
+
+class TestCommonSubexpressionElimination(unittest.TestCase):
+    def setUp(self):
+        self.functions = CountingFunctions()
+        self.compiler = compiler.ClosureCompiler(
+            jmespath.Options(custom_functions=self.functions))
+
+    def compile(self, expression):
+        return self.compiler.compile(parser.Parser().parse(expression).ast)
+
+    def test_shared_subexpression_evaluated_once(self):
+        compiled = self.compile('{a: count(foo), b: [count(foo)]}')
+        self.assertEqual(compiled({'foo': 1}), {'a': 1, 'b': [1]})
+        self.assertEqual(self.functions.calls, 1)
+
+    def test_shared_subexpression_evaluated_once_per_search(self):
+        compiled = self.compile('[count(foo), count(foo)]')
+        self.assertEqual(compiled({'foo': 1}), [1, 1])
+        self.assertEqual(compiled({'foo': 2}), [2, 2])
+        self.assertEqual(self.functions.calls, 2)
+
+    def test_scopes_with_different_input_are_not_shared(self):
+        compiled = self.compile('[count(foo), bar[*].count(foo)]')
+        self.assertEqual(
+            compiled({'foo': 1, 'bar': [{'foo': 2}, {'foo': 3}]}),
+            [1, [2, 3]])
+        self.assertEqual(self.functions.calls, 3)
+
+    def test_shared_subexpression_inside_projection(self):
+        compiled = self.compile('bar[*].[count(foo), count(foo)]')
+        self.assertEqual(
+            compiled({'bar': [{'foo': 2}, {'foo': 3}]}), [[2, 2], [3, 3]])
+        self.assertEqual(self.functions.calls, 2)
+
+    def test_short_circuit_is_preserved(self):
+        compiled = self.compile('[foo || count(bar), count(bar)]')
+        self.assertEqual(compiled({'foo': 1, 'bar': 2}), [1, 2])
+        self.assertEqual(self.functions.calls, 1)
+        compiled = self.compile('[foo && count(bar), foo && count(bar)]')
+        self.assertEqual(compiled({'foo': False, 'bar': 2}), [False, False])
+        self.assertEqual(self.functions.calls, 1)
+
+    def test_filters_share_selected_elements(self):
+        compiled = self.compile(
+            '{total: sum(items[?count(active)].price), '
+            'n: length(items[?count(active)])}')
+        data = {'items': [{'active': True, 'price': 1},
+                          {'active': False, 'price': 2},
+                          {'active': True, 'price': 3}]}
+        self.assertEqual(compiled(data), {'total': 4, 'n': 2})
+        self.assertEqual(self.functions.calls, 3)
+
+    def test_filter_selection_keeps_null_elements(self):
+        compiled = self.compile(
+            '[items[?!a].to_string(@), items[?!a], items[?!a].b]')
+        self.assertEqual(compiled({'items': [None, {'a': 1}]}),
+                         [['null'], [], []])
+
+
+class TestProjectionFusion(unittest.TestCase):
+    def setUp(self):
+        self.data = {
+            'a': [
+                {'b': [{'c': 1}, {'c': None}, {'d': 2}, [{'c': 3}]]},
+                {'b': {'c': 4}},
+                None,
+                {'b': [[{'c': 5}], {'c': 6}]},
+                [{'b': [{'c': 7}]}],
+            ],
+            'o': {'x': {'b': [{'c': 8}]}, 'y': {'b': [{'c': 9}]}},
+        }
+
+    def assert_same_as_interpreter(self, expression):
+        expected = jmespath.compile(expression).search(self.data)
+        actual = jmespath.compile(
+            expression, backend='closure').search(self.data)
+        self.assertEqual(actual, expected, expression)
+
+    def test_fused_projections_and_flattens(self):
+        for expression in ['a[].b[].c', 'a[*].b[*].c', 'a[*].b[].c',
+                           'a[].b[*].c', 'a[][][].b[].c', 'a[].b[][].c',
+                           'o.*.b[].c', 'a[?b].b[].c', 'a[].b[?c].c',
+                           'a[].b[?c > `1`][].c', 'a[].b[].c[]',
+                           'c[].b[].a', 'a.b[].c[]']:
+            self.assert_same_as_interpreter(expression)
+
+    def test_fused_pipes(self):
+        for expression in ['a[*].b | [*].c', 'a[].b | [].c',
+                           'a[*].b | [?c].c', 'a[].b[] | [*].c',
+                           'a[*] | [*].b', 'c[*].b | [*].c']:
+            self.assert_same_as_interpreter(expression)
+
+    def test_pipe_with_shared_stage_on_the_right(self):
+        # [] is shared with the [] of the other keys, so it isn't fused
+        # and must not be evaluated against the input of the pipe.
+        expression = '{x: [], z: [], y: b[*] | [].a}'
+        data = {'b': [[{'a': 1}]]}
+        for backend in ('closure', 'codegen'):
+            self.assertEqual(
+                jmespath.compile(expression, backend=backend).search(data),
+                {'x': None, 'z': None, 'y': [1]}, backend)
+
+    def test_not_fused_when_multiple_stages_can_raise(self):
+        # Both stages raise, the first stage must raise first even
+        # though the second stage fails on an earlier element.
+        parsed = jmespath.compile('[].abs(@)[].length(@)', backend='closure')
+        with self.assertRaises(exceptions.JMESPathTypeError) as e:
+            parsed.search([[1], ['x']])
+        self.assertEqual(e.exception.function_name, 'abs')
+
+
+class CountingList(list):
+    # Counts the elements iterated over.
+    iterated = 0
+
+    def __iter__(self):
+        for element in list.__iter__(self):
+            CountingList.iterated += 1
+            yield element
+
+
+class TestFirstMatch(unittest.TestCase):
+    def setUp(self):
+        CountingList.iterated = 0
+        self.data = {'a': CountingList(
+            {'b': i, 'c': [i, [i]], 'd': {'e': i}} for i in range(10))}
+
+    def test_stops_at_the_element_taken(self):
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile('a[?b != `1`] | [2].b',
+                                      backend=backend)
+            CountingList.iterated = 0
+            self.assertEqual(parsed.search(self.data), 3)
+            self.assertEqual(CountingList.iterated, 4)
+
+    def test_same_as_interpreter(self):
+        for expression in ['a[*].b | [0]', 'a[?b == `3`] | [0].d.e',
+                           'a[].c | [3]', 'a[*].c[] | [5]', 'a[*].d.* | [1]',
+                           'a[?b == `30`] | [0]', 'a[*].x | [0]',
+                           'a[?b == `3`] | [0].c[1][0]', 'a[*].b | [20]']:
+            expected = jmespath.compile(expression).search(self.data)
+            for backend in ('closure', 'codegen'):
+                actual = jmespath.compile(
+                    expression, backend=backend).search(self.data)
+                self.assertEqual(actual, expected, (expression, backend))
+
+    def test_elements_that_can_raise_are_evaluated(self):
+        data = {'a': [{'b': 1}, {'b': 'x'}]}
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile('a[*].abs(b) | [0]', backend=backend)
+            with self.assertRaises(exceptions.JMESPathTypeError):
+                parsed.search(data)
+
+
+
+class RecordingFunctions(functions.Functions):
+    def __init__(self):
+        self.streamed = []
+
+    def call_streamed(self, function_name, resolved_args):
+        self.streamed.append(function_name)
+        return super(RecordingFunctions, self).call_streamed(
+            function_name, resolved_args)
+
+
+class TestAggregatePushdown(unittest.TestCase):
+    def setUp(self):
+        self.data = {'a': [{'b': i, 'c': [i, i * 0.5], 's': str(i)}
+                           for i in range(10)],
+                     'o': {'x': {'b': 1}, 'y': {'b': 2}}}
+
+    def test_aggregates_are_streamed(self):
+        for expression in ['length(a[?b > `4`])', 'sum(a[*].b)',
+                           'avg(a[].c[])', 'max(a[*].s)', 'min(o.*.b)',
+                           "join(',', a[*].s)", 'a[*].c[1] | sum(@)',
+                           'contains(a[*].b, `3`)']:
+            expected = jmespath.compile(expression).search(self.data)
+            for backend in ('closure', 'codegen'):
+                custom_functions = RecordingFunctions()
+                options = jmespath.Options(custom_functions=custom_functions)
+                actual = jmespath.compile(
+                    expression, backend=backend).search(self.data, options)
+                self.assertEqual(actual, expected, (expression, backend))
+                self.assertEqual(len(custom_functions.streamed), 1,
+                                 (expression, backend))
+
+    def test_same_errors_as_lists(self):
+        data = {'a': [{'b': 1}, {'b': 2.5}, {'b': 'x'}, {'b': []}]}
+        for name in ('avg', 'max', 'min', 'sum'):
+            with self.assertRaises(exceptions.JMESPathTypeError) as e:
+                functions.Functions().call_function(
+                    name, [[1, 2.5, 'x', []]])
+            for backend in ('closure', 'codegen'):
+                parsed = jmespath.compile('%s(a[*].b)' % name,
+                                          backend=backend)
+                with self.assertRaises(
+                        exceptions.JMESPathTypeError) as streamed:
+                    parsed.search(data)
+                self.assertEqual(str(streamed.exception), str(e.exception))
+
+    def test_null_projection(self):
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile('length(x[*].b)', backend=backend)
+            with self.assertRaises(exceptions.JMESPathTypeError):
+                parsed.search(self.data)
+
+
+class TestFunctionResolution(unittest.TestCase):
+    def test_arity_errors_raised_at_compile_time(self):
+        for backend in ('closure', 'codegen'):
+            with self.assertRaises(exceptions.ArityError):
+                jmespath.compile('a || length(@, @)', backend=backend)
+            with self.assertRaises(exceptions.VariadictArityError):
+                jmespath.compile('a || not_null()', backend=backend)
+
+    def test_functions_bound_per_function_table(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['number']})
+            def _func_abs(self, x):
+                return 'custom'
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile('abs(a)', backend=backend)
+            self.assertEqual(parsed.search({'a': -1}), 1)
+            self.assertEqual(parsed.search({'a': -1}, options), 'custom')
+            with self.assertRaises(exceptions.JMESPathTypeError):
+                parsed.search({'a': 'x'}, options)
+
+    def test_custom_function_with_another_arity(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['number']},
+                                 {'types': ['number']})
+            def _func_abs(self, x, y):
+                return x + y
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        expression = 'abs(`1`, `2`)'
+        self.assertEqual(jmespath.search(expression, {}, options), 3)
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile(expression, backend=backend,
+                                      options=options)
+            self.assertEqual(parsed.search({}, options), 3)
+            # The default function table is still checked.
+            with self.assertRaises(exceptions.ArityError):
+                parsed.search({})
+            with self.assertRaises(exceptions.ArityError):
+                jmespath.compile(expression, backend=backend)
+            with self.assertRaises(exceptions.ArityError):
+                jmespath.compile('abs(`1`)', backend=backend,
+                                 options=options)
+
+    def test_overridden_call_function_is_called(self):
+        class CallingFunctions(functions.Functions):
+            def __init__(self):
+                self.called = []
+
+            def call_function(self, function_name, resolved_args):
+                self.called.append(function_name)
+                return super(CallingFunctions, self).call_function(
+                    function_name, resolved_args)
+
+        for backend in ('closure', 'codegen'):
+            custom_functions = CallingFunctions()
+            options = jmespath.Options(custom_functions=custom_functions)
+            parsed = jmespath.compile('abs(length(a))', backend=backend)
+            self.assertEqual(parsed.search({'a': 'xy'}, options), 2)
+            self.assertEqual(custom_functions.called, ['length', 'abs'])
+
+    def test_resolved_validators_are_cached(self):
+        table = functions.Functions()
+        table.resolve_function('sort_by', [None, 'expref'])
+        validators = dict(table._resolved_validators)
+        functions.Functions().resolve_function('sort_by', [None, 'expref'])
+        self.assertEqual(table._resolved_validators, validators)
+        self.assertIn(('sort_by', (None, 'expref')), validators)
@@ -13,6 +13,8 @@ COMPLIANCE_DIR = os.path.join(TEST_DIR, 'compliance')
 LEGACY_DIR = os.path.join(TEST_DIR, 'legacy')
 NOT_SPECIFIED = object()
 OPTIONS = Options(dict_cls=OrderedDict)
+# Every evaluation backend must pass the full compliance suite.
+BACKENDS = ['interpreter', 'closure', 'codegen']
 
 
 def test_compliance():
@@ -23,12 +25,15 @@ def test_compliance():
                 # Benchmark tests aren't run as part of the normal
                 # test suite, so we only care about 'result' and
                 # 'error' test_types.
-                if test_type == 'result':
-                    yield (_test_expression, given, t['expression'],
-                           t['result'], os.path.basename(full_path))
-                elif test_type == 'error':
-                    yield (_test_error_expression, given, t['expression'],
-                           t['error'], os.path.basename(full_path))
+                for backend in BACKENDS:
+                    if test_type == 'result':
+                        yield (_test_expression, given, t['expression'],
+                               t['result'], os.path.basename(full_path),
+                               backend)
+                    elif test_type == 'error':
+                        yield (_test_error_expression, given,
+                               t['expression'], t['error'],
+                               os.path.basename(full_path), backend)
 
 
 def _walk_files():
@@ -63,10 +68,11 @@ def load_cases(full_path):
             yield (given, test_type, case)
 
 
-def _test_expression(given, expression, expected, filename):
+def _test_expression(given, expression, expected, filename,
+                     backend='interpreter'):
     import jmespath.parser
     try:
-        parsed = jmespath.compile(expression)
+        parsed = jmespath.compile(expression, backend=backend)
     except ValueError as e:
         raise AssertionError(
             'jmespath expression failed to compile: "%s", error: %s"' %
@@ -75,21 +81,23 @@ def _test_expression(given, expression, expected, filename):
     expected_repr = json.dumps(expected, indent=4)
     actual_repr = json.dumps(actual, indent=4)
     error_msg = ("\n\n  (%s) The expression '%s' was suppose to give:\n%s\n"
-                 "Instead it matched:\n%s\nparsed as:\n%s\ngiven:\n%s" % (
+                 "Instead it matched:\n%s\nparsed as:\n%s\ngiven:\n%s\n"
+                 "backend: %s" % (
                      filename, expression, expected_repr,
                      actual_repr, pformat(parsed.parsed),
-                     json.dumps(given, indent=4)))
+                     json.dumps(given, indent=4), backend))
     error_msg = error_msg.replace(r'\n', '\n')
     assert_equal(actual, expected, error_msg)
 
 
-def _test_error_expression(given, expression, error, filename):
+def _test_error_expression(given, expression, error, filename,
+                           backend='interpreter'):
     import jmespath.parser
     if error not in ('syntax', 'invalid-type',
                      'unknown-function', 'invalid-arity', 'invalid-value'):
         raise RuntimeError("Unknown error type '%s'" % error)
     try:
-        parsed = jmespath.compile(expression)
+        parsed = jmespath.compile(expression, backend=backend)
         parsed.search(given)
     except ValueError:
         # Test passes, it raised a parse error as expected.
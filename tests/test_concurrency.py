@@ -0,0 +1,185 @@
+import threading
+import time
+
+from tests import unittest, OrderedDict
+
+import jmespath
+from jmespath import cache
+from jmespath import exceptions
+from jmespath import parser
+
+
+def run_in_threads(target, num_threads):
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class ForbiddenLock(object):
+    # A lock that fails the test when it's taken.
+    def acquire(self, *args, **kwargs):
+        raise AssertionError('the lock was acquired')
+
+    __enter__ = acquire
+
+    def __exit__(self, *args):
+        pass
+
+
+class CountingParser(parser.Parser):
+    parse_count = 0
+    parse_started = None
+    release = None
+
+    def _parse(self, expression):
+        CountingParser.parse_count += 1
+        self.parse_started.set()
+        self.release.wait()
+        return super(CountingParser, self)._parse(expression)
+
+
+class TestConcurrentSearches(unittest.TestCase):
+    def setUp(self):
+        self.original = parser.Parser.get_cache()
+        # A cache smaller than the working set, so entries are evicted
+        # while other threads read from the cache.
+        parser.Parser.set_cache(cache.LRUCache(max_entries=20))
+        self.data = dict(('foo%s' % i, {'bar': [i, i + 1, i + 2]})
+                         for i in range(50))
+        self.expressions = [
+            ('foo%s.bar[%s]' % (i, i % 3), i + i % 3) for i in range(50)]
+        self.expressions.extend(
+            ('foo%s.bar[?@ > `%s`] | length(@)' % (i, i), 2)
+            for i in range(50))
+
+    def tearDown(self):
+        parser.Parser.set_cache(self.original)
+
+    def test_search_from_many_threads(self):
+        mismatches = []
+
+        def search():
+            for _ in range(5):
+                for expression, expected in self.expressions:
+                    actual = jmespath.search(expression, self.data)
+                    if actual != expected:
+                        mismatches.append((expression, actual))
+
+        errors = run_in_threads(search, 32)
+        self.assertEqual(errors, [])
+        self.assertEqual(mismatches, [])
+        stats = parser.Parser.get_cache().stats()
+        self.assertEqual(stats['entries'], 20)
+        self.assertGreater(stats['evictions'], 0)
+
+    def test_shared_parser_instance(self):
+        p = parser.Parser(backend='closure')
+        mismatches = []
+
+        def search():
+            for expression, expected in self.expressions:
+                actual = p.parse(expression).search(self.data)
+                if actual != expected:
+                    mismatches.append((expression, actual))
+
+        errors = run_in_threads(search, 16)
+        self.assertEqual(errors, [])
+        self.assertEqual(mismatches, [])
+
+    def test_shared_options_instance(self):
+        options = jmespath.Options(dict_cls=OrderedDict)
+        parsed = [(parser.Parser(backend=backend).parse(expression), expected)
+                  for backend in ('interpreter', 'closure', 'codegen')
+                  for expression, expected in self.expressions[:20]]
+        mismatches = []
+
+        def search():
+            for expression, expected in parsed:
+                actual = expression.search(self.data, options=options)
+                if actual != expected:
+                    mismatches.append((expression, actual))
+
+        errors = run_in_threads(search, 16)
+        self.assertEqual(errors, [])
+        self.assertEqual(mismatches, [])
+
+    def test_cached_expressions_are_looked_up_without_a_lock(self):
+        # Searches of cached expressions must not contend on a lock.
+        for expression, _ in self.expressions:
+            jmespath.search(expression, self.data)
+        cached = [e for e, _ in self.expressions
+                  if parser.Parser.get_cache().peek(
+                      ('interpreter', True, e)) is not None]
+        self.assertNotEqual(cached, [])
+        original_lock = parser.Parser._PENDING_LOCK
+        parser.Parser._PENDING_LOCK = ForbiddenLock()
+        parser.Parser.get_cache()._lock = ForbiddenLock()
+        try:
+            for expression in cached:
+                jmespath.search(expression, self.data)
+        finally:
+            parser.Parser._PENDING_LOCK = original_lock
+
+
+class TestSingleFlightParsing(unittest.TestCase):
+    def setUp(self):
+        self.original = parser.Parser.get_cache()
+        parser.Parser.set_cache(cache.LRUCache(max_entries=10))
+        CountingParser.parse_count = 0
+        CountingParser.parse_started = threading.Event()
+        CountingParser.release = threading.Event()
+
+    def tearDown(self):
+        CountingParser.release.set()
+        parser.Parser.set_cache(self.original)
+
+    def parse_concurrently(self, expression, num_threads=16):
+        results = []
+
+        def parse():
+            results.append(CountingParser().parse(expression))
+
+        def release_when_all_waiting():
+            CountingParser.parse_started.wait()
+            # Give every thread time to miss the cache and wait for
+            # the pending parse.
+            time.sleep(0.1)
+            CountingParser.release.set()
+
+        releaser = threading.Thread(target=release_when_all_waiting)
+        releaser.start()
+        errors = run_in_threads(parse, num_threads)
+        releaser.join()
+        return results, errors
+
+    def test_expression_is_parsed_once(self):
+        results, errors = self.parse_concurrently('foo.bar[0]')
+        self.assertEqual(errors, [])
+        self.assertEqual(CountingParser.parse_count, 1)
+        self.assertEqual(len(results), 16)
+        for result in results:
+            self.assertIs(result, results[0])
+
+    def test_parse_errors_are_shared(self):
+        results, errors = self.parse_concurrently('foo.bar[')
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 16)
+        for error in errors:
+            self.assertIsInstance(error, exceptions.ParseError)
+        self.assertEqual(CountingParser.parse_count, 1)
+        self.assertEqual(parser.Parser._PENDING, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,3 +23,24 @@ class TestCustomFunctions(unittest.TestCase):
 
         self.assertEqual(jmespath.search('length0(a.b)', data, self.options), 3)
         self.assertEqual(jmespath.search('length0(a.c)', data, self.options), 0)
+
+    def test_overridden_call_function_is_called_by_every_backend(self):
+        class CountingFunctions(functions.Functions):
+            def __init__(self):
+                super(CountingFunctions, self).__init__()
+                self.called = []
+
+            def call_function(self, function_name, resolved_args):
+                self.called.append(function_name)
+                return super(CountingFunctions, self).call_function(
+                    function_name, resolved_args)
+
+        data = {'a': [{'b': 1}, {'b': 2}]}
+        for backend in ('interpreter', 'closure', 'codegen'):
+            custom = CountingFunctions()
+            options = jmespath.Options(custom_functions=custom)
+            for expression, expected in [('sum(a[*].b)', 3),
+                                         ('length(a[*].b)', 2)]:
+                parsed = jmespath.compile(expression, backend=backend)
+                self.assertEqual(parsed.search(data, options), expected)
+            self.assertEqual(custom.called, ['sum', 'length'], backend)
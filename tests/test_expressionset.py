@@ -0,0 +1,118 @@
+import glob
+import os
+
+from tests import unittest, OrderedDict, json
+
+import jmespath
+from jmespath import exceptions
+
+
+COMPLIANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'compliance')
+BACKENDS = ['interpreter', 'closure', 'codegen']
+
+
+class CountingDict(dict):
+    lookups = 0
+
+    def get(self, key, default=None):
+        CountingDict.lookups += 1
+        return super(CountingDict, self).get(key, default)
+
+
+class TestExpressionSet(unittest.TestCase):
+    def setUp(self):
+        CountingDict.lookups = 0
+
+    def test_results_keyed_by_name(self):
+        expressions = jmespath.ExpressionSet({
+            'bucket': 'Records[*].s3.bucket.name',
+            'key': 'Records[*].s3.object.key',
+            'first': 'Records[0].s3.object.key',
+        })
+        data = {'Records': [
+            {'s3': {'bucket': {'name': 'b1'}, 'object': {'key': 'k1'}}},
+            {'s3': {'bucket': {'name': 'b2'}, 'object': {'key': 'k2'}}},
+        ]}
+        self.assertEqual(expressions.search(data), {
+            'bucket': ['b1', 'b2'],
+            'key': ['k1', 'k2'],
+            'first': 'k1',
+        })
+
+    def test_expressions_are_their_own_names(self):
+        expressions = jmespath.ExpressionSet(['a.b', 'a.c'])
+        self.assertEqual(expressions.search({'a': {'b': 1}}),
+                         {'a.b': 1, 'a.c': None})
+
+    def test_shared_prefix_evaluated_once(self):
+        expressions = jmespath.ExpressionSet(
+            ['detail.params.%s' % name for name in 'abcdefgh'])
+        params = dict((name, name) for name in 'abcdefgh')
+        data = CountingDict(detail=CountingDict(params=params))
+        results = expressions.search(data)
+        self.assertEqual(results['detail.params.c'], 'c')
+        # One lookup of "detail" and one of "params", the lookups in
+        # params aren't counted.
+        self.assertEqual(CountingDict.lookups, 2)
+
+    def test_shared_projection_evaluated_once(self):
+        expressions = jmespath.ExpressionSet([
+            'items[?kind == `1`].a', 'items[?kind == `1`].b',
+            'items[?kind == `1`] | length(@)', 'items[*].a | [0]'])
+        items = [CountingDict(kind=i % 2, a=i, b=-i) for i in range(6)]
+        results = expressions.search({'items': items})
+        self.assertEqual(results, {
+            'items[?kind == `1`].a': [1, 3, 5],
+            'items[?kind == `1`].b': [-1, -3, -5],
+            'items[?kind == `1`] | length(@)': 3,
+            'items[*].a | [0]': 0,
+        })
+        # Once for the filter, once for a and b of the matching items
+        # and once for a in the last projection.
+        self.assertEqual(CountingDict.lookups, 6 + 3 * 2 + 6)
+
+    def test_options(self):
+        expressions = jmespath.ExpressionSet(
+            ['a[*].{b: b, c: c}'], backend='closure',
+            options=jmespath.Options(dict_cls=OrderedDict))
+        result = expressions.search({'a': [{'b': 1, 'c': 2}]})
+        self.assertIsInstance(result['a[*].{b: b, c: c}'][0], OrderedDict)
+
+    def test_invalid_expressions(self):
+        with self.assertRaises(exceptions.CompileErrors) as e:
+            jmespath.ExpressionSet(['a.b', 'a.', 'a[?'])
+        self.assertEqual(sorted(e.exception.errors), ['a.', 'a[?'])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            jmespath.ExpressionSet(['a'], backend='unknown')
+
+    def test_matches_compliance_results(self):
+        # All the valid expressions of a compliance test suite are
+        # evaluated as a single set.
+        for filename in glob.glob(os.path.join(COMPLIANCE_DIR, '*.json')):
+            with open(filename) as f:
+                suites = json.load(f)
+            for suite in suites:
+                expected = {}
+                for case in suite['cases']:
+                    if 'error' in case:
+                        continue
+                    try:
+                        expected[case['expression']] = jmespath.search(
+                            case['expression'], suite['given'])
+                    except exceptions.JMESPathError:
+                        continue
+                if not expected:
+                    continue
+                for backend in BACKENDS:
+                    expressions = jmespath.ExpressionSet(list(expected),
+                                                         backend=backend)
+                    self.assertEqual(
+                        expressions.search(suite['given']), expected,
+                        (filename, backend))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ import json
 
 import jmespath
 from jmespath import exceptions
+from jmespath import functions
 
 
 class TestFunctions(unittest.TestCase):
@@ -55,3 +56,54 @@ class TestFunctions(unittest.TestCase):
         self.assertEqual(
             str(exception),
             'Expected at least 1 argument for function not_null(), received 0')
+
+
+class TestArgumentValidators(unittest.TestCase):
+
+    def setUp(self):
+        self.functions = functions.Functions()
+
+    def assert_same_error(self, name, args, validate):
+        signature = self.functions.FUNCTION_TABLE[name]['signature']
+        with self.assertRaises(exceptions.JMESPathError) as expected:
+            self.functions._validate_arguments(args, signature, name)
+        with self.assertRaises(type(expected.exception)) as actual:
+            validate(args)
+        self.assertEqual(str(actual.exception), str(expected.exception))
+
+    def test_compiled_validator_raises_the_same_errors(self):
+        cases = [
+            ('abs', []),
+            ('abs', ['a']),
+            ('not_null', []),
+            ('sum', [[1, 'a']]),
+            ('max', [[1, 'a']]),
+            ('max', [['a', 1]]),
+            ('max', [[True]]),
+            ('join', [1, ['a']]),
+            ('join', [',', ['a', None]]),
+            ('length', [None]),
+        ]
+        for name, args in cases:
+            validate = self.functions.argument_validator(name)
+            self.assert_same_error(name, args, validate)
+
+    def test_known_types_skip_checks(self):
+        validate = self.functions.argument_validator(
+            'join', [None, 'array-string'])
+        # The element types of the array aren't checked anymore.
+        self.assertIsNone(validate([',', ['a', 1]]))
+        self.assert_same_error('join', [1, ['a']], validate)
+        self.assert_same_error('join', [','], validate)
+
+    def test_overridden_type_checks_are_used(self):
+        class CustomFunctions(functions.Functions):
+            def _type_check(self, actual, signature, function_name):
+                pass
+
+        self.assertIsNone(
+            CustomFunctions.FUNCTION_TABLE['abs']['validator'])
+        validate = CustomFunctions().argument_validator('sum')
+        self.assertIsNone(validate([['a']]))
+        with self.assertRaises(exceptions.ArityError):
+            validate([])
@@ -0,0 +1,129 @@
+from tests import unittest, OrderedDict
+
+import jmespath
+from jmespath import functions
+from jmespath import inference
+from jmespath import parser
+
+
+class Weird(object):
+    # A value of a type that isn't a JMESPath type, which compares
+    # equal to anything.
+    def __eq__(self, other):
+        return True
+
+    def __hash__(self):
+        return 0
+
+
+class TestTypeInference(unittest.TestCase):
+    def infer(self, expression, **kwargs):
+        ast = parser.Parser().parse(expression).ast
+        return ast, inference.infer_types(ast, **kwargs)
+
+    def assert_types(self, expression, expected, **kwargs):
+        ast, types = self.infer(expression, **kwargs)
+        self.assertEqual(types.types(ast), frozenset(expected), expression)
+
+    def test_literals(self):
+        self.assert_types('`1`', ['number'])
+        self.assert_types("'a'", ['string'])
+        self.assert_types('`[1, 2]`', ['array'])
+        self.assert_types('`null`', ['null'])
+
+    def test_document_values_have_any_type(self):
+        ast, types = self.infer('a')
+        self.assertIn('unknown', types.types(ast))
+        self.assertIn('number', types.types(ast))
+
+    def test_functions(self):
+        self.assert_types('length(a)', ['number'])
+        self.assert_types('keys(@)', ['array'])
+        self.assert_types('sort_by(a, &b)', ['array'])
+        self.assert_types('contains(a, `1`)', ['boolean'])
+        self.assert_types('to_number(`"1"`)', ['number', 'null'])
+        self.assert_types('to_number(a)', ['number', 'null', 'unknown'])
+        self.assert_types('type(`1`)', ['string'])
+
+    def test_custom_functions_have_any_type(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': []})
+            def _func_length(self, x):
+                return 0
+
+        ast, types = self.infer('length(a)',
+                                functions_table=CustomFunctions())
+        self.assertIn('unknown', types.types(ast))
+
+    def test_comparators(self):
+        self.assert_types('a == b', ['boolean', 'unknown'])
+        self.assert_types('length(a) == `1`', ['boolean'])
+        self.assert_types('length(a) < `1`', ['boolean'])
+        self.assert_types('length(a) < b', ['boolean', 'null', 'unknown'])
+
+    def test_projections(self):
+        self.assert_types('a[*].b', ['array', 'null'])
+        self.assert_types('keys(@)[*]', ['array'])
+        self.assert_types('[a, b]', ['array', 'null'])
+
+    def test_multi_select_dict_with_other_dict_cls(self):
+        class CustomDict(dict):
+            pass
+
+        self.assert_types('length(a) || {a: a}',
+                          ['number', 'object', 'null'], dict_cls=OrderedDict)
+        self.assert_types('length(a) || {a: a}',
+                          ['number', 'unknown', 'null'], dict_cls=CustomDict)
+
+
+class TestRemovedChecks(unittest.TestCase):
+    def test_explain_lists_removed_checks(self):
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile(
+                "sort_by(a, &b)[?contains(tags, 'x')].c || !length(a)",
+                backend=backend)
+            self.assertEqual(sorted(parsed.explain()), [
+                'list check: sort_by(a, &b)',
+                'truthiness check: contains(tags, `"x"`)',
+                'truthiness check: sort_by(a, &b)[?contains(tags, `"x"`)].c',
+                'type check: &b',
+            ], backend)
+        self.assertEqual(jmespath.compile('sort_by(a, &b)[*]').explain(), [])
+
+    def test_checks_of_values_of_any_type_are_kept(self):
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile('a[?b > c || d].e', backend=backend)
+            self.assertEqual(parsed.explain(), [], backend)
+
+    def test_same_results_without_checks(self):
+        expressions = [
+            'sort_by(a, &b)[*].b',
+            'sort_by(a, &b)[0:1]',
+            'keys(@)[?@ > `"a"`]',
+            'a[?contains(tags, `1`) || !length(tags)].b',
+            'length(a) > `1` && length(a) == `2`',
+            '!contains(a[*].b, `1`)',
+            'to_array(b)[] | [0]',
+        ]
+        documents = [
+            {'a': [{'b': 2, 'tags': [1]}, {'b': 1, 'tags': []}], 'b': 0},
+            {'a': [], 'b': [[0, 1], 2]},
+            {'a': [{'b': 'x', 'tags': ['a']}], 'b': Weird()},
+        ]
+        for expression in expressions:
+            for document in documents:
+                expected = jmespath.compile(expression).search(document)
+                for backend in ('closure', 'codegen'):
+                    actual = jmespath.compile(
+                        expression, backend=backend).search(document)
+                    self.assertEqual(actual, expected,
+                                     (expression, document, backend))
+
+    def test_render(self):
+        for expression in ['a.b[*].c', 'a[?b == `1`] | [0]', '[a, b].c',
+                           '{a: a || b}', 'a.*.b[]', 'foo[1:2].bar',
+                           '!(a && b)', 'sort_by(@, &a.b)']:
+            ast = parser.Parser().parse(expression).ast
+            self.assertEqual(
+                parser.Parser().parse(inference.render(ast)).ast, ast,
+                expression)
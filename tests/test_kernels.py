@@ -0,0 +1,70 @@
+from tests import unittest
+
+from jmespath import kernels
+from jmespath import parser
+from jmespath import visitor
+
+
+VALUES = [0, 1, 2, 5, -1, 1.5, 0.0, 1.0, True, False, None, '', 'a', 'b',
+          [], [1], {}, {'a': 1}]
+
+
+class TestFilterPredicates(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = visitor.TreeInterpreter()
+
+    def compile_condition(self, expression):
+        condition = parser.Parser().parse(
+            'foo[?%s]' % expression).ast.children[2]
+        return condition, kernels.compile_filter_predicate(condition)
+
+    def assert_matches_interpreter(self, expression, elements):
+        condition, predicate = self.compile_condition(expression)
+        self.assertIsNotNone(predicate)
+        for element in elements:
+            try:
+                expected = self.interpreter.visit(condition, element)
+            except TypeError:
+                with self.assertRaises(TypeError):
+                    predicate(element)
+                continue
+            self.assertEqual(
+                bool(predicate(element)),
+                self.interpreter._is_true(expected),
+                'Mismatch for %s with element %r' % (expression, element))
+
+    def test_equality_with_literals(self):
+        for literal in ['`0`', '`1`', '`true`', '`false`', '`null`',
+                        "'a'", '`2`', '`1.0`', '`[1]`', '`{"a": 1}`']:
+            for comparator in ['==', '!=']:
+                for expression in ['a %s %s' % (comparator, literal),
+                                   '%s %s a' % (literal, comparator)]:
+                    self.assert_matches_interpreter(
+                        expression, [{'a': v} for v in VALUES])
+
+    def test_ordering_with_literals(self):
+        for literal in ['`1`', '`1.5`', "'a'", '`null`', '`[1]`']:
+            for comparator in ['<', '<=', '>', '>=']:
+                for expression in ['a %s %s' % (comparator, literal),
+                                   '%s %s a' % (literal, comparator)]:
+                    self.assert_matches_interpreter(
+                        expression, [{'a': v} for v in VALUES])
+
+    def test_field_paths_and_current_node(self):
+        self.assert_matches_interpreter(
+            'a.b == `1`', [{'a': {'b': v}} for v in VALUES] + VALUES)
+        self.assert_matches_interpreter('@ > `1`', VALUES)
+
+    def test_range_is_fused(self):
+        self.assert_matches_interpreter(
+            'a > `1` && a < `5`', [{'a': v} for v in VALUES])
+        self.assert_matches_interpreter(
+            "a >= 'a' && a <= 'b'", [{'a': v} for v in VALUES])
+        self.assert_matches_interpreter(
+            "a > `[]` && a < `5`", [{'a': v} for v in VALUES])
+
+    def test_unsupported_shapes(self):
+        for expression in ['a == b', 'a', 'length(a) == `1`',
+                           'a > `1` && b < `5`', 'a == `1` && a == `2`',
+                           "a > `1` && a < `[]`"]:
+            self.assertIsNone(self.compile_condition(expression)[1])
@@ -155,6 +155,43 @@ class TestRegexLexer(unittest.TestCase):
         with self.assertRaisesRegexp(LexerError, "Unknown token"):
             list(self.lexer.tokenize('foo-bar'))
 
+    def test_tokens_support_dict_access(self):
+        token = list(self.lexer.tokenize('foo'))[0]
+        self.assertFalse(hasattr(token, '__dict__'))
+        self.assertEqual(token.type, 'unquoted_identifier')
+        self.assertEqual(token['value'], 'foo')
+        self.assertEqual(token.to_dict(), {'type': 'unquoted_identifier',
+                                           'value': 'foo',
+                                           'start': 0, 'end': 3})
+        with self.assertRaises(KeyError):
+            token['line']
+
+    def test_scan_returns_tuples(self):
+        self.assertEqual(
+            self.lexer.scan('foo[?bar == `1`]'),
+            [('unquoted_identifier', 'foo', 0, 3),
+             ('filter', '[?', 3, 5),
+             ('unquoted_identifier', 'bar', 5, 8),
+             ('eq', '==', 9, 10),
+             ('literal', 1, 12, 3),
+             ('rbracket', ']', 15, 16),
+             ('eof', '', 16, 16)])
+
+    def test_long_escaped_literals(self):
+        lexeme = "a\\'" * 5000
+        tokens = list(self.lexer.tokenize("'%s'" % lexeme))
+        self.assertEqual(tokens[0]['value'], "a'" * 5000)
+
+    def test_unclosed_delimiter_position(self):
+        with self.assertRaises(LexerError) as e:
+            self.lexer.scan('foo.`bar')
+        self.assertEqual(e.exception.lex_position, 4)
+        self.assertEqual(e.exception.token_value, '`bar')
+
+    def test_unknown_equals_token(self):
+        for expression in ('foo =', 'foo = bar', 'a=b'):
+            with self.assertRaisesRegexp(LexerError, "Unknown token '='"):
+                self.lexer.scan(expression)
 
 if __name__ == '__main__':
     unittest.main()
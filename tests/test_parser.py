@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import pickle
 import re
 from tests import unittest, OrderedDict
 
@@ -25,9 +26,19 @@ class TestParser(unittest.TestCase):
         self.assert_parsed_ast('foo', ast.field('foo'))
 
     def test_dot_syntax(self):
-        self.assert_parsed_ast('foo.bar',
-                               ast.subexpression([ast.field('foo'),
-                                                  ast.field('bar')]))
+        self.assert_parsed_ast('foo.bar', ast.field_path(['foo', 'bar']))
+
+    def test_dot_syntax_with_other_expressions(self):
+        self.assert_parsed_ast(
+            'foo.bar[0].baz.qux',
+            ast.subexpression([
+                ast.field('foo'),
+                ast.index_expression([ast.field('bar'), ast.index(0)]),
+                ast.field_path(['baz', 'qux'])]))
+        self.assert_parsed_ast(
+            'foo[*].bar.baz',
+            ast.projection(ast.field('foo'),
+                           ast.field_path(['bar', 'baz'])))
 
     def test_multiple_dots(self):
         parsed = self.parser.parse('foo.bar.baz')
@@ -42,9 +53,16 @@ class TestParser(unittest.TestCase):
 
     def test_quoted_subexpression(self):
         self.assert_parsed_ast('"foo"."bar"',
-                               ast.subexpression([
-                                   ast.field('foo'),
-                                   ast.field('bar')]))
+                               ast.field_path(['foo', 'bar']))
+
+    def test_field_path_resolved_without_interpreter(self):
+        parsed = self.parser.parse('foo.bar.baz')
+        self.assertEqual(parsed.field_path, ('foo', 'bar', 'baz'))
+        self.assertEqual(
+            parsed.search({'foo': {'bar': {'baz': 'correct'}}}), 'correct')
+        self.assertIsNone(parsed.search({'foo': {'bar': 'notadict'}}))
+        self.assertIsNone(parsed.search({'foo': None}))
+        self.assertIsNone(self.parser.parse('foo[0]').field_path)
 
     def test_wildcard(self):
         parsed = self.parser.parse('foo[*]')
@@ -292,6 +310,104 @@ class TestMergedLists(unittest.TestCase):
              ["nine"], ["ten"]])
 
 
+class TestParserOptimizations(unittest.TestCase):
+    def setUp(self):
+        self.parser = parser.Parser()
+
+    def assert_parsed_ast(self, expression, expected_ast):
+        parsed = self.parser.parse(expression)
+        self.assertEqual(parsed.parsed, expected_ast)
+
+    def test_literal_comparisons_are_folded(self):
+        self.assert_parsed_ast('`1` == `1`', ast.literal(True))
+        self.assert_parsed_ast('`1` < `0`', ast.literal(False))
+        self.assert_parsed_ast('`"a"` < `[]`', ast.literal(None))
+
+    def test_literal_comparison_errors_are_not_folded(self):
+        # Comparing a string to a number raises a TypeError on python
+        # 3, which must still be raised by search(), and returns False
+        # on python 2.
+        expression = '`"a"` < `1`'
+        unoptimized = parser.Parser(optimize=False).parse(expression)
+        try:
+            expected = unoptimized.search(None)
+        except TypeError:
+            self.assert_parsed_ast(
+                expression,
+                ast.comparator('lt', ast.literal('a'), ast.literal(1)))
+            with self.assertRaises(TypeError):
+                self.parser.parse(expression).search(None)
+        else:
+            self.assert_parsed_ast(expression, ast.literal(expected))
+
+    def test_not_literal_is_folded(self):
+        self.assert_parsed_ast('!`0`', ast.literal(False))
+        self.assert_parsed_ast('!`[]`', ast.literal(True))
+
+    def test_or_with_literal_left_side(self):
+        self.assert_parsed_ast('`null` || foo', ast.field('foo'))
+        self.assert_parsed_ast('`"a"` || foo', ast.literal('a'))
+
+    def test_and_with_literal_left_side(self):
+        self.assert_parsed_ast('`true` && foo', ast.field('foo'))
+        self.assert_parsed_ast('`{}` && foo', ast.literal({}))
+
+    def test_literal_true_filter_is_projection(self):
+        self.assert_parsed_ast(
+            'foo[?`1` < `2`].bar',
+            ast.projection(ast.field('foo'), ast.field('bar')))
+
+    def test_pipes_with_current_node(self):
+        self.assert_parsed_ast('@ | foo', ast.field('foo'))
+        self.assert_parsed_ast('foo | @', ast.field('foo'))
+
+    def test_element_of_projection_is_split_from_the_rest(self):
+        self.assert_parsed_ast(
+            'foo[*].bar | [0].baz',
+            ast.pipe(
+                ast.pipe(ast.projection(ast.field('foo'), ast.field('bar')),
+                         ast.index_expression([ast.identity(),
+                                               ast.index(0)])),
+                ast.field('baz')))
+
+    def test_nested_constants_are_folded(self):
+        self.assert_parsed_ast(
+            'foo[?bar == !(`1` == `2`)]',
+            ast.filter_projection(
+                ast.field('foo'), ast.identity(),
+                ast.comparator('eq', ast.field('bar'), ast.literal(True))))
+
+    def test_optimizations_can_be_disabled(self):
+        p = parser.Parser(optimize=False)
+        self.assertEqual(
+            p.parse('`null` || foo').parsed,
+            ast.or_expression(ast.literal(None), ast.field('foo')))
+        self.assertEqual(p.parse('`null` || foo').search({'foo': 1}), 1)
+
+
+class TestParserDispatch(unittest.TestCase):
+    def test_subclass_methods_are_dispatched(self):
+        class UpperCaseFields(parser.Parser):
+            def _token_nud_unquoted_identifier(self, token):
+                return ast.field(token[1].upper())
+
+        parsed = UpperCaseFields(optimize=False)._parse('foo.bar')
+        self.assertEqual(parsed.ast, ast.field_path(['FOO', 'BAR']))
+        parsed = parser.Parser(optimize=False)._parse('foo.bar')
+        self.assertEqual(parsed.ast, ast.field_path(['foo', 'bar']))
+
+    def test_tokens_without_nud_or_led(self):
+        p = parser.Parser()
+        with self.assertRaises(exceptions.IncompleteExpressionError):
+            p.parse('foo ||')
+        with self.assertRaisesRegexp(exceptions.ParseError,
+                                     'invalid token'):
+            p.parse('foo !bar')
+        with self.assertRaisesRegexp(exceptions.ParseError,
+                                     'invalid token'):
+            p.parse(']')
+
+
 class TestParserCaching(unittest.TestCase):
     def test_compile_lots_of_expressions(self):
         # We have to be careful here because this is an implementation detail
@@ -342,6 +458,63 @@ class TestParsedResultAddsOptions(unittest.TestCase):
         self.assertEqual(list(result), ['a', 'b', 'c'])
 
 
+class TestCompactAST(unittest.TestCase):
+    def test_nodes_do_not_have_a_dict(self):
+        node = ast.field('foo')
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertEqual(node.type, 'field')
+        self.assertEqual(node.tag, ast.TYPE_TAGS['field'])
+
+    def test_nodes_support_dict_access(self):
+        node = ast.comparator('eq', ast.field('a'), ast.literal(1))
+        self.assertEqual(node['type'], 'comparator')
+        self.assertEqual(node['value'], 'eq')
+        self.assertEqual(node['children'][0]['value'], 'a')
+        self.assertIn('value', node)
+        self.assertNotIn('value', ast.identity())
+        with self.assertRaises(KeyError):
+            ast.identity()['value']
+
+    def test_parsed_is_a_dict_view(self):
+        parsed = parser.Parser().parse('foo[0]')
+        self.assertIsInstance(parsed.ast, ast.Node)
+        self.assertEqual(
+            parsed.parsed,
+            {'type': 'index_expression', 'children': [
+                {'type': 'field', 'children': [], 'value': 'foo'},
+                {'type': 'index', 'children': [], 'value': 0}]})
+        # Modifying the view doesn't modify the AST.
+        parsed.parsed['children'].pop()
+        self.assertEqual(len(parsed.ast.children), 2)
+
+    def test_dict_round_trip(self):
+        for expression in ['a.b[?c > `1`].d', 'foo[1:2]', '{a: b, c: d}',
+                           'sort_by(@, &a) | [0]', 'a || !b && `null`']:
+            parsed = parser.Parser(optimize=False).parse(expression)
+            self.assertEqual(ast.from_dict(parsed.parsed), parsed.ast)
+            self.assertEqual(parsed.ast, parsed.parsed)
+
+    def test_parsed_result_accepts_dict_ast(self):
+        parsed = parser.ParsedResult(
+            'foo', {'type': 'field', 'children': [], 'value': 'foo'})
+        self.assertEqual(parsed.search({'foo': 'bar'}), 'bar')
+
+    def test_nodes_can_be_pickled(self):
+        node = parser.Parser().parse('a.b[?c > `1`].d').ast
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(node, protocol)),
+                             node)
+
+    def test_visitors_accept_dict_ast(self):
+        data = {'a': {'b': [{'c': 1}, {'c': 2}]}}
+        for expression, expected in [('a.b', data['a']['b']),
+                                     ('a.b[?c > `1`].c', [2]),
+                                     ('sort_by(a.b, &c)[0]', {'c': 1})]:
+            parsed = parser.Parser().parse(expression).parsed
+            self.assertEqual(visitor.TreeInterpreter().visit(parsed, data),
+                             expected, expression)
+
+
 class TestRenderGraphvizFile(unittest.TestCase):
     def test_dot_file_rendered(self):
         p = parser.Parser()
@@ -354,14 +527,23 @@ class TestRenderGraphvizFile(unittest.TestCase):
         p = parser.Parser()
         result = p.parse('foo.bar')
         dot_contents = result._render_dot_file()
+        self.assertEqual(
+            dot_contents,
+            'digraph AST {\n'
+            'field_path1 [label="field_path(foo.bar)"]\n}')
+
+    def test_dot_file_subexpr_with_function(self):
+        p = parser.Parser()
+        result = p.parse('foo.bar()')
+        dot_contents = result._render_dot_file()
         self.assertEqual(
             dot_contents,
             'digraph AST {\n'
             'subexpression1 [label="subexpression()"]\n'
             '  subexpression1 -> field2\n'
             'field2 [label="field(foo)"]\n'
-            '  subexpression1 -> field3\n'
-            'field3 [label="field(bar)"]\n}')
+            '  subexpression1 -> function_expression3\n'
+            'function_expression3 [label="function_expression(bar)"]\n}')
 
 
 if __name__ == '__main__':
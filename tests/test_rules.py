@@ -0,0 +1,76 @@
+from tests import unittest
+
+import jmespath
+import jmespath.functions
+from jmespath import exceptions
+from jmespath import rules
+
+
+class TestRuleSet(unittest.TestCase):
+    def setUp(self):
+        self.event = {'detail': {'state': 'stopped', 'count': 3},
+                      'region': 'us-east-1', 'flag': True}
+
+    def test_match(self):
+        rule_set = jmespath.RuleSet({
+            'stopped': "detail.state == 'stopped'",
+            'stopped-east': ("detail.state == 'stopped' && "
+                             "region == 'us-east-1'"),
+            'stopped-west': ("detail.state == 'stopped' && "
+                             "region == 'us-west-2'"),
+            'running': "detail.state == 'running'",
+            'many': 'detail.count > `2`',
+            'few': 'detail.count < `2`',
+        })
+        self.assertEqual(sorted(rule_set.match(self.event)),
+                         ['many', 'stopped', 'stopped-east'])
+
+    def test_matches_in_rule_order(self):
+        expressions = ["region == 'us-east-1'", 'detail.count > `1`',
+                       "detail.state == 'stopped'", "'us-east-1' == region"]
+        rule_set = jmespath.RuleSet(expressions)
+        self.assertEqual(rule_set.match(self.event), expressions)
+
+    def test_only_candidate_rules_are_evaluated(self):
+        evaluated = []
+
+        class Functions(jmespath.functions.Functions):
+            @jmespath.functions.signature({'types': []})
+            def _func_record(self, value):
+                evaluated.append(value)
+                return True
+
+        rule_set = jmespath.RuleSet(
+            ["region == 'us-east-1' && record('a')",
+             "region == 'us-west-2' && record('b')",
+             "record('c')"],
+            options=jmespath.Options(custom_functions=Functions()))
+        self.assertEqual(len(rule_set.match(self.event)), 2)
+        self.assertEqual(sorted(evaluated), ['a', 'c'])
+
+    def test_equal_python_values_are_told_apart(self):
+        rule_set = jmespath.RuleSet(['flag == `1`', 'flag == `true`',
+                                     'missing == `null`', 'region == `1`'])
+        self.assertEqual(rule_set.match(self.event),
+                         ['flag == `true`', 'missing == `null`'])
+
+    def test_unhashable_values(self):
+        rule_set = jmespath.RuleSet(["detail == 'x'", 'detail.count == `3`'])
+        self.assertEqual(rule_set.match(self.event), ['detail.count == `3`'])
+
+    def test_indexable_conjuncts(self):
+        ast = jmespath.compile(
+            "a.b == 'x' && (c == `1` && `[1]` == d) && e > `1` && f"
+        ).ast
+        self.assertEqual(rules._indexable_conjuncts(ast),
+                         [(('a', 'b'), 'x'), (('c',), 1)])
+        ast = jmespath.compile("a == 'x' || b == 'y'").ast
+        self.assertEqual(rules._indexable_conjuncts(ast), [])
+
+    def test_invalid_rules(self):
+        with self.assertRaises(exceptions.CompileErrors):
+            jmespath.RuleSet(["a == 'x'", 'a =='])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+from tests import unittest, OrderedDict
+
+import jmespath
+from jmespath import codegen
+from jmespath import exceptions
+from jmespath import inference
+from jmespath import parser
+
+
+SCHEMA = {
+    'type': 'object',
+    'required': ['reservations'],
+    'properties': {
+        'reservations': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['instances'],
+                'properties': {
+                    'instances': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'required': ['id', 'cores', 'state'],
+                            'properties': {
+                                'id': {'type': 'string'},
+                                'cores': {'type': 'integer'},
+                                'state': {'type': 'string'},
+                                'tags': {'type': 'array',
+                                         'items': {'type': 'string'}},
+                            },
+                            'additionalProperties': False,
+                        },
+                    },
+                },
+            },
+        },
+        'count': {'type': ['number', 'null']},
+    },
+}
+
+
+def instance(number, state='running'):
+    return {'id': 'i-%s' % number, 'cores': number, 'state': state}
+
+
+DOCUMENT = {
+    'reservations': [
+        {'instances': [instance(1), instance(4, 'stopped')]},
+        {'instances': [instance(2, 'stopped'), instance(8)]},
+        {'instances': []},
+    ],
+    'count': 3,
+}
+
+
+class ListSubclass(list):
+    pass
+
+
+class TestParseSchema(unittest.TestCase):
+    def test_types(self):
+        schema = inference.parse_schema(
+            {'type': ['integer', 'null'], 'items': {'type': 'string'}})
+        self.assertEqual(schema.types, frozenset(['number', 'null']))
+        self.assertEqual(schema.items.types, frozenset(['string']))
+        self.assertIsNone(inference.parse_schema({}).types)
+
+    def test_properties(self):
+        schema = inference.parse_schema({
+            'properties': {'a': {'type': 'string'}},
+            'additionalProperties': False,
+        })
+        self.assertEqual(schema.property_schema('a').types,
+                         frozenset(['string']))
+        self.assertIsNone(schema.property_schema('b'))
+        schema = inference.parse_schema({'properties': {}})
+        self.assertIsNone(schema.property_schema('b').types)
+
+    def test_invalid_schemas(self):
+        for schema in [{'type': 'integr'}, {'type': 1}, [], 'object']:
+            with self.assertRaises(exceptions.SchemaError):
+                inference.parse_schema(schema)
+
+
+class TestSchemaCompilation(unittest.TestCase):
+    expressions = [
+        'reservations[].instances[].id',
+        "reservations[].instances[?state == 'running'].id",
+        'reservations[].instances[?cores > `2` || cores == `1`][].id',
+        'sort_by(reservations[].instances[], &cores)[*].id',
+        'sum(reservations[].instances[].cores)',
+        'reservations[0].instances[0].state',
+        'reservations[?instances[?cores > `4`]] | length(@)',
+        'reservations[].instances[].[id, tags[0]]',
+        'max_by(reservations[].instances[], &cores).id',
+        'count || `0`',
+        '!count',
+    ]
+
+    def assert_same_results(self, document):
+        for expression in self.expressions:
+            for backend in ('interpreter', 'closure', 'codegen'):
+                parsed = jmespath.compile(expression, backend=backend)
+                try:
+                    expected = parsed.search(document)
+                except Exception as e:
+                    expected = type(e)
+                specialized = jmespath.compile(expression, backend=backend,
+                                               schema=SCHEMA)
+                try:
+                    actual = specialized.search(document)
+                except Exception as e:
+                    actual = type(e)
+                self.assertEqual(actual, expected,
+                                 (expression, backend, document))
+
+    def test_documents_of_the_schema(self):
+        self.assert_same_results(DOCUMENT)
+        self.assert_same_results({'reservations': []})
+        self.assert_same_results({'reservations': [], 'count': None})
+
+    def test_documents_that_dont_match_the_schema(self):
+        for document in [
+                None,
+                {},
+                {'reservations': {}},
+                {'reservations': [None, {'instances': 'x'}]},
+                {'reservations': [{'instances': [{'cores': 'a'}]}]},
+                {'reservations': [{'instances': [{'id': 1, 'cores': True,
+                                                  'state': 1}]}]},
+                {'reservations': ListSubclass([{'instances': []}])},
+                OrderedDict([('reservations', []), ('count', '3')]),
+                {'reservations': [], 'count': 0},
+        ]:
+            self.assert_same_results(document)
+
+    def test_checks_relying_on_the_schema_are_left_out(self):
+        for backend in ('closure', 'codegen'):
+            parsed = jmespath.compile(
+                'reservations[].instances[?cores > `2` || cores == `1`].id',
+                backend=backend, schema=SCHEMA)
+            explained = parsed.explain()
+            self.assertIn('presence check: reservations', explained)
+            self.assertIn('list check: reservations', explained)
+            self.assertIn('truthiness check: cores > `2`', explained)
+            self.assertIn('equality special case: cores == `1`', explained)
+
+    def test_required_fields_are_looked_up_directly(self):
+        parsed = jmespath.compile('reservations[0]', backend='codegen',
+                                  schema=SCHEMA)
+        self.assertIn("value['reservations']", parsed.compiled.source)
+        parsed = jmespath.compile('count', backend='codegen', schema=SCHEMA)
+        self.assertIn("value.get('count')", parsed.compiled.source)
+
+    def test_compiled_once(self):
+        class CountingCodeGenerator(codegen.CodeGenerator):
+            generated = 0
+
+            def generate(self, node, types=None):
+                CountingCodeGenerator.generated += 1
+                return super(CountingCodeGenerator, self).generate(
+                    node, types)
+
+        node = parser.Parser().parse(
+            "reservations[].instances[?state == 'running'].id").ast
+        compiled = CountingCodeGenerator().compile_for_schema(
+            node, inference.parse_schema(SCHEMA))
+        self.assertEqual(CountingCodeGenerator.generated, 1)
+        self.assertEqual(compiled(DOCUMENT), [['i-1'], ['i-8'], []])
+
+    def test_paths_that_cant_exist(self):
+        for expression in ['reservations.instances',
+                           'reservations[].instances[].name',
+                           'reservations[0].instances[0].id[0]',
+                           'reservations[].instances[].id[*]',
+                           'sort_by(reservations[].instances[], &name)',
+                           'count.*']:
+            with self.assertRaises(exceptions.SchemaError):
+                jmespath.compile(expression, schema=SCHEMA)
+        # Fields that aren't listed may exist unless additionalProperties
+        # is false.
+        self.assertEqual(
+            jmespath.compile('reservations[].other', schema=SCHEMA).search(
+                {'reservations': [{'instances': [], 'other': 1}]}),
+            [1])
+
+    def test_custom_options(self):
+        options = jmespath.Options(dict_cls=OrderedDict)
+        parsed = jmespath.compile('reservations[].instances[].{id: id}',
+                                  schema=SCHEMA)
+        result = parsed.search(DOCUMENT, options=options)
+        self.assertIsInstance(result[0], OrderedDict)
+        self.assertEqual([value['id'] for value in result],
+                         ['i-1', 'i-4', 'i-2', 'i-8'])
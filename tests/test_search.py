@@ -1,9 +1,11 @@
 import sys
 import decimal
+import pickle
 from tests import unittest, OrderedDict
 
 import jmespath
 import jmespath.functions
+from jmespath import exceptions
 
 
 class TestSearchOptions(unittest.TestCase):
@@ -46,6 +48,171 @@ class TestSearchOptions(unittest.TestCase):
 
 
 
+class TestEvaluationContextReuse(unittest.TestCase):
+    def setUp(self):
+        self.data = {'c': 'c', 'b': 'b', 'a': 'a'}
+
+    def test_interpreter_shared_per_options(self):
+        options = jmespath.Options(dict_cls=OrderedDict)
+        parsed = jmespath.compile('{a: a, b: b}')
+        parsed.search(self.data, options=options)
+        interpreter = jmespath.parser._INTERPRETERS.get(
+            options, self.fail)
+        other = jmespath.compile('a')
+        self.assertEqual(other.search(self.data, options=options), 'a')
+        self.assertIs(
+            jmespath.parser._INTERPRETERS.get(options, self.fail),
+            interpreter)
+
+    def test_compiled_once_per_options(self):
+        options = jmespath.Options(dict_cls=OrderedDict)
+        parsed = jmespath.compile('{a: a, b: b}', backend='closure')
+        result = parsed.search(self.data, options=options)
+        self.assertIsInstance(result, OrderedDict)
+        compiled = parsed._compiled_for_options.get(options, self.fail)
+        parsed.search(self.data, options=options)
+        self.assertIs(
+            parsed._compiled_for_options.get(options, self.fail), compiled)
+
+    def test_modified_options_are_recompiled(self):
+        options = jmespath.Options()
+        for backend in ('interpreter', 'closure', 'codegen'):
+            parsed = jmespath.compile('{c: c, a: a, b: b}.*',
+                                      backend=backend)
+            options.dict_cls = OrderedDict
+            self.assertEqual(parsed.search(self.data, options=options),
+                             ['c', 'a', 'b'])
+            options.dict_cls = None
+            self.assertIsInstance(parsed.search({}, options=options), list)
+
+    def test_evaluation_context_released_with_options(self):
+        parsed = jmespath.compile('[a, b]', backend='closure')
+        options = jmespath.Options()
+        parsed.search(self.data, options=options)
+        self.assertEqual(len(parsed._compiled_for_options._entries), 1)
+        del options
+        self.assertEqual(len(parsed._compiled_for_options._entries), 0)
+
+
+class TestSearchMany(unittest.TestCase):
+    def setUp(self):
+        self.values = [{'a': {'b': i}, 'c': [i, i + 1]} for i in range(10)]
+
+    def test_search_many(self):
+        for backend in ('interpreter', 'closure', 'codegen'):
+            for expression in ('a.b', 'c[?@ > `4`] | [0]', '{b: a.b}'):
+                parsed = jmespath.compile(expression, backend=backend)
+                self.assertEqual(
+                    list(parsed.search_many(self.values)),
+                    [parsed.search(value) for value in self.values])
+
+    def test_search_many_is_lazy(self):
+        parsed = jmespath.compile('a.b')
+        results = parsed.search_many(iter(self.values))
+        self.assertEqual(next(results), 0)
+        self.assertEqual(next(results), 1)
+
+    def test_search_many_with_options(self):
+        parsed = jmespath.compile('{b: a.b, c: c}', backend='closure')
+        options = jmespath.Options(dict_cls=OrderedDict)
+        results = list(parsed.search_many(self.values, options=options))
+        self.assertIsInstance(results[0], OrderedDict)
+        self.assertEqual(results[3], {'b': 3, 'c': [3, 4]})
+
+    def test_search_many_with_workers(self):
+        parsed = jmespath.compile('c[?@ > `4`] | [0]', backend='codegen')
+        options = jmespath.Options(dict_cls=OrderedDict)
+        self.assertEqual(
+            list(parsed.search_many(self.values, options=options,
+                                    workers=2, chunksize=3)),
+            [parsed.search(value) for value in self.values])
+
+    def test_parsed_result_can_be_pickled(self):
+        parsed = jmespath.compile('c[?@ > `4`] | [0]', backend='closure')
+        unpickled = pickle.loads(pickle.dumps(parsed))
+        self.assertEqual(unpickled.expression, parsed.expression)
+        self.assertEqual(unpickled.ast, parsed.ast)
+        self.assertEqual(unpickled.backend, 'closure')
+        self.assertEqual(unpickled.search({'c': [1, 5, 6]}), 5)
+
+
+class CountingDict(dict):
+    lookups = 0
+
+    def get(self, key, default=None):
+        CountingDict.lookups += 1
+        return super(CountingDict, self).get(key, default)
+
+
+class TestLazyProjections(unittest.TestCase):
+    def setUp(self):
+        CountingDict.lookups = 0
+        self.items = [CountingDict(status='OK' if i % 10 else 'ERROR',
+                                   id=i, name=str(i))
+                      for i in range(100)]
+
+    def search(self, expression, value):
+        return jmespath.compile(
+            expression, backend='interpreter').search(value)
+
+    def test_index_stops_at_first_match(self):
+        self.assertEqual(
+            self.search("items[?status == 'ERROR'] | [1].id",
+                        {'items': self.items}), 10)
+        self.assertEqual(CountingDict.lookups, 11 + 1)
+
+    def test_contains_stops_at_first_match(self):
+        self.assertTrue(
+            self.search('contains(items[*].id, `4`)', {'items': self.items}))
+        self.assertEqual(CountingDict.lookups, 5)
+
+    def test_streamed_functions(self):
+        data = {'items': self.items}
+        self.assertEqual(self.search('length(items[*].id)', data), 100)
+        self.assertEqual(self.search('items[*].id | sum(@)', data), 4950)
+        self.assertEqual(self.search('max(items[*].name)', data), '99')
+        self.assertEqual(self.search('min(items[*].id)', data), 0)
+        self.assertEqual(
+            self.search("join(',', items[?id < `3`].name)", data), '0,1,2')
+        self.assertIsNone(self.search('max(items[?id < `0`].id)', data))
+        self.assertIsNone(self.search('missing[*].id | [0]', data))
+
+    def test_same_errors_as_lists(self):
+        functions = jmespath.functions.Functions()
+        data = {'items': [{'v': 1}, {'v': 'a'}, {'v': 2}]}
+        for name in ('max', 'min', 'sum'):
+            with self.assertRaises(exceptions.JMESPathTypeError) as e:
+                functions.call_function(name, [[1, 'a', 2]])
+            with self.assertRaises(exceptions.JMESPathTypeError) as streamed:
+                self.search('%s(items[*].v)' % name, data)
+            self.assertEqual(str(streamed.exception), str(e.exception))
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            self.search('length(missing[*].v)', data)
+
+    def test_no_short_circuit_if_elements_can_raise(self):
+        # The error raised by the third element can't be skipped.
+        data = {'items': [{'v': 1}, {'v': 2}, {'v': 'a'}]}
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            self.search('items[*].abs(v) | [0]', data)
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            self.search('contains(items[*].abs(v), `1`)', data)
+
+    def test_overridden_functions_are_given_lists(self):
+        arguments = []
+
+        class Functions(jmespath.functions.Functions):
+            @jmespath.functions.signature({'types': ['array']})
+            def _func_length(self, arg):
+                arguments.append(arg)
+                return len(arg)
+
+        parsed = jmespath.compile('length(items[*].id)',
+                                  backend='interpreter')
+        options = jmespath.Options(custom_functions=Functions())
+        self.assertEqual(parsed.search({'items': self.items}, options), 100)
+        self.assertIsInstance(arguments[0], list)
+
+
 class TestPythonSpecificCases(unittest.TestCase):
     def test_can_compare_strings(self):
         # This is python specific behavior that's not in the official spec